@@ -4,6 +4,9 @@ import streamlit as st
 import importlib.util
 import sys
 
+# Opciones de cursos por página en los listados
+TAMANOS_PAGINA = [10, 25, 50, 100]
+
 def load_api():
     """Carga el módulo de la API de recomendación de optativas."""
     api_path = os.path.abspath(
@@ -15,6 +18,30 @@ def load_api():
     spec.loader.exec_module(elective_module)
     return elective_module.ElectiveRecommendationAPI
 
+@st.cache_resource(show_spinner="Cargando el recomendador...")
+def get_api(data_path):
+    """
+    Instancia única de la API para todas las sesiones y reruns: el módulo, los tags
+    predefinidos y los modelos que carga (spaCy, SentenceTransformer) se reutilizan.
+    """
+    ElectiveRecommendationAPI = load_api()
+    return ElectiveRecommendationAPI(data_path)
+
+@st.cache_data(max_entries=8)
+def listar_cursos(_api, version):
+    """Listado de cursos; se vuelve a leer solo cuando cambia la versión de la tabla."""
+    return _api.get_all_courses()
+
+@st.cache_data(max_entries=8)
+def cursos_por_id(_api, version):
+    """Cursos indexados por CursoID (como texto) para buscar nombres sin recorrer el catálogo."""
+    return {str(c["CursoID"]): c for c in listar_cursos(_api, version)}
+
+def version_cursos(api):
+    # Cambia con cada escritura de la tabla de cursos (de esta u otra instancia de la
+    # API) e invalida los listados cacheados
+    return api.get_table_version("courses")
+
 def estudiante_section(api):
     st.header("Opciones para Estudiante")
     student_action = st.radio(
@@ -138,19 +165,35 @@ def consultar_estudiante(api):
 def mostrar_cursos(api, docente=False):
     header = "Cursos disponibles" if not docente else "Cursos disponibles (Docente)"
     st.subheader(header)
-    cursos = api.get_all_courses()
-    if cursos:
-        for curso in cursos:
-            nombre = curso.get("Nombre") or "(Sin nombre)"
-            curso_id = curso.get("CursoID") or "?"
-            descripcion = curso.get("Descripcion") or ""
-            if docente:
-                st.subheader(f"{nombre} (ID: {curso_id})")
-            else:
-                st.markdown(f"**{nombre}** (ID: {curso_id})")
-            st.write(descripcion)
-    else:
+    cursos = listar_cursos(api, version_cursos(api))
+    if not cursos:
         st.info("No hay cursos registrados.")
+        return
+    # Solo se dibuja la página actual del catálogo
+    vista = "docente" if docente else "estudiante"
+    col_tamano, col_pagina = st.columns(2)
+    por_pagina = col_tamano.selectbox(
+        "Cursos por página", TAMANOS_PAGINA, key=f"cursos_por_pagina_{vista}"
+    )
+    paginas = (len(cursos) - 1) // por_pagina + 1
+    clave_pagina = f"cursos_pagina_{vista}"
+    if st.session_state.get(clave_pagina, 1) > paginas:
+        st.session_state[clave_pagina] = paginas
+    pagina = col_pagina.number_input(
+        f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=clave_pagina
+    )
+    inicio = (pagina - 1) * por_pagina
+    fin = min(inicio + por_pagina, len(cursos))
+    st.caption(f"Cursos {inicio + 1}-{fin} de {len(cursos)}")
+    for curso in cursos[inicio:fin]:
+        nombre = curso.get("Nombre") or "(Sin nombre)"
+        curso_id = curso.get("CursoID") or "?"
+        descripcion = curso.get("Descripcion") or ""
+        if docente:
+            st.subheader(f"{nombre} (ID: {curso_id})")
+        else:
+            st.markdown(f"**{nombre}** (ID: {curso_id})")
+        st.write(descripcion)
 
 def recomendar_cursos(api):
     st.subheader("Recomendación de cursos para ti")
@@ -166,7 +209,7 @@ def recomendar_cursos(api):
                 st.info("No hay recomendaciones disponibles para este estudiante.")
             else:
                 st.write("Ranking de cursos recomendados:")
-                cursos_dict = {str(c["CursoID"]): c for c in api.get_all_courses()}
+                cursos_dict = cursos_por_id(api, version_cursos(api))
                 for i, (curso_id, score) in enumerate(ranking, 1):
                     curso = cursos_dict.get(str(curso_id), {})
                     nombre = curso.get("Nombre", f"CursoID {curso_id}")
@@ -238,9 +281,8 @@ def editar_curso(api):
             st.error(str(e))
 
 def main():
-    ElectiveRecommendationAPI = load_api()
     DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data"))
-    api = ElectiveRecommendationAPI(DATA_PATH)
+    api = get_api(DATA_PATH)
     st.title("Recomendador de Optativas")
     section = st.sidebar.radio("Selecciona tu rol", ["Estudiante", "Docente"])
     if section == "Estudiante":
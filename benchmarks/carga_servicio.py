@@ -0,0 +1,199 @@
+"""
+Generador de carga para el servicio HTTP (src/api/servicio.py): varios hilos piden
+recomendaciones de estudiantes al azar durante un tiempo fijo (o hasta completar
+--solicitudes) y al final se informan la latencia p50/p90/p99 y el throughput.
+
+Con --levantar se inicia el servicio en este mismo proceso sobre --data, así se pueden
+comparar ventanas de agrupamiento sin otra terminal (--sin-agrupar da la línea base
+sin lotes).
+
+Uso:
+    python benchmarks/carga_servicio.py --url http://127.0.0.1:8000 --hilos 32 --duracion 20
+    python benchmarks/carga_servicio.py --levantar --data /tmp/datos --ventana-ms 2
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+PERCENTILES = (50, 90, 99)
+
+
+def _levantar_servicio(args):
+    """Inicia el servicio en un hilo de fondo y retorna su URL."""
+    from werkzeug.serving import make_server
+
+    from src.api.elective_recommendation import ElectiveRecommendationAPI
+    from src.api.servicio import crear_app
+
+    api = ElectiveRecommendationAPI(
+        args.data,
+        indice_ann=args.indice_ann,
+        compresion=args.compresion,
+        dimension_pca=args.dimension_pca,
+    )
+    api.warm_up(modelos=False)
+    app = crear_app(
+        api,
+        ventana_ms=args.ventana_ms,
+        max_lote=args.max_lote,
+        agrupar=not args.sin_agrupar,
+    )
+    # Sin una línea de log por solicitud, que pesaría en la medición
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    servidor = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_port}"
+
+
+def _ids_estudiantes(url, max_id):
+    """IDs a consultar: 1..max_id, o los que devuelve el servicio para un lote de prueba."""
+    if max_id:
+        return list(range(1, max_id + 1))
+    candidatos = list(range(1, 10001))
+    respuesta = requests.post(
+        f"{url}/recommendations",
+        json={"estudiante_ids": candidatos, "top_n": 1},
+        timeout=60,
+    )
+    if respuesta.status_code == 404:
+        # El servicio indica qué candidatos no tienen embeddings
+        no_encontrados = set(respuesta.json()["no_encontrados"])
+        return [i for i in candidatos if i not in no_encontrados]
+    respuesta.raise_for_status()
+    return candidatos
+
+
+def generar_carga(url, ids, hilos, duracion, solicitudes, top_n, semilla=0):
+    """
+    Lanza las solicitudes y retorna (latencias en segundos, errores, segundos totales).
+    Se detiene al cumplirse la duración o al llegar a solicitudes (lo primero que ocurra).
+    """
+    fin = time.monotonic() + duracion if duracion else None
+    contador = iter(range(solicitudes)) if solicitudes else None
+    lock = threading.Lock()
+    latencias = []
+    errores = [0]
+
+    def cliente(indice):
+        rng = random.Random(semilla + indice)
+        sesion = requests.Session()
+        propias = []
+        fallidas = 0
+        while fin is None or time.monotonic() < fin:
+            if contador is not None:
+                with lock:
+                    if next(contador, None) is None:
+                        break
+            estudiante_id = rng.choice(ids)
+            inicio = time.perf_counter()
+            try:
+                respuesta = sesion.get(
+                    f"{url}/students/{estudiante_id}/recommendations",
+                    params={"top_n": top_n},
+                    timeout=30,
+                )
+                correcta = respuesta.status_code == 200
+            except requests.RequestException:
+                correcta = False
+            if correcta:
+                propias.append(time.perf_counter() - inicio)
+            else:
+                fallidas += 1
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallidas
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(cliente, range(hilos)))
+    return latencias, errores[0], time.perf_counter() - inicio
+
+
+def resumen(latencias, errores, segundos):
+    datos = {
+        "solicitudes": len(latencias),
+        "errores": errores,
+        "segundos": segundos,
+        "throughput": len(latencias) / segundos if segundos else 0.0,
+    }
+    if latencias:
+        for p, valor in zip(PERCENTILES, np.percentile(latencias, PERCENTILES)):
+            datos[f"p{p}_ms"] = float(valor) * 1000
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos")
+    parser.add_argument(
+        "--solicitudes", type=int, help="Detener al completar este número"
+    )
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument(
+        "--max-id", type=int, help="Consultar los estudiantes 1..MAX_ID"
+    )
+    parser.add_argument("--salida", help="Guardar el resumen en este JSON")
+    # Servicio en el mismo proceso
+    parser.add_argument("--levantar", action="store_true")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--ventana-ms", type=float, default=2.0)
+    parser.add_argument("--max-lote", type=int, default=64)
+    parser.add_argument("--sin-agrupar", action="store_true")
+    parser.add_argument("--indice-ann")
+    parser.add_argument("--compresion", choices=("float16", "int8", "pca"))
+    parser.add_argument("--dimension-pca", type=int, default=128)
+    args = parser.parse_args()
+
+    url = _levantar_servicio(args) if args.levantar else args.url.rstrip("/")
+    ids = _ids_estudiantes(url, args.max_id)
+    if not ids:
+        print("El servicio no tiene estudiantes con recomendaciones.")
+        return 1
+    print(
+        f"{args.hilos} hilos contra {url} ({len(ids)} estudiantes, top_n={args.top_n})"
+    )
+    datos = resumen(
+        *generar_carga(
+            url, ids, args.hilos, args.duracion, args.solicitudes, args.top_n
+        )
+    )
+    datos.update(hilos=args.hilos, top_n=args.top_n)
+    if args.levantar:
+        datos.update(
+            ventana_ms=args.ventana_ms,
+            agrupar=not args.sin_agrupar,
+            compresion=args.compresion or "float32",
+        )
+
+    print(
+        f"{datos['solicitudes']} solicitudes en {datos['segundos']:.1f} s "
+        f"({datos['throughput']:.0f}/s), {datos['errores']} errores"
+    )
+    if datos["solicitudes"]:
+        print(
+            "latencia "
+            + "  ".join(f"p{p} {datos[f'p{p}_ms']:.2f} ms" for p in PERCENTILES)
+        )
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Generador de datos sintéticos con el mismo formato que data/students.csv y data/courses.csv.
+Los tags se toman de data/predefined_tags.py y las descripciones se arman con frases en
+español (con tildes, eñes y puntuación) alrededor de esos tags, de modo que la limpieza,
+la extracción de tags y los embeddings trabajen con textos parecidos a los reales.
+La generación es determinista para una misma semilla.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --estudiantes 100000 --cursos 2000 --salida /tmp/datos
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH_TAGS = os.path.join(RAIZ, "data", "predefined_tags.py")
+
+NOMBRES = (
+    "Ana Juan Lucía Pedro María Carlos Sofía Diego Valentina Andrés Camila Mateo "
+    "Daniela Tomás Isabel Joaquín Martina Nicolás Florencia Sebastián Agustina Íñigo"
+).split()
+APELLIDOS = (
+    "García Fernández López Martínez González Rodríguez Pérez Sánchez Ramírez Torres "
+    "Muñoz Díaz Álvarez Romero Gutiérrez Navarro Domínguez Ibáñez Peña Castaño"
+).split()
+
+PLANTILLAS_NOMBRE_CURSO = (
+    "Introducción a {a}",
+    "{A} avanzada",
+    "Fundamentos de {a}",
+    "{A} y {b}",
+    "Taller de {a}",
+    "Tópicos de {a} aplicada",
+)
+FRASES_CURSO = (
+    "Estudio de {a}, {b} y sus aplicaciones en la industria.",
+    "Introducción a los conceptos y técnicas de {a}, con énfasis en {b}.",
+    "Se abordan {a} y {b} mediante proyectos prácticos en equipo.",
+    "Análisis de casos reales de {a}; diseño e implementación de soluciones.",
+    "Métodos de {a} (teoría y práctica) orientados a {b}.",
+    "Curso teórico-práctico: {a}, {b} y evaluación crítica de resultados.",
+)
+FRASES_ESTUDIANTE = (
+    "Me interesa {a} y {b}.",
+    "Quiero desarrollar habilidades en {a}.",
+    "Me gustaría aprender sobre {a} y su relación con {b}.",
+    "Disfruto {a}; en el futuro quiero trabajar en {b}.",
+    "Busco cursos de {a}, ¡sobre todo si incluyen {b}!",
+    "Tengo experiencia en {a} y me gustaría profundizar en {b}.",
+)
+
+
+def cargar_tags_predefinidos(path=PATH_TAGS):
+    """Lee la lista predefined_tags del archivo de tags del proyecto."""
+    spec = importlib.util.spec_from_file_location("predefined_tags", path)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return list(modulo.predefined_tags)
+
+
+def _descripcion(rng, frases, tags, n_frases):
+    partes = []
+    for _ in range(n_frases):
+        a, b = rng.sample(tags, 2) if len(tags) > 1 else (tags[0], tags[0])
+        partes.append(rng.choice(frases).format(a=a, b=b))
+    return " ".join(partes)
+
+
+def generar_cursos(m, tags=None, semilla=0, con_tags=False):
+    """
+    DataFrame de m cursos (CursoID, Nombre, Descripcion). Cada curso gira en torno a
+    3-5 tags; con_tags=True agrega la columna Tags con esos tags separados por comas.
+    """
+    tags = tags or cargar_tags_predefinidos()
+    rng = random.Random(semilla)
+    filas = []
+    for curso_id in range(1, m + 1):
+        propios = rng.sample(tags, min(len(tags), rng.randint(3, 5)))
+        nombre = rng.choice(PLANTILLAS_NOMBRE_CURSO).format(
+            a=propios[0], A=propios[0].capitalize(), b=propios[1 % len(propios)]
+        )
+        fila = {
+            "CursoID": curso_id,
+            "Nombre": nombre,
+            "Descripcion": _descripcion(rng, FRASES_CURSO, propios, rng.randint(2, 4)),
+        }
+        if con_tags:
+            fila["Tags"] = ", ".join(propios)
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def generar_estudiantes(n, tags=None, semilla=0):
+    """
+    DataFrame de n estudiantes (EstudianteID, Nombre, Tags, Descripcion) con 3-6 tags
+    de interés, mencionados también en la descripción.
+    """
+    tags = tags or cargar_tags_predefinidos()
+    rng = random.Random(semilla + 1)
+    filas = []
+    for estudiante_id in range(1, n + 1):
+        propios = rng.sample(tags, min(len(tags), rng.randint(3, 6)))
+        filas.append(
+            {
+                "EstudianteID": estudiante_id,
+                "Nombre": f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+                "Tags": ", ".join(propios),
+                "Descripcion": _descripcion(
+                    rng, FRASES_ESTUDIANTE, propios, rng.randint(1, 3)
+                ),
+            }
+        )
+    return pd.DataFrame(filas)
+
+
+def escribir_datos(carpeta, n_estudiantes, m_cursos, semilla=0):
+    """
+    Escribe students.csv y courses.csv en carpeta (mismo formato que data/) y
+    retorna sus rutas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    tags = cargar_tags_predefinidos()
+    path_estudiantes = os.path.join(carpeta, "students.csv")
+    path_cursos = os.path.join(carpeta, "courses.csv")
+    generar_estudiantes(n_estudiantes, tags, semilla).to_csv(
+        path_estudiantes, index=False
+    )
+    generar_cursos(m_cursos, tags, semilla).to_csv(path_cursos, index=False)
+    return path_estudiantes, path_cursos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--estudiantes", type=int, default=10000)
+    parser.add_argument("--cursos", type=int, default=500)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument(
+        "--salida", required=True, help="Carpeta donde escribir los CSV"
+    )
+    args = parser.parse_args()
+
+    for path in escribir_datos(
+        args.salida, args.estudiantes, args.cursos, args.semilla
+    ):
+        print(f"Escrito {path}")
+
+
+if __name__ == "__main__":
+    main()
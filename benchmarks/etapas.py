@@ -0,0 +1,321 @@
+"""
+Suite de benchmarks de las etapas del flujo sobre datos sintéticos de varios tamaños:
+limpieza de textos, carga de CSV, extracción de tags, embeddings, matriz de afinidad y
+ranking. Los resultados se guardan en JSON (con el commit y las versiones de las
+librerías) para comparar ejecuciones entre commits con --comparar.
+
+Por defecto los embeddings usan un codificador falso determinista (--codificador stub),
+así se mide el coste propio del código sin el del modelo; --codificador modelo usa el
+SentenceTransformer local. Las etapas de tags se omiten si spaCy no está disponible.
+
+Uso:
+    python benchmarks/etapas.py --tamanos 1000x100 10000x500
+    python benchmarks/etapas.py --etapas afinidad ranking_top_k --tamanos 100000x2000
+    python benchmarks/etapas.py --comparar benchmarks/resultados/anterior.json
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import escribir_datos, generar_cursos
+
+from src.data_preprocessing import (
+    cargar_datos_cursos,
+    cargar_datos_estudiantes,
+    limpiar_texto,
+    limpiar_texto_serie,
+)
+from src.embeddings import CacheEmbeddingsTags, obtener_embeddings_tags_df
+from src.recommender import ranking_top_k, recomendar_cursos_todos_los_estudiantes
+from src.similarity import calcular_matriz_afinidad
+
+ETAPAS = (
+    "limpiar_texto",
+    "limpiar_texto_serie",
+    "cargar_datos",
+    "tags_cursos",
+    "tags_estudiantes",
+    "embeddings",
+    "afinidad",
+    "ranking_top_k",
+    "recomendar_todos",
+)
+CARPETA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+class CodificadorFalso:
+    """
+    Sustituto de SentenceTransformer: cada texto se convierte en un vector aleatorio
+    fijo (semilla derivada del texto), con la misma interfaz encode / dimensión.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, textos, batch_size=64):
+        if isinstance(textos, str):
+            textos = [textos]
+        vectores = np.empty((len(textos), self.dimension), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            semilla = int.from_bytes(
+                hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            vectores[i] = np.random.default_rng(semilla).standard_normal(self.dimension)
+        return vectores
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parsear_tamano(texto):
+    estudiantes, _, cursos = texto.lower().partition("x")
+    return int(estudiantes), int(cursos or max(1, int(estudiantes) // 20))
+
+
+def _tags_disponibles():
+    """Devuelve None si spaCy puede cargarse, o el motivo por el que no."""
+    try:
+        from src.tag_extraction import get_nlp
+
+        get_nlp()
+    except (ImportError, OSError) as e:
+        return f"spaCy no disponible: {e}"
+    return None
+
+
+def _con_embeddings(df, modelo):
+    return obtener_embeddings_tags_df(
+        df[[df.columns[0], "Tags"]], model=modelo, cache=CacheEmbeddingsTags(path=None)
+    )
+
+
+def benchmark_tamano(n, m, etapas, modelo, repeticiones, carpeta):
+    """Mide las etapas pedidas con n estudiantes y m cursos. Retorna una lista de resultados."""
+    path_estudiantes, path_cursos = escribir_datos(carpeta, n, m)
+    df_estudiantes = cargar_datos_estudiantes(path_estudiantes)
+    df_cursos = cargar_datos_cursos(path_cursos)
+    descripciones = pd.read_csv(path_estudiantes)["Descripcion"]
+    motivo_sin_tags = (
+        _tags_disponibles()
+        if {"tags_cursos", "tags_estudiantes"} & set(etapas)
+        else None
+    )
+
+    # Entradas de las etapas de afinidad y ranking (fuera de la medición)
+    emb_estudiantes = emb_cursos = matriz = X = Y = None
+    if {"afinidad", "ranking_top_k", "recomendar_todos"} & set(etapas):
+        # Misma semilla que escribir_datos: los tags con los que se armó cada curso
+        tags_cursos = generar_cursos(m, con_tags=True)
+        emb_estudiantes = _con_embeddings(pd.read_csv(path_estudiantes), modelo)
+        emb_cursos = _con_embeddings(tags_cursos, modelo)
+        matriz = calcular_matriz_afinidad(emb_estudiantes, emb_cursos)
+        X = np.stack(emb_estudiantes["Tags_Embedding"].values)
+        Y = np.stack(emb_cursos["Tags_Embedding"].values)
+
+    def tags_cursos_df():
+        from src.tag_extraction import configurar_cache_lemas, extraer_tags_cursos_df
+
+        # Caché de lemas vacía en cada repetición: se mide el trabajo de spaCy
+        configurar_cache_lemas(None)
+        return extraer_tags_cursos_df(df_cursos, lematizar_ia=False)
+
+    def tags_estudiantes_df():
+        from src.tag_extraction import (
+            configurar_cache_lemas,
+            extraer_tags_estudiantes_df,
+        )
+
+        configurar_cache_lemas(None)
+        return extraer_tags_estudiantes_df(df_estudiantes)
+
+    funciones = {
+        "limpiar_texto": (n, lambda: descripciones.apply(limpiar_texto)),
+        "limpiar_texto_serie": (n, lambda: limpiar_texto_serie(descripciones)),
+        "cargar_datos": (
+            n + m,
+            lambda: (
+                cargar_datos_estudiantes(path_estudiantes),
+                cargar_datos_cursos(path_cursos),
+            ),
+        ),
+        "tags_cursos": (m, tags_cursos_df),
+        "tags_estudiantes": (n, tags_estudiantes_df),
+        "embeddings": (
+            n,
+            lambda: _con_embeddings(pd.read_csv(path_estudiantes), modelo),
+        ),
+        "afinidad": (
+            n,
+            lambda: calcular_matriz_afinidad(emb_estudiantes, emb_cursos),
+        ),
+        "ranking_top_k": (
+            n,
+            lambda: ranking_top_k(X, Y, emb_cursos["CursoID"].values, k=3),
+        ),
+        "recomendar_todos": (
+            n,
+            lambda: recomendar_cursos_todos_los_estudiantes(matriz, top_n=3),
+        ),
+    }
+
+    resultados = []
+    for etapa in etapas:
+        resultado = {"etapa": etapa, "estudiantes": n, "cursos": m}
+        if etapa.startswith("tags_") and motivo_sin_tags:
+            resultado["omitida"] = motivo_sin_tags
+        else:
+            filas, funcion = funciones[etapa]
+            tiempos, _ = medir(funcion, repeticiones)
+            resultado.update(
+                {
+                    "filas": filas,
+                    "segundos_min": min(tiempos),
+                    "segundos_mediana": statistics.median(tiempos),
+                    "filas_por_segundo": filas / min(tiempos) if min(tiempos) else None,
+                }
+            )
+        resultados.append(resultado)
+        print(_linea(resultado))
+    return resultados
+
+
+def _linea(resultado):
+    tamano = f"{resultado['estudiantes']}x{resultado['cursos']}"
+    if "omitida" in resultado:
+        return (
+            f"{resultado['etapa']:<20} {tamano:>14}  omitida ({resultado['omitida']})"
+        )
+    return (
+        f"{resultado['etapa']:<20} {tamano:>14}  {resultado['segundos_min']:9.4f} s"
+        f"  {resultado['filas_por_segundo'] or 0:14.0f} filas/s"
+    )
+
+
+def comparar(resultados, path_base, umbral):
+    """
+    Compara segundos_min con los de un JSON anterior (misma etapa y tamaño).
+    Retorna el número de etapas más lentas que la base en más de umbral (0.2 = 20 %).
+    """
+    with open(path_base, "r", encoding="utf-8") as f:
+        base = {
+            (r["etapa"], r["estudiantes"], r["cursos"]): r
+            for r in json.load(f)["resultados"]
+            if "segundos_min" in r
+        }
+    print(f"\nComparación con {path_base} (actual / base):")
+    regresiones = 0
+    for r in resultados:
+        anterior = base.get((r["etapa"], r["estudiantes"], r["cursos"]))
+        if anterior is None or "segundos_min" not in r:
+            continue
+        razon = r["segundos_min"] / anterior["segundos_min"]
+        marca = ""
+        if razon > 1 + umbral:
+            marca = "  REGRESIÓN"
+            regresiones += 1
+        print(
+            f"{r['etapa']:<20} {r['estudiantes']:>7}x{r['cursos']:<6} {razon:6.2f}x{marca}"
+        )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--tamanos",
+        nargs="+",
+        default=["1000x100", "10000x500"],
+        help="Tamaños ESTUDIANTESxCURSOS",
+    )
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--codificador", choices=("stub", "modelo"), default="stub")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--umbral", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.codificador == "stub":
+        modelo = CodificadorFalso()
+    else:
+        from src.embeddings import get_sentence_transformer_model
+
+        modelo = get_sentence_transformer_model()
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as carpeta:
+        for tamano in args.tamanos:
+            n, m = _parsear_tamano(tamano)
+            resultados.extend(
+                benchmark_tamano(n, m, args.etapas, modelo, args.repeticiones, carpeta)
+            )
+
+    commit = _commit()
+    fecha = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    salida = args.salida or os.path.join(
+        CARPETA_RESULTADOS, f"{fecha}_{(commit or 'sin-commit')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(salida) or ".", exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "fecha": fecha,
+                "commit": commit,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "codificador": args.codificador,
+                "repeticiones": args.repeticiones,
+                "resultados": resultados,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        return 1 if comparar(resultados, args.comparar, args.umbral) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark de la normalización de textos: limpiar_texto_serie (vectorizada) frente a la
+implementación anterior de limpiar_texto aplicada celda a celda con .apply.
+Genera un corpus sintético de descripciones (o usa una columna de un CSV) y verifica
+que ambas den el mismo resultado en los caracteres que la versión anterior ya trataba.
+
+Uso:
+    python benchmarks/normalizacion_texto.py --filas 200000
+    python benchmarks/normalizacion_texto.py --csv data/courses.csv --columna Descripcion
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_preprocessing import limpiar_texto, limpiar_texto_serie
+
+PALABRAS = (
+    "introducción a los conceptos y técnicas de programación, análisis de datos, "
+    "diseño de algoritmos; redes neuronales! seguridad informática (criptografía) "
+    "matemáticas: álgebra, cálculo y estadística. Ingeniería de software ¿ágil? "
+    "compañía niño año MÉTODOS ÓPTIMOS 2024 100% IA/ML"
+).split()
+
+
+def limpiar_texto_anterior(texto):
+    """Implementación previa de limpiar_texto, como referencia."""
+    if pd.isnull(texto):
+        return ""
+    texto = str(texto).lower()
+    texto = (
+        texto.replace("á", "a")
+        .replace("é", "e")
+        .replace("í", "i")
+        .replace("ó", "o")
+        .replace("ú", "u")
+    )
+    texto = texto.replace("ñ", "n")
+    texto = re.sub(r"[^a-z0-9\s]", "", texto)
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto
+
+
+def corpus_sintetico(filas, palabras_por_fila=40, semilla=0):
+    rng = random.Random(semilla)
+    return pd.Series(
+        [
+            " ".join(rng.choices(PALABRAS, k=rng.randint(1, 2 * palabras_por_fila)))
+            for _ in range(filas)
+        ]
+    )
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--csv", help="CSV con los textos a normalizar")
+    parser.add_argument("--columna", default="Descripcion")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.csv:
+        serie = pd.read_csv(args.csv, comment="#")[args.columna]
+    else:
+        serie = corpus_sintetico(args.filas)
+    print(f"Textos: {len(serie)} ({serie.fillna('').str.len().sum()} caracteres)")
+
+    resultados = {}
+    for nombre, funcion in (
+        ("anterior (.apply)", lambda: serie.apply(limpiar_texto_anterior)),
+        ("limpiar_texto (.apply)", lambda: serie.apply(limpiar_texto)),
+        ("limpiar_texto_serie", lambda: limpiar_texto_serie(serie)),
+    ):
+        segundos, resultados[nombre] = medir(funcion, args.repeticiones)
+        print(f"{nombre:<24} {segundos:8.3f} s  {len(serie) / segundos:12.0f} textos/s")
+
+    referencia = resultados["anterior (.apply)"]
+    iguales = (resultados["limpiar_texto_serie"] == referencia).all()
+    print(f"Mismo resultado que la versión anterior: {iguales}")
+
+
+if __name__ == "__main__":
+    main()
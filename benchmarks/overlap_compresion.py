@@ -0,0 +1,180 @@
+"""
+Compara los modos de compresión de embeddings (src/compresion.py) con la precisión
+completa: para cada modo informa la memoria de la matriz de estudiantes, el tiempo de
+ajuste y de ranking, y la coincidencia del top-k con el ranking float32 (overlap@k).
+
+Los embeddings se leen de los almacenes de --data (students_tags_embeddings y
+courses_tags_embeddings) o, con --sinteticos, se generan como promedio de vectores de
+tags al azar (igual que se arma el embedding de tags de cada estudiante y curso).
+
+Uso:
+    python benchmarks/overlap_compresion.py --data data --k 1 3 5 10
+    python benchmarks/overlap_compresion.py --sinteticos 50000x1000 --dimensiones-pca 64 128 256
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from src.compresion import (
+    MAX_MUESTRA_PCA,
+    MotorRankingComprimido,
+    comprimir_estudiantes,
+    overlap_at_k,
+)
+from src.embeddings import cargar_almacen_embeddings
+from src.recommender import MotorRanking
+
+# Dimensión de distiluse-base-multilingual-cased-v1
+DIMENSION = 512
+
+
+def embeddings_sinteticos(n, m, dimension=DIMENSION, n_tags=300, semilla=0):
+    """(estudiantes, cursos): cada fila es el promedio de 3-6 vectores de tags al azar."""
+    rng = np.random.default_rng(semilla)
+    tags = rng.standard_normal((n_tags, dimension)).astype(np.float32)
+
+    def filas(cantidad):
+        matriz = np.empty((cantidad, dimension), dtype=np.float32)
+        for i in range(cantidad):
+            propios = rng.choice(n_tags, rng.integers(3, 7), replace=False)
+            matriz[i] = tags[propios].mean(axis=0)
+        return matriz
+
+    return filas(n), filas(m)
+
+
+def cargar_embeddings(data_path):
+    estudiantes = cargar_almacen_embeddings(
+        os.path.join(data_path, "students_tags_embeddings")
+    )
+    cursos = cargar_almacen_embeddings(
+        os.path.join(data_path, "courses_tags_embeddings")
+    )
+    if estudiantes is None or cursos is None:
+        raise SystemExit(f"No hay embeddings de estudiantes y cursos en {data_path}.")
+    return np.asarray(estudiantes.matriz), np.asarray(cursos.matriz)
+
+
+def evaluar(emb_estudiantes, emb_cursos, modos, ks):
+    """Un resultado por modo, con overlap@k contra el ranking float32."""
+    ids_cursos = np.arange(len(emb_cursos))
+    k_max = max(ks)
+    inicio = time.perf_counter()
+    referencia, _ = MotorRanking(emb_cursos, ids_cursos).top_k(emb_estudiantes, k=k_max)
+    segundos_referencia = time.perf_counter() - inicio
+    bytes_referencia = emb_estudiantes.shape[0] * emb_estudiantes.shape[1] * 4
+
+    resultados = [
+        {
+            "modo": "float32",
+            "bytes": bytes_referencia,
+            "razon": 1.0,
+            "segundos_ajuste": 0.0,
+            "segundos_ranking": segundos_referencia,
+            **{f"overlap@{k}": 1.0 for k in ks},
+        }
+    ]
+    for modo, parametros in modos:
+        inicio = time.perf_counter()
+        compresion, codigos = comprimir_estudiantes(emb_estudiantes, modo, **parametros)
+        segundos_ajuste = time.perf_counter() - inicio
+        motor = MotorRankingComprimido(emb_cursos, ids_cursos, compresion)
+        inicio = time.perf_counter()
+        ids, _ = motor.top_k(codigos, k=k_max)
+        resultado = {
+            **compresion.parametros(),
+            "bytes": codigos.nbytes,
+            "razon": bytes_referencia / codigos.nbytes,
+            "segundos_ajuste": segundos_ajuste,
+            "segundos_ranking": time.perf_counter() - inicio,
+        }
+        for k in ks:
+            resultado[f"overlap@{k}"] = overlap_at_k(referencia, ids, k)
+        resultados.append(resultado)
+    return resultados
+
+
+def _nombre(resultado):
+    if resultado["modo"] == "pca":
+        return f"pca-{resultado['dimension']}"
+    return resultado["modo"]
+
+
+def imprimir(resultados, ks):
+    columnas = "".join(f"{f'overlap@{k}':>12}" for k in ks)
+    print(
+        f"{'modo':<10}{'MB':>10}{'razón':>8}{'ajuste s':>10}{'ranking s':>11}{columnas}"
+    )
+    for r in resultados:
+        overlaps = "".join(f"{r[f'overlap@{k}']:12.4f}" for k in ks)
+        print(
+            f"{_nombre(r):<10}{r['bytes'] / 2**20:10.1f}{r['razon']:8.1f}"
+            f"{r['segundos_ajuste']:10.3f}{r['segundos_ranking']:11.3f}{overlaps}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    origen = parser.add_mutually_exclusive_group()
+    origen.add_argument("--data", default="data", help="Carpeta con los almacenes")
+    origen.add_argument("--sinteticos", help="Tamaño ESTUDIANTESxCURSOS")
+    parser.add_argument(
+        "--modos",
+        nargs="+",
+        choices=("float16", "int8", "pca"),
+        default=["float16", "int8", "pca"],
+    )
+    parser.add_argument("--dimensiones-pca", nargs="+", type=int, default=[64, 128])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 5, 10])
+    parser.add_argument(
+        "--max-estudiantes", type=int, help="Evaluar solo una muestra de estudiantes"
+    )
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Guardar los resultados en este JSON")
+    args = parser.parse_args()
+
+    if args.sinteticos:
+        n, _, m = args.sinteticos.lower().partition("x")
+        emb_estudiantes, emb_cursos = embeddings_sinteticos(
+            int(n), int(m or max(1, int(n) // 20)), semilla=args.semilla
+        )
+    else:
+        emb_estudiantes, emb_cursos = cargar_embeddings(args.data)
+    if args.max_estudiantes and args.max_estudiantes < len(emb_estudiantes):
+        rng = np.random.default_rng(args.semilla)
+        emb_estudiantes = emb_estudiantes[
+            np.sort(rng.choice(len(emb_estudiantes), args.max_estudiantes, False))
+        ]
+
+    # La PCA no puede tener más componentes que filas de ajuste o dimensiones: las
+    # dimensiones pedidas por encima de ese tope darían filas repetidas
+    tope_pca = min(len(emb_estudiantes), MAX_MUESTRA_PCA, emb_estudiantes.shape[1])
+    dimensiones_pca = sorted({min(d, tope_pca) for d in args.dimensiones_pca})
+    modos = []
+    for modo in args.modos:
+        if modo == "pca":
+            modos.extend(("pca", {"dimension": d}) for d in dimensiones_pca)
+        else:
+            modos.append((modo, {}))
+    print(
+        f"{len(emb_estudiantes)} estudiantes x {len(emb_cursos)} cursos, "
+        f"dimensión {emb_estudiantes.shape[1]}"
+    )
+    resultados = evaluar(emb_estudiantes, emb_cursos, modos, sorted(set(args.k)))
+    imprimir(resultados, sorted(set(args.k)))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
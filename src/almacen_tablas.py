@@ -0,0 +1,296 @@
+"""
+Almacenamiento de las tablas de estudiantes y cursos detrás de la API.
+AlmacenCSV mantiene el comportamiento original (un archivo CSV que se lee entero);
+AlmacenSQLite guarda las mismas filas en SQLite (modo WAL) con búsqueda por clave
+primaria, ediciones en sitio y máximo ID indexado, e importa/exporta los CSV.
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+
+try:
+    from src.metricas import get_metricas
+except ModuleNotFoundError:
+    from metricas import get_metricas
+
+# Tablas conocidas: nombre -> (columna ID, encabezados en orden)
+TABLAS = {
+    "students": ("EstudianteID", ["EstudianteID", "Nombre", "Tags", "Descripcion"]),
+    "courses": ("CursoID", ["CursoID", "Nombre", "Descripcion"]),
+}
+SQLITE_NOMBRE = "datos.sqlite"
+
+
+class AlmacenCSV:
+    """
+    Tabla respaldada por un archivo CSV. Cada operación lee el archivo completo
+    y las ediciones lo reescriben (comportamiento original de la API).
+    """
+
+    def __init__(self, file_path, id_field, headers):
+        self.file_path = file_path
+        self.id_field = id_field
+        self.headers = headers
+
+    def siguiente_id(self):
+        """Obtiene el siguiente ID incremental (último ID del archivo + 1)."""
+        next_id = 1
+        if os.path.exists(self.file_path):
+            rows = self._read_csv()
+            if rows:
+                next_id = int(rows[-1][self.id_field]) + 1
+        return next_id
+
+    def agregar(self, row):
+        """Agrega una fila (lista en el orden de headers), creando encabezado si es necesario."""
+        self.agregar_muchas([row])
+
+    def agregar_muchas(self, rows):
+        """Agrega varias filas con una sola apertura del archivo."""
+        write_header = (
+            not os.path.exists(self.file_path) or os.stat(self.file_path).st_size == 0
+        )
+        with get_metricas().medir_io(
+            "csv", "escritura", self.file_path, agregar=True
+        ), open(self.file_path, mode="a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(self.headers)
+            writer.writerows(rows)
+
+    def editar(self, row_id, cambios):
+        """Actualiza las columnas de cambios ({columna: valor}) de la fila con el ID dado."""
+        self._comprobar_archivo()
+        rows = self._read_csv()
+        found = False
+        for row in rows:
+            if str(row[self.id_field]) == str(row_id):
+                found = True
+                row.update(cambios)
+        if not found:
+            raise ValueError(f"No se encontró el registro con ID {row_id}.")
+        self._write_csv(rows)
+
+    def obtener(self, row_id):
+        """Devuelve un diccionario con los campos de una fila por su ID."""
+        self._comprobar_archivo()
+        for row in self._read_csv():
+            if str(row[self.id_field]) == str(row_id):
+                return row
+        raise ValueError(f"No se encontró el registro con ID {row_id}.")
+
+    def todas(self):
+        """Devuelve una lista de diccionarios con todas las filas."""
+        if not os.path.exists(self.file_path):
+            return []
+        return self._read_csv()
+
+    def version(self):
+        """
+        Estado del archivo en disco (mtime y tamaño): cambia con cualquier escritura,
+        también las de otro proceso. None si el archivo no existe.
+        """
+        try:
+            estado = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def _comprobar_archivo(self):
+        if not os.path.exists(self.file_path):
+            raise FileNotFoundError(
+                f"El archivo {os.path.basename(self.file_path)} no existe."
+            )
+
+    def _read_csv(self):
+        with get_metricas().medir_io("csv", "lectura", self.file_path):
+            with open(self.file_path, mode="r", encoding="utf-8") as f:
+                return list(csv.DictReader(f))
+
+    def _write_csv(self, rows):
+        with get_metricas().medir_io("csv", "escritura", self.file_path):
+            with open(self.file_path, mode="w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.headers)
+                writer.writeheader()
+                writer.writerows(rows)
+
+
+class AlmacenSQLite:
+    """
+    Tabla respaldada por SQLite en modo WAL. El ID es la clave primaria, por lo que
+    buscar, editar y calcular el siguiente ID no dependen del tamaño de la tabla.
+    Los valores se devuelven como texto, igual que los lee csv.DictReader.
+    Una misma conexión se comparte entre hilos protegida por un lock.
+    """
+
+    def __init__(self, db_path, tabla, id_field, headers):
+        self.db_path = db_path
+        self.tabla = tabla
+        self.id_field = id_field
+        self.headers = headers
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(db_path, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        columnas = ", ".join(
+            f'"{c}" INTEGER PRIMARY KEY' if c == id_field else f'"{c}" TEXT'
+            for c in headers
+        )
+        with self._conexion:
+            self._conexion.execute(f'CREATE TABLE IF NOT EXISTS "{tabla}" ({columnas})')
+
+    def _clave(self, row_id):
+        try:
+            return int(row_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"No se encontró el registro con ID {row_id}.")
+
+    def _columnas_sql(self, columnas):
+        return ", ".join(f'"{c}"' for c in columnas)
+
+    def _a_dict(self, valores):
+        return {c: "" if v is None else str(v) for c, v in zip(self.headers, valores)}
+
+    def vacia(self):
+        with self._lock:
+            fila = self._conexion.execute(
+                f'SELECT 1 FROM "{self.tabla}" LIMIT 1'
+            ).fetchone()
+        return fila is None
+
+    def siguiente_id(self):
+        """Obtiene el siguiente ID incremental (máximo ID + 1)."""
+        with self._lock:
+            (maximo,) = self._conexion.execute(
+                f'SELECT MAX("{self.id_field}") FROM "{self.tabla}"'
+            ).fetchone()
+        return 1 if maximo is None else int(maximo) + 1
+
+    def agregar(self, row):
+        """Agrega una fila (lista en el orden de headers)."""
+        self.agregar_muchas([row])
+
+    def agregar_muchas(self, rows):
+        """Agrega varias filas en una única transacción."""
+        marcadores = ", ".join("?" for _ in self.headers)
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                f'INSERT INTO "{self.tabla}" ({self._columnas_sql(self.headers)}) '
+                f"VALUES ({marcadores})",
+                [list(row) for row in rows],
+            )
+
+    def editar(self, row_id, cambios):
+        """Actualiza las columnas de cambios ({columna: valor}) de la fila con el ID dado."""
+        with self._lock, self._conexion:
+            if cambios:
+                asignaciones = ", ".join(f'"{c}" = ?' for c in cambios)
+                cursor = self._conexion.execute(
+                    f'UPDATE "{self.tabla}" SET {asignaciones} '
+                    f'WHERE "{self.id_field}" = ?',
+                    [*cambios.values(), self._clave(row_id)],
+                )
+                encontrado = cursor.rowcount > 0
+            else:
+                encontrado = (
+                    self._conexion.execute(
+                        f'SELECT 1 FROM "{self.tabla}" WHERE "{self.id_field}" = ?',
+                        [self._clave(row_id)],
+                    ).fetchone()
+                    is not None
+                )
+        if not encontrado:
+            raise ValueError(f"No se encontró el registro con ID {row_id}.")
+
+    def obtener(self, row_id):
+        """Devuelve un diccionario con los campos de una fila por su ID."""
+        with self._lock:
+            fila = self._conexion.execute(
+                f'SELECT {self._columnas_sql(self.headers)} FROM "{self.tabla}" '
+                f'WHERE "{self.id_field}" = ?',
+                [self._clave(row_id)],
+            ).fetchone()
+        if fila is None:
+            raise ValueError(f"No se encontró el registro con ID {row_id}.")
+        return self._a_dict(fila)
+
+    def todas(self):
+        """Devuelve una lista de diccionarios con todas las filas, ordenadas por ID."""
+        with self._lock:
+            filas = self._conexion.execute(
+                f'SELECT {self._columnas_sql(self.headers)} FROM "{self.tabla}" '
+                f'ORDER BY "{self.id_field}"'
+            ).fetchall()
+        return [self._a_dict(fila) for fila in filas]
+
+    def version(self):
+        """
+        Estado de la tabla: PRAGMA data_version cambia cuando otra conexión confirma
+        cambios, total_changes con los de esta conexión, y el máximo ID con cada alta.
+        """
+        with self._lock:
+            (datos,) = self._conexion.execute("PRAGMA data_version").fetchone()
+            (maximo,) = self._conexion.execute(
+                f'SELECT MAX("{self.id_field}") FROM "{self.tabla}"'
+            ).fetchone()
+            return (datos, self._conexion.total_changes, maximo)
+
+    def importar_csv(self, csv_path, reemplazar=True):
+        """
+        Carga las filas de un CSV con los mismos encabezados. Con reemplazar=True
+        se vacía antes la tabla. Retorna el número de filas importadas.
+        """
+        with open(csv_path, mode="r", encoding="utf-8") as f:
+            rows = [
+                [row.get(c) for c in self.headers]
+                for row in csv.DictReader(
+                    line for line in f if not line.lstrip().startswith(("#", "//"))
+                )
+            ]
+        if reemplazar:
+            with self._lock, self._conexion:
+                self._conexion.execute(f'DELETE FROM "{self.tabla}"')
+        self.agregar_muchas(rows)
+        return len(rows)
+
+    def exportar_csv(self, csv_path):
+        """Escribe la tabla en un CSV con el formato original. Retorna el número de filas."""
+        rows = self.todas()
+        temporal = csv_path + ".tmp"
+        with open(temporal, mode="w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.headers)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temporal, csv_path)
+        return len(rows)
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+BACKENDS = {"csv", "sqlite"}
+
+
+def abrir_tabla(data_path, tabla, backend="csv"):
+    """
+    Devuelve el almacén de la tabla ('students' o 'courses') en data_path.
+    Con backend 'sqlite', la primera vez que se abre una tabla vacía se importa
+    el CSV existente (data_path/<tabla>.csv).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Backend de almacenamiento desconocido: {backend}. Usa uno de {sorted(BACKENDS)}."
+        )
+    id_field, headers = TABLAS[tabla]
+    csv_path = os.path.join(data_path, f"{tabla}.csv")
+    if backend == "csv":
+        return AlmacenCSV(csv_path, id_field, headers)
+    almacen = AlmacenSQLite(
+        os.path.join(data_path, SQLITE_NOMBRE), tabla, id_field, headers
+    )
+    if almacen.vacia() and os.path.exists(csv_path):
+        almacen.importar_csv(csv_path)
+    return almacen
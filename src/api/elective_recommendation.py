@@ -1,13 +1,265 @@
 import os
-import csv
 import sys
+import importlib
 import importlib.util
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class _IndiceRecomendacion:
+    """
+    Índice residente en memoria: embeddings de estudiantes ya normalizados y el motor
+    de ranking con la matriz de cursos normalizada. Se reconstruye cuando cambia su firma.
+    Con una compresión (ver src/compresion.py) los estudiantes se guardan comprimidos y
+    se puntúan con el motor de ese modo.
+    """
+
+    def __init__(
+        self,
+        almacen_estudiantes,
+        almacen_cursos,
+        recommender,
+        firma,
+        ann=None,
+        esfuerzo_ann=None,
+        compresion=None,
+        motor_comprimido=None,
+        ajustar_compresion=True,
+    ):
+        self.firma = firma
+        self.almacen_estudiantes = almacen_estudiantes
+        self.estudiantes = recommender.normalizar_filas(almacen_estudiantes.matriz)
+        self.compresion = compresion
+        if compresion is not None:
+            # Con ajustar_compresion=False se reutiliza una compresión ya ajustada
+            if ajustar_compresion:
+                compresion.ajustar(self.estudiantes)
+            self.estudiantes = compresion.comprimir(self.estudiantes)
+        self.ann = ann
+        self.esfuerzo_ann = esfuerzo_ann
+        self.motor = None
+        if ann is None and compresion is not None:
+            self.motor = motor_comprimido(
+                almacen_cursos.matriz, np.asarray(almacen_cursos.ids), compresion
+            )
+        elif ann is None:
+            self.motor = recommender.MotorRanking(
+                almacen_cursos.matriz, np.asarray(almacen_cursos.ids)
+            )
+
+    def _buscar(self, consultas, top_n):
+        """(ids, puntuaciones) de las filas dadas de self.estudiantes."""
+        if self.ann is not None:
+            if self.compresion is not None:
+                consultas = self.compresion.descomprimir(consultas)
+            return self.ann.buscar(consultas, k=top_n, esfuerzo=self.esfuerzo_ann)
+        if self.compresion is not None:
+            return self.motor.top_k(consultas, k=top_n)
+        return self.motor.top_k(consultas, k=top_n, normalizados=True)
+
+    def top_k(self, estudiante_id, top_n):
+        fila = self.almacen_estudiantes.fila(estudiante_id)
+        ids, puntuaciones = self._buscar(self.estudiantes[fila : fila + 1], top_n)
+        validos = ids[0] >= 0 if self.ann is not None else slice(None)
+        return list(zip(ids[0][validos], puntuaciones[0][validos].astype(np.float64)))
+
+    def top_k_lote(self, estudiante_ids, top_n):
+        """
+        Rankings de varios estudiantes con una sola consulta al motor (un producto
+        matricial por bloque). Los IDs que no están en el índice dan None.
+        """
+        filas = self.almacen_estudiantes.filas(estudiante_ids)
+        validas = np.flatnonzero(filas >= 0)
+        rankings = [None] * len(filas)
+        if len(validas) == 0:
+            return rankings
+        ids, puntuaciones = self._buscar(self.estudiantes[filas[validas]], top_n)
+        for i, ids_fila, puntuaciones_fila in zip(validas, ids, puntuaciones):
+            validos = ids_fila >= 0
+            rankings[i] = list(
+                zip(ids_fila[validos], puntuaciones_fila[validos].astype(np.float64))
+            )
+        return rankings
+
+
+# Variación relativa del número de estudiantes a partir de la cual el índice vuelve a
+# ajustar la compresión (SVD de la PCA, rangos de int8) en lugar de reutilizarla
+UMBRAL_REAJUSTE_COMPRESION = 0.1
+
+# De más a menos activo, para combinar el estado de un ID en las dos colas de tipos
+PRIORIDAD_ESTADOS = ("en_proceso", "pendiente", "error", "listo", "desconocido")
+
+
+class _ColaRecalculo:
+    """
+    Cola de recalculaciones atendida por un hilo de fondo.
+    Cada trabajo se identifica por (tipo, id): si ya hay uno pendiente con la misma clave,
+    el nuevo se fusiona con él. Una edición que llega mientras su trabajo se está
+    ejecutando vuelve a encolarlo, para que el resultado final refleje el último cambio.
+    """
+
+    def __init__(self, ejecutar):
+        self._ejecutar = ejecutar
+        self._cola = deque()
+        self._pendientes = set()
+        self._en_proceso = None
+        self._estados = {}
+        self._contadores = dict.fromkeys(
+            ("encolados", "fusionados", "completados", "errores"), 0
+        )
+        self._condicion = threading.Condition()
+        self._activa = True
+        self._hilo = threading.Thread(
+            target=self._trabajar, name="recalculo", daemon=True
+        )
+        self._hilo.start()
+
+    def encolar(self, clave):
+        with self._condicion:
+            if not self._activa:
+                raise RuntimeError("La cola de recalculación está detenida.")
+            if clave in self._pendientes:
+                self._contadores["fusionados"] += 1
+                return False
+            self._pendientes.add(clave)
+            self._cola.append(clave)
+            self._estados[clave] = {"estado": "pendiente", "error": None}
+            self._contadores["encolados"] += 1
+            self._condicion.notify_all()
+            return True
+
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                while self._activa and not self._cola:
+                    self._condicion.wait()
+                if not self._cola:
+                    return
+                clave = self._cola.popleft()
+                self._pendientes.discard(clave)
+                self._en_proceso = clave
+                self._estados[clave] = {"estado": "en_proceso", "error": None}
+            error = None
+            try:
+                self._ejecutar(*clave)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            with self._condicion:
+                self._en_proceso = None
+                if clave not in self._pendientes:
+                    self._estados[clave] = {
+                        "estado": "error" if error else "listo",
+                        "error": error,
+                    }
+                self._contadores["errores" if error else "completados"] += 1
+                self._condicion.notify_all()
+
+    def _ocupada(self, claves):
+        return any(
+            clave in self._pendientes or clave == self._en_proceso for clave in claves
+        )
+
+    def esperar(self, claves=None, timeout=None):
+        """
+        Espera a que terminen los trabajos de las claves dadas (o todos si claves es None).
+        Retorna True si terminaron antes del timeout.
+        """
+        with self._condicion:
+            if claves is None:
+                return self._condicion.wait_for(
+                    lambda: not self._cola and self._en_proceso is None, timeout
+                )
+            return self._condicion.wait_for(lambda: not self._ocupada(claves), timeout)
+
+    def estado(self, clave=None):
+        with self._condicion:
+            if clave is not None:
+                return dict(self._estados.get(clave, {"estado": "desconocido"}))
+            return {
+                "pendientes": len(self._cola),
+                "en_proceso": self._en_proceso,
+                **self._contadores,
+            }
+
+    def detener(self, esperar=True):
+        with self._condicion:
+            self._activa = False
+            if not esperar:
+                self._cola.clear()
+                self._pendientes.clear()
+            self._condicion.notify_all()
+        self._hilo.join()
+
+
+def _comprobar_textos(**campos):
+    """Lanza ValueError si algún campo dado (distinto de None) no es un texto."""
+    for campo, valor in campos.items():
+        if valor is not None and not isinstance(valor, str):
+            raise ValueError(f"El campo {campo} debe ser un texto.")
 
 
 class ElectiveRecommendationAPI:
-    def __init__(self, data_path):
+    def __init__(
+        self,
+        data_path,
+        indice_ann=None,
+        esfuerzo_ann=None,
+        almacen="csv",
+        recalculo_asincrono=False,
+        compresion=None,
+        dimension_pca=128,
+    ):
+        """
+        indice_ann: backend de vecinos aproximados ("auto", "ivf", "hnswlib", "faiss") con el que
+        se consultan los cursos en lugar de compararlos todos; None usa la búsqueda exacta.
+        esfuerzo_ann: calidad/latencia de la búsqueda aproximada (listas sondeadas o ef).
+        almacen: "csv" (students.csv y courses.csv, por defecto) o "sqlite" (data_path/datos.sqlite,
+        que importa los CSV la primera vez; export_tables los vuelve a escribir).
+        recalculo_asincrono: si es True, registrar/editar devuelven en cuanto se escribe la fila
+        y los tags y embeddings se recalculan en un hilo de fondo (ver wait_for y recalculation_status).
+        compresion: modo en que el índice guarda los embeddings de estudiantes ("float16", "int8"
+        o "pca" con dimension_pca componentes; ver src/compresion.py); None usa float32.
+        La compresión se ajusta al construir el primer índice y las reconstrucciones la
+        reutilizan mientras el número de estudiantes no varíe más de
+        UMBRAL_REAJUSTE_COMPRESION; refit_compression() fuerza un nuevo ajuste.
+        """
         self.data_path = data_path
         self.predefined_tags = self._load_predefined_tags()
+        self.indice_ann = indice_ann
+        self.esfuerzo_ann = esfuerzo_ann
+        self.almacen = almacen
+        self.compresion = compresion
+        self.dimension_pca = dimension_pca
+        self._modulos = {}
+        self._tablas = {}
+        self._cache_textos = None
+        self._indice = None
+        self._ann = None
+        self._ann_firma = None
+        # Compresión ajustada que reutilizan las reconstrucciones del índice y la forma
+        # (estudiantes, dimensión) de la matriz sobre la que se ajustó
+        self._compresion_ajustada = None
+        self._compresion_forma = None
+        # Se incrementa cada vez que recalculate_* escribe datos nuevos
+        self._version_datos = 0
+        # Serializa las recalculaciones (hilo de fondo y llamadas en lote)
+        self._lock_recalculo = threading.RLock()
+        # Excluye la escritura de los almacenes de embeddings y la construcción del índice
+        self._lock_embeddings = threading.Lock()
+        # Serializa las escrituras de filas (asignación de IDs incluida) cuando la
+        # misma instancia atiende varias sesiones; cada escritura sube la versión de su tabla
+        self._lock_tablas = threading.Lock()
+        self._version_tablas = {"students": 0, "courses": 0}
+        self._cola = (
+            _ColaRecalculo(self._ejecutar_recalculo) if recalculo_asincrono else None
+        )
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # Registro global de métricas (lo comparten los módulos de src)
+        self.metricas = self._dynamic_import(
+            "metricas", os.path.join(base_dir, "metricas.py")
+        ).get_metricas()
 
     def _load_predefined_tags(self):
         """Carga la lista de tags predefinidos desde un archivo Python en data_path."""
@@ -24,95 +276,109 @@ class ElectiveRecommendationAPI:
 
     # --- Métodos de estudiantes ---
     def register_student(self, nombre, tags, descripcion):
-        """Registra un nuevo estudiante en students.csv."""
+        """Registra un nuevo estudiante en la tabla de estudiantes."""
+        _comprobar_textos(nombre=nombre, tags=tags, descripcion=descripcion)
         if not nombre or not nombre.strip():
             raise ValueError("El nombre del estudiante no puede estar vacío.")
-        students_file = os.path.join(self.data_path, "students.csv")
-        estudiante_id = self._get_next_id(students_file, "EstudianteID")
-        self._append_row(
-            students_file,
-            ["EstudianteID", "Nombre", "Tags", "Descripcion"],
-            [estudiante_id, nombre, tags, descripcion],
-        )
-        self.recalculate_student_data(estudiante_id)
+        (fila,) = self._agregar_filas("students", [[nombre, tags, descripcion]])
+        estudiante_id = fila[0]
+        self._recalcular("student", estudiante_id)
         return estudiante_id
 
     def edit_student(self, estudiante_id, nombre=None, tags=None, descripcion=None):
-        """Edita los campos de un estudiante existente en students.csv."""
-        students_file = os.path.join(self.data_path, "students.csv")
+        """Edita los campos de un estudiante existente."""
         self._edit_row(
-            students_file,
-            "EstudianteID",
+            "students",
             estudiante_id,
-            ["EstudianteID", "Nombre", "Tags", "Descripcion"],
             nombre=nombre,
             tags=tags,
             descripcion=descripcion,
         )
-        self.recalculate_student_data(estudiante_id)
+        self._recalcular("student", estudiante_id)
         return True
 
     def get_student(self, estudiante_id):
         """Devuelve un diccionario con los campos del estudiante según su EstudianteID."""
-        students_file = os.path.join(self.data_path, "students.csv")
-        return self._get_row_by_id(students_file, "EstudianteID", estudiante_id)
+        return self._tabla("students").obtener(estudiante_id)
 
     # --- Métodos de cursos ---
     def register_course(self, nombre, descripcion):
-        """Registra un nuevo curso en courses.csv."""
+        """Registra un nuevo curso en la tabla de cursos."""
+        _comprobar_textos(nombre=nombre, descripcion=descripcion)
         if not nombre or not nombre.strip():
             raise ValueError("El nombre del curso no puede estar vacío.")
-        courses_file = os.path.join(self.data_path, "courses.csv")
-        curso_id = self._get_next_id(courses_file, "CursoID")
-        self._append_row(
-            courses_file,
-            ["CursoID", "Nombre", "Descripcion"],
-            [curso_id, nombre, descripcion],
-        )
-        self.recalculate_course_data(curso_id)
+        (fila,) = self._agregar_filas("courses", [[nombre, descripcion]])
+        curso_id = fila[0]
+        self._recalcular("course", curso_id)
         return curso_id
 
     def edit_course(self, curso_id, nombre=None, descripcion=None):
-        """Edita los campos de un curso existente en courses.csv."""
-        courses_file = os.path.join(self.data_path, "courses.csv")
-        self._edit_row(
-            courses_file,
-            "CursoID",
-            curso_id,
-            ["CursoID", "Nombre", "Descripcion"],
-            nombre=nombre,
-            descripcion=descripcion,
-        )
+        """Edita los campos de un curso existente."""
+        self._edit_row("courses", curso_id, nombre=nombre, descripcion=descripcion)
 
-        self.recalculate_course_data(curso_id)
+        self._recalcular("course", curso_id)
 
         return True
 
     def get_course(self, curso_id):
         """Devuelve un diccionario con los campos del curso según su CursoID."""
-        courses_file = os.path.join(self.data_path, "courses.csv")
-        return self._get_row_by_id(courses_file, "CursoID", curso_id)
+        return self._tabla("courses").obtener(curso_id)
 
     def get_all_courses(self):
         """Devuelve una lista de diccionarios, cada uno representando un curso disponible."""
-        courses_file = os.path.join(self.data_path, "courses.csv")
-        return self._get_all_rows(courses_file)
+        return self._tabla("courses").todas()
+
+    def get_table_version(self, tabla="courses"):
+        """
+        Versión de la tabla ("courses" o "students"): cambia con cada registro o edición,
+        así quien guarde un listado sabe cuándo volver a leerlo. Combina las escrituras de
+        esta instancia con el estado del almacén (mtime y tamaño del CSV, o data_version
+        y máximo ID en SQLite), así también cambia si la tabla la escribe otro proceso.
+        """
+        return (self._version_tablas[tabla], self._tabla(tabla).version())
+
+    def export_tables(self, destino=None):
+        """
+        Con el almacén SQLite, escribe students.csv y courses.csv en destino (por defecto data_path)
+        para que el flujo por lotes vea los datos actuales. Con el almacén CSV no hace nada.
+        """
+        if self.almacen == "csv":
+            return False
+        destino = destino or self.data_path
+        for nombre in ("students", "courses"):
+            self._tabla(nombre).exportar_csv(os.path.join(destino, f"{nombre}.csv"))
+        return True
 
     def get_predefined_tags(self):
         """Devuelve la lista de tags predefinidos cargados desde predefined_tags.py."""
         return self.predefined_tags
 
     def _dynamic_import(self, module_name, module_path):
-        """Importa dinámicamente un módulo dado su nombre y ruta."""
-        import importlib.util
-        import sys
-
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
+        """
+        Importa un módulo de src como 'src.<module_name>', reutilizando el que ya esté cargado
+        en el proceso. module_path es la ruta del archivo y sirve para ubicar la raíz del repositorio.
+        """
+        if module_name in self._modulos:
+            return self._modulos[module_name]
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(module_path)))
+        if raiz not in sys.path:
+            sys.path.insert(0, raiz)
+        module = importlib.import_module(f"src.{module_name}")
+        self._configurar_caches(module_name, module)
+        self._modulos[module_name] = module
         return module
 
+    def _configurar_caches(self, module_name, module):
+        """Ubica en data_path las cachés en disco de los módulos que las usan."""
+        if module_name == "embeddings":
+            module.configurar_cache_embeddings_tags(
+                os.path.join(self.data_path, "tags_embeddings_cache.pkl")
+            )
+        elif module_name == "tag_ia_suggestion":
+            module.configurar_cache_respuestas_llm(
+                os.path.join(self.data_path, "cache_llm")
+            )
+
     def recalculate_course_data(self, curso_id):
         """
         Recalcula y actualiza los tags del curso con el ID dado en courses_with_tags.csv
@@ -128,9 +394,17 @@ class ElectiveRecommendationAPI:
         courses_csv = os.path.join(self.data_path, "courses.csv")
         courses_with_tags_csv = os.path.join(self.data_path, "courses_with_tags.csv")
         # Preprocesar solo la fila del curso editado/registrado
-        df_curso = data_preprocessing.preprocesar_curso_por_id(courses_csv, curso_id)
+        if self.almacen == "csv":
+            df_curso = data_preprocessing.cargar_curso_por_id(
+                courses_csv, curso_id, cache=self._get_cache_textos(data_preprocessing)
+            )
+        else:
+            df_curso = data_preprocessing.preparar_df_cursos(
+                self._fila_df("courses", curso_id),
+                self._get_cache_textos(data_preprocessing),
+            )
         # Extraer y guardar los tags solo para ese curso
-        tag_extraction.extraer_guardar_tags_curso_por_id(
+        df_curso = tag_extraction.extraer_guardar_tags_curso_por_id(
             df_curso,
             curso_id,
             columna="Descripcion_Limpia",
@@ -139,16 +413,12 @@ class ElectiveRecommendationAPI:
             nombre_col="Nombre_Limpio",
             usar_ia=True,
         )
-        # Actualizar los embeddings de tags si es necesario
-        embeddings = self._dynamic_import(
-            "embeddings",
-            os.path.join(os.path.dirname(base_dir), "src", "embeddings.py"),
+        # Actualizar el embedding del curso si cambiaron sus tags
+        self._actualizar_embeddings(
+            courses_with_tags_csv,
+            "courses_tags_embeddings",
+            self._filas_tags(df_curso, "CursoID", curso_id),
         )
-        import pandas as pd
-
-        df_tags = pd.read_csv(courses_with_tags_csv)
-        embeddings_path = os.path.join(self.data_path, "courses_tags_embeddings.pkl")
-        embeddings.actualizar_embeddings_si_necesario(df_tags, embeddings_path)
         return True
 
     def recalculate_student_data(self, estudiante_id):
@@ -166,12 +436,19 @@ class ElectiveRecommendationAPI:
         students_csv = os.path.join(self.data_path, "students.csv")
         students_with_tags_csv = os.path.join(self.data_path, "students_with_tags.csv")
         # Preprocesar solo la fila del estudiante editado/registrado
-        df_estudiante = data_preprocessing.preprocesar_estudiante_por_id(
-            students_csv, estudiante_id
-        )
-        print(df_estudiante.columns)
+        if self.almacen == "csv":
+            df_estudiante = data_preprocessing.cargar_estudiante_por_id(
+                students_csv,
+                estudiante_id,
+                cache=self._get_cache_textos(data_preprocessing),
+            )
+        else:
+            df_estudiante = data_preprocessing.preparar_df_estudiantes(
+                self._fila_df("students", estudiante_id),
+                self._get_cache_textos(data_preprocessing),
+            )
         # Extraer y guardar los tags solo para ese estudiante
-        tag_extraction.extraer_guardar_tags_estudiante_por_id(
+        df_estudiante = tag_extraction.extraer_guardar_tags_estudiante_por_id(
             df_estudiante,
             estudiante_id,
             tags_col="Tags_List",
@@ -179,114 +456,495 @@ class ElectiveRecommendationAPI:
             n_max=10,
             csv_path=students_with_tags_csv,
         )
-        # Actualizar los embeddings de tags si es necesario
+        # Actualizar el embedding del estudiante si cambiaron sus tags
+        self._actualizar_embeddings(
+            students_with_tags_csv,
+            "students_tags_embeddings",
+            self._filas_tags(df_estudiante, "EstudianteID", estudiante_id),
+        )
+        return True
+
+    # --- Recalculación en segundo plano ---
+    def _recalcular(self, tipo, entidad_id):
+        """Recalcula ahora o, en modo asíncrono, encola el trabajo y devuelve enseguida."""
+        if self._cola is not None:
+            self._cola.encolar((tipo, entidad_id))
+        else:
+            self._ejecutar_recalculo(tipo, entidad_id)
+
+    def _ejecutar_recalculo(self, tipo, entidad_id):
+        with self._lock_recalculo, self.metricas.etapa(f"recalcular_{tipo}"):
+            if tipo == "course":
+                self.recalculate_course_data(entidad_id)
+            else:
+                self.recalculate_student_data(entidad_id)
+
+    def wait_for(self, entidad_id=None, tipo=None, timeout=None):
+        """
+        Espera a que terminen las recalculaciones pendientes del ID dado ("course", "student"
+        o ambos tipos si tipo es None), o de toda la cola si entidad_id es None.
+        Retorna True si terminaron antes del timeout (en modo síncrono, siempre True).
+        """
+        if self._cola is None:
+            return True
+        claves = None
+        if entidad_id is not None:
+            tipos = [tipo] if tipo else ["course", "student"]
+            claves = [(t, entidad_id) for t in tipos]
+        return self._cola.esperar(claves, timeout)
+
+    def recalculation_status(self, entidad_id=None, tipo=None):
+        """
+        Estado de la recalculación de un ID ("pendiente", "en_proceso", "listo", "error"
+        o "desconocido"), o el resumen de la cola si entidad_id es None. Como en wait_for,
+        tipo None considera ambos tipos y devuelve el estado más activo de los dos.
+        """
+        if self._cola is None:
+            return {"estado": "sincrono"}
+        if entidad_id is None:
+            return self._cola.estado()
+        tipos = [tipo] if tipo else ["course", "student"]
+        estados = [self._cola.estado((t, entidad_id)) for t in tipos]
+        return min(estados, key=lambda e: PRIORIDAD_ESTADOS.index(e["estado"]))
+
+    def shutdown(self, wait=True):
+        """Detiene el hilo de recalculación (terminando antes lo pendiente si wait=True)."""
+        if self._cola is not None:
+            self._cola.detener(esperar=wait)
+            self._cola = None
+
+    def _actualizar_embeddings(self, with_tags_csv, nombre_embeddings, filas=None):
+        """
+        Actualiza (de forma incremental) los embeddings e invalida el índice de recomendación.
+        Con filas (DataFrame con el ID y 'Tags' de las filas registradas o editadas) solo se
+        comparan y escriben esas filas; sin filas, o si aún no existe el almacén, se compara
+        la tabla completa del CSV de tags.
+        """
+        import pandas as pd
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         embeddings = self._dynamic_import(
-            "embeddings",
-            os.path.join(os.path.dirname(base_dir), "src", "embeddings.py"),
+            "embeddings", os.path.join(base_dir, "embeddings.py")
+        )
+        embeddings_path = os.path.join(self.data_path, nombre_embeddings)
+        if filas is not None:
+            id_col = "CursoID" if "CursoID" in filas.columns else "EstudianteID"
+            with self._lock_embeddings:
+                resumen = embeddings.actualizar_filas_embeddings(
+                    embeddings_path,
+                    id_col,
+                    filas[id_col].values,
+                    filas["Tags"].tolist(),
+                )
+                if resumen is not None:
+                    if resumen["codificadas"]:
+                        self._version_datos += 1
+                    return
+        with self.metricas.medir_io("csv", "lectura", with_tags_csv):
+            df_tags = pd.read_csv(with_tags_csv)
+        with self._lock_embeddings:
+            embeddings.actualizar_embeddings_si_necesario(df_tags, embeddings_path)
+            self._version_datos += 1
+
+    @staticmethod
+    def _filas_tags(df, id_col, entidad_id):
+        """ID y 'Tags' de la fila recalculada, para actualizar solo su embedding."""
+        return df.loc[df[id_col] == entidad_id, [id_col, "Tags"]]
+
+    # --- Registro en lote ---
+    def register_students_bulk(self, registros):
+        """
+        Registra varios estudiantes de una vez. registros es un iterable de diccionarios
+        con nombre, tags y descripcion (o de tuplas en ese orden). Las filas se agregan con una
+        sola escritura y el preprocesamiento, los tags y los embeddings se calculan en lote,
+        con el mismo resultado que llamar a register_student por cada uno.
+        Devuelve la lista de EstudianteID asignados.
+        """
+        filas = self._validar_registros(
+            registros, ("nombre", "tags", "descripcion"), "estudiante"
         )
+        if not filas:
+            return []
+        filas = self._agregar_filas("students", filas)
+        with self._lock_recalculo, self.metricas.etapa("registro_lote_student"):
+            self.recalculate_students_bulk(filas)
+        return [fila[0] for fila in filas]
+
+    def register_courses_bulk(self, registros, concurrencia_llm=4):
+        """
+        Registra varios cursos de una vez. registros es un iterable de diccionarios con
+        nombre y descripcion (o de tuplas en ese orden). Las sugerencias del LLM se piden
+        en paralelo (concurrencia_llm) y los tags y embeddings se calculan en lote.
+        Devuelve la lista de CursoID asignados.
+        """
+        filas = self._validar_registros(registros, ("nombre", "descripcion"), "curso")
+        if not filas:
+            return []
+        filas = self._agregar_filas("courses", filas)
+        with self._lock_recalculo, self.metricas.etapa("registro_lote_course"):
+            self.recalculate_courses_bulk(filas, concurrencia_llm=concurrencia_llm)
+        return [fila[0] for fila in filas]
+
+    def recalculate_students_bulk(self, filas):
+        """
+        Calcula en lote los tags y embeddings de las filas de estudiantes dadas
+        ([EstudianteID, Nombre, Tags, Descripcion]), igual que recalculate_student_data por fila.
+        """
+        import pandas as pd
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        data_preprocessing = self._dynamic_import(
+            "data_preprocessing", os.path.join(base_dir, "data_preprocessing.py")
+        )
+        tag_extraction = self._dynamic_import(
+            "tag_extraction", os.path.join(base_dir, "tag_extraction.py")
+        )
+        df = pd.DataFrame(filas, columns=self._tabla("students").headers)
+        df = data_preprocessing.preparar_df_estudiantes(df)
+        df = tag_extraction.extraer_tags_estudiantes_df(
+            df, tags_col="Tags_List", desc_col="Descripcion_Limpia", n_max=10
+        )
+        df["Tags"] = [
+            sorted(data_preprocessing.limpiar_texto(t) for t in tags)
+            for tags in df["Tags"]
+        ]
+        students_with_tags_csv = os.path.join(self.data_path, "students_with_tags.csv")
+        tag_extraction.guardar_filas_tags_csv(
+            df, "EstudianteID", students_with_tags_csv
+        )
+        self._actualizar_embeddings(
+            students_with_tags_csv,
+            "students_tags_embeddings",
+            df[["EstudianteID", "Tags"]],
+        )
+        return True
+
+    def recalculate_courses_bulk(self, filas, concurrencia_llm=4, usar_ia=True):
+        """
+        Calcula en lote los tags (IA y spaCy) y embeddings de las filas de cursos dadas
+        ([CursoID, Nombre, Descripcion]), igual que recalculate_course_data por fila.
+        """
         import pandas as pd
 
-        df_tags = pd.read_csv(students_with_tags_csv)
-        embeddings_path = os.path.join(self.data_path, "students_tags_embeddings.pkl")
-        embeddings.actualizar_embeddings_si_necesario(df_tags, embeddings_path)
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        data_preprocessing = self._dynamic_import(
+            "data_preprocessing", os.path.join(base_dir, "data_preprocessing.py")
+        )
+        tag_extraction = self._dynamic_import(
+            "tag_extraction", os.path.join(base_dir, "tag_extraction.py")
+        )
+        df = pd.DataFrame(filas, columns=self._tabla("courses").headers)
+        df = data_preprocessing.preparar_df_cursos(df)
+        if usar_ia:
+            tag_ia_suggestion = self._dynamic_import(
+                "tag_ia_suggestion", os.path.join(base_dir, "tag_ia_suggestion.py")
+            )
+            df = tag_ia_suggestion.sugerir_tags_df(
+                df, n_tags=3, concurrencia=concurrencia_llm
+            )
+        df = tag_extraction.extraer_tags_cursos_df(
+            df, columna="Descripcion_Limpia", n_max=10, lematizar_ia=False
+        )
+        courses_with_tags_csv = os.path.join(self.data_path, "courses_with_tags.csv")
+        tag_extraction.guardar_filas_tags_csv(df, "CursoID", courses_with_tags_csv)
+        self._actualizar_embeddings(
+            courses_with_tags_csv, "courses_tags_embeddings", df[["CursoID", "Tags"]]
+        )
         return True
 
+    def _validar_registros(self, registros, campos, entidad):
+        """
+        Convierte los registros (diccionarios o tuplas) en listas con los campos en orden.
+        Valida todos antes de escribir nada: un nombre vacío o un campo que no es texto
+        rechaza el lote completo.
+        """
+        filas = []
+        for registro in registros:
+            if isinstance(registro, dict):
+                fila = [registro.get(campo) for campo in campos]
+            else:
+                fila = list(registro)
+            if len(fila) != len(campos):
+                raise ValueError(
+                    f"Cada {entidad} debe tener los campos {', '.join(campos)}."
+                )
+            _comprobar_textos(**dict(zip(campos, fila)))
+            fila = ["" if valor is None else valor for valor in fila]
+            if not fila[0].strip():
+                raise ValueError(f"El nombre del {entidad} no puede estar vacío.")
+            filas.append(fila)
+        return filas
+
     def recomendar_top_cursos_para_estudiante(self, estudiante_id, top_n=3):
         """
         Devuelve el ranking top_n de cursos recomendados para un estudiante dado su ID,
-        usando los embeddings y la similitud coseno.
+        usando los embeddings y la similitud coseno sobre el índice residente en memoria.
+        La latencia de cada consulta se registra en recomendacion_segundos.
+        """
+        with self.metricas.medir("recomendacion_segundos"):
+            return self._get_indice().top_k(estudiante_id, top_n)
+
+    def recomendar_top_cursos_para_estudiantes(self, estudiante_ids, top_n=3):
+        """
+        Rankings top_n de varios estudiantes a la vez (mismo orden que estudiante_ids),
+        calculados con un solo producto matricial sobre el índice residente. Los IDs sin
+        embeddings devuelven None en lugar de lanzar ValueError. El tamaño de cada lote se
+        registra en recomendacion_lote y su latencia en recomendacion_lote_segundos.
         """
+        self.metricas.observar("recomendacion_lote", len(estudiante_ids))
+        with self.metricas.medir("recomendacion_lote_segundos"):
+            return self._get_indice().top_k_lote(estudiante_ids, top_n)
+
+    def warm_up(self, modelos=True):
+        """
+        Carga por adelantado las tablas, el índice de recomendación y (con modelos=True)
+        spaCy, el SentenceTransformer y la caché de embeddings de tags, para que la primera
+        consulta o registro de un servicio no pague esas cargas.
+        Lanza ValueError si todavía no hay embeddings de estudiantes o cursos.
+        """
+        for nombre in ("students", "courses"):
+            self._tabla(nombre)
+        if modelos:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            embeddings = self._dynamic_import(
+                "embeddings", os.path.join(base_dir, "embeddings.py")
+            )
+            tag_extraction = self._dynamic_import(
+                "tag_extraction", os.path.join(base_dir, "tag_extraction.py")
+            )
+            tag_extraction.get_nlp()
+            embeddings.get_sentence_transformer_model()
+            embeddings.get_cache_embeddings_tags()
+        return self._get_indice()
+
+    def _get_indice(self):
+        """
+        Devuelve el índice de recomendación, reconstruyéndolo si cambió la versión de los
+        datos o si otro proceso publicó una generación nueva de los embeddings.
+        """
+        firma = self._firma_indice()
+        if self._indice is not None and self._indice.firma == firma:
+            return self._indice
+        # Espera a que termine la escritura de embeddings en curso de esta instancia
+        # (no a toda la recalculación: los tags y el LLM no bloquean las consultas)
+        with self._lock_embeddings:
+            return self._construir_indice()
+
+    def _construir_indice(self):
+        """Abre los almacenes vigentes y arma el índice (con _lock_embeddings tomado)."""
+        students_emb_path = os.path.join(self.data_path, "students_tags_embeddings")
+        courses_emb_path = os.path.join(self.data_path, "courses_tags_embeddings")
+        firma = self._firma_indice()
+        if self._indice is not None and self._indice.firma == firma:
+            return self._indice
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         embeddings = self._dynamic_import(
             "embeddings", os.path.join(base_dir, "embeddings.py")
         )
-        similarity = self._dynamic_import(
-            "similarity", os.path.join(base_dir, "similarity.py")
-        )
         recommender = self._dynamic_import(
             "recommender", os.path.join(base_dir, "recommender.py")
         )
-        students_emb_path = os.path.join(self.data_path, "students_tags_embeddings.pkl")
-        courses_emb_path = os.path.join(self.data_path, "courses_tags_embeddings.pkl")
-        df_est = embeddings.cargar_embeddings_tags_df(students_emb_path)
-        df_cursos = embeddings.cargar_embeddings_tags_df(courses_emb_path)
-        if df_est is None or df_cursos is None:
+        almacen_est = embeddings.cargar_almacen_embeddings(students_emb_path)
+        almacen_cursos = embeddings.cargar_almacen_embeddings(courses_emb_path)
+        if almacen_est is None or almacen_cursos is None:
             raise ValueError(
                 "No se encontraron los embeddings de estudiantes o cursos."
             )
-        df_sim = similarity.similitud_estudiante_con_todos_los_cursos(
-            df_est, df_cursos, estudiante_id
+        # La firma es la de las generaciones efectivamente abiertas (cargar puede haber
+        # migrado un pickle antiguo, u otra escritura pudo publicar entre tanto)
+        firma = (
+            firma[0],
+            almacen_est.meta["generacion"],
+            almacen_cursos.meta["generacion"],
+        )
+        with self.metricas.etapa("construir_indice"):
+            ann = None
+            if self.indice_ann:
+                ann = self._get_indice_ann(almacen_cursos, firma[2])
+            compresion = motor_comprimido = None
+            ajustar = False
+            if self.compresion and self.compresion != "float32":
+                modulo_compresion = self._dynamic_import(
+                    "compresion", os.path.join(base_dir, "compresion.py")
+                )
+                compresion, ajustar = self._compresion_para(
+                    modulo_compresion, almacen_est.matriz.shape
+                )
+                motor_comprimido = modulo_compresion.MotorRankingComprimido
+            self._indice = _IndiceRecomendacion(
+                almacen_est,
+                almacen_cursos,
+                recommender,
+                firma,
+                ann=ann,
+                esfuerzo_ann=self.esfuerzo_ann,
+                compresion=compresion,
+                motor_comprimido=motor_comprimido,
+                ajustar_compresion=ajustar,
+            )
+            if ajustar:
+                self._compresion_ajustada = compresion
+                self._compresion_forma = almacen_est.matriz.shape
+        return self._indice
+
+    def _compresion_para(self, modulo_compresion, forma):
+        """
+        Retorna (compresion, ajustar): la compresión ya ajustada si la matriz de
+        estudiantes tiene la misma dimensión y su número de filas no varió más de
+        UMBRAL_REAJUSTE_COMPRESION desde el ajuste; si no, una nueva que hay que ajustar.
+        """
+        if self._compresion_ajustada is not None:
+            filas, dimension = forma
+            filas_ajuste, dimension_ajuste = self._compresion_forma
+            if (
+                dimension == dimension_ajuste
+                and abs(filas - filas_ajuste)
+                <= UMBRAL_REAJUSTE_COMPRESION * filas_ajuste
+            ):
+                return self._compresion_ajustada, False
+        parametros = (
+            {"dimension": self.dimension_pca} if self.compresion == "pca" else {}
+        )
+        return modulo_compresion.crear_compresion(self.compresion, **parametros), True
+
+    def refit_compression(self):
+        """
+        Vuelve a ajustar la compresión de los embeddings de estudiantes con los datos
+        actuales y reconstruye el índice. Retorna los parámetros de la compresión
+        (None si el índice no usa compresión).
+        """
+        with self._lock_embeddings:
+            self._compresion_ajustada = self._compresion_forma = None
+            self._indice = None
+            indice = self._construir_indice()
+        return None if indice.compresion is None else indice.compresion.parametros()
+
+    # --- Métricas ---
+    def metrics_snapshot(self):
+        """
+        Contadores y distribuciones (n, total, max, p50/p90/p99) registrados hasta ahora:
+        documentos y latencia de spaCy, lotes de model.encode, solicitudes, reintentos y
+        fallos del LLM, bytes y tiempo de E/S de CSV y pickle, latencia de recomendación
+        y duración de cada etapa.
+        """
+        return self.metricas.instantanea()
+
+    def export_metrics(self, formato="json", path=None):
+        """
+        Devuelve las métricas como texto, en JSON o en el formato de Prometheus
+        ("prometheus"). Si se da path también se escriben en ese archivo.
+        """
+        if formato == "json":
+            return self.metricas.a_json(path)
+        if formato != "prometheus":
+            raise ValueError(f"Formato de métricas desconocido: {formato}.")
+        texto = self.metricas.a_prometheus()
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(texto)
+        return texto
+
+    def enable_profiling(self, activo=True):
+        """Perfila con cProfile cada etapa (recalculaciones, registros en lote, índice)."""
+        self.metricas.activar_perfilado(activo)
+
+    def profile_report(self, etapa, lineas=20):
+        """Funciones más costosas de una etapa perfilada (None si no hay perfil)."""
+        return self.metricas.perfil(etapa, lineas=lineas)
+
+    def _get_indice_ann(self, almacen_cursos, firma_cursos):
+        """
+        Devuelve el índice ANN de cursos. Solo se reconstruye cuando cambian los embeddings
+        de cursos; se guarda en data_path/courses_ann_index para reutilizarlo entre procesos.
+        """
+        if self._ann is not None and self._ann_firma == firma_cursos:
+            return self._ann
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        indice_ann = self._dynamic_import(
+            "indice_ann", os.path.join(base_dir, "indice_ann.py")
+        )
+        path = os.path.join(self.data_path, "courses_ann_index")
+        ann = indice_ann.cargar_indice_cursos(path)
+        valido = (
+            ann is not None
+            and ann.meta.get("firma_cursos") == firma_cursos
+            and self.indice_ann in ("auto", ann.backend)
+        )
+        if not valido:
+            ann = indice_ann.construir_indice_cursos(
+                almacen_cursos.matriz, almacen_cursos.ids, backend=self.indice_ann
+            )
+            indice_ann.guardar_indice_cursos(
+                ann, path, meta_extra={"firma_cursos": firma_cursos}
+            )
+        self._ann, self._ann_firma = ann, firma_cursos
+        return ann
+
+    def _firma_indice(self):
+        """Versión de los datos y generación vigente de cada almacén de embeddings."""
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        embeddings = self._dynamic_import(
+            "embeddings", os.path.join(base_dir, "embeddings.py")
+        )
+        return (
+            self._version_datos,
+            *(
+                embeddings.generacion_almacen(os.path.join(self.data_path, nombre))
+                for nombre in ("students_tags_embeddings", "courses_tags_embeddings")
+            ),
         )
-        ranking = recommender.ranking_top_cursos_por_similitud(df_sim, top_n=top_n)
-        return ranking
 
     # --- Métodos auxiliares internos ---
-    def _get_next_id(self, file_path, id_field):
-        """Obtiene el siguiente ID incremental para un archivo CSV."""
-        next_id = 1
-        if os.path.exists(file_path):
-            rows = self._read_csv(file_path)
-            if rows:
-                next_id = int(rows[-1][id_field]) + 1
-        return next_id
-
-    def _append_row(self, file_path, headers, row):
-        """Agrega una fila a un archivo CSV, creando encabezado si es necesario."""
-        write_header = not os.path.exists(file_path) or os.stat(file_path).st_size == 0
-        with open(file_path, mode="a", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            if write_header:
-                writer.writerow(headers)
-            writer.writerow(row)
-
-    def _edit_row(self, file_path, id_field, row_id, headers, **kwargs):
-        """Edita una fila en un archivo CSV por su ID, actualizando solo los campos dados."""
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(
-                f"El archivo {os.path.basename(file_path)} no existe."
+    def _tabla(self, nombre):
+        """Devuelve el almacén de la tabla 'students' o 'courses' (abierto una sola vez)."""
+        if nombre not in self._tablas:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            almacen_tablas = self._dynamic_import(
+                "almacen_tablas", os.path.join(base_dir, "almacen_tablas.py")
             )
-        rows = self._read_csv(file_path)
-        found = False
-        for row in rows:
-            if str(row[id_field]) == str(row_id):
-                found = True
-                for key, value in kwargs.items():
-                    if value is not None:
-                        if key == "nombre" and not value.strip():
-                            raise ValueError(f"El nombre no puede estar vacío.")
-                        col = key.capitalize() if key != "tags" else "Tags"
-                        row[col] = value
-        if not found:
-            raise ValueError(f"No se encontró el registro con ID {row_id}.")
-        self._write_csv(file_path, headers, rows)
-
-    def _get_row_by_id(self, file_path, id_field, row_id):
-        """Devuelve un diccionario con los campos de una fila por su ID."""
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(
-                f"El archivo {os.path.basename(file_path)} no existe."
+            self._tablas[nombre] = almacen_tablas.abrir_tabla(
+                self.data_path, nombre, backend=self.almacen
             )
-        rows = self._read_csv(file_path)
-        for row in rows:
-            if str(row[id_field]) == str(row_id):
-                return row
-        raise ValueError(f"No se encontró el registro con ID {row_id}.")
-
-    def _get_all_rows(self, file_path):
-        """Devuelve una lista de diccionarios con todas las filas de un archivo CSV."""
-        if not os.path.exists(file_path):
-            return []
-        return self._read_csv(file_path)
-
-    def _read_csv(self, file_path):
-        """Lee un archivo CSV y devuelve una lista de diccionarios."""
-        with open(file_path, mode="r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            return list(reader)
-
-    def _write_csv(self, file_path, headers, rows):
-        """Escribe una lista de diccionarios en un archivo CSV con los headers dados."""
-        with open(file_path, mode="w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(rows)
+        return self._tablas[nombre]
+
+    def _get_cache_textos(self, data_preprocessing):
+        """Caché de textos limpios compartida por las recalculaciones de esta instancia."""
+        if self._cache_textos is None:
+            self._cache_textos = data_preprocessing.CacheTextosLimpios()
+        return self._cache_textos
+
+    def _fila_df(self, nombre, row_id):
+        """DataFrame de una sola fila de la tabla, con el ID como entero."""
+        import pandas as pd
+
+        tabla = self._tabla(nombre)
+        df = pd.DataFrame([tabla.obtener(row_id)], columns=tabla.headers)
+        df[tabla.id_field] = df[tabla.id_field].astype(int)
+        return df
+
+    def _agregar_filas(self, nombre, filas):
+        """
+        Asigna IDs consecutivos a las filas (sin ID) y las agrega a la tabla en una sola
+        escritura. Retorna las filas con su ID.
+        """
+        with self._lock_tablas:
+            tabla = self._tabla(nombre)
+            inicio = tabla.siguiente_id()
+            filas = [[inicio + i, *fila] for i, fila in enumerate(filas)]
+            tabla.agregar_muchas(filas)
+            self._version_tablas[nombre] += 1
+        return filas
+
+    def _edit_row(self, tabla, row_id, **kwargs):
+        """Edita una fila de la tabla por su ID, actualizando solo los campos dados."""
+        _comprobar_textos(**kwargs)
+        cambios = {}
+        for key, value in kwargs.items():
+            if value is not None:
+                if key == "nombre" and not value.strip():
+                    raise ValueError(f"El nombre no puede estar vacío.")
+                col = key.capitalize() if key != "tags" else "Tags"
+                cambios[col] = value
+        with self._lock_tablas:
+            self._tabla(tabla).editar(row_id, cambios)
+            self._version_tablas[tabla] += 1
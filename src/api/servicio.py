@@ -0,0 +1,412 @@
+"""
+Servicio HTTP (Flask/WSGI) sobre ElectiveRecommendationAPI: recomendaciones, registro y
+edición de estudiantes y cursos con el índice y los modelos ya cargados en memoria.
+Las solicitudes de recomendación que llegan dentro de una ventana corta (--ventana-ms)
+se agrupan en un solo producto matricial (AgrupadorRecomendaciones).
+
+El agrupamiento necesita que las solicitudes compartan proceso: con un servidor WSGI de
+producción se usa un solo worker con varios hilos sobre crear_app(api).
+
+Uso:
+    python -m src.api.servicio --data data --puerto 8000 --ventana-ms 2
+"""
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from flask import Flask, Response, g, jsonify, request
+
+try:
+    from src.api.elective_recommendation import ElectiveRecommendationAPI
+except ModuleNotFoundError:
+    from api.elective_recommendation import ElectiveRecommendationAPI
+
+logger = logging.getLogger(__name__)
+
+# Límite de top_n aceptado por solicitud
+MAX_TOP_N = 100
+
+
+class EstudianteNoEncontrado(ValueError):
+    """El estudiante no tiene embeddings en el índice (la respuesta es un 404)."""
+
+
+class AgrupadorRecomendaciones:
+    """
+    Agrupa solicitudes de recomendación concurrentes. Un hilo de fondo toma la primera
+    solicitud pendiente, espera hasta ventana segundos (o hasta juntar max_lote) y resuelve
+    todas las reunidas con una sola llamada a recomendar_lote(ids, top_n), usando el mayor
+    top_n del lote y recortando el ranking de cada solicitud al suyo.
+    """
+
+    def __init__(self, recomendar_lote, ventana=0.002, max_lote=64, metricas=None):
+        self.recomendar_lote = recomendar_lote
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self.metricas = metricas
+        self._pendientes = deque()
+        self._condicion = threading.Condition()
+        self._activo = True
+        self._hilo = threading.Thread(target=self._trabajar, daemon=True)
+        self._hilo.start()
+
+    def recomendar(self, estudiante_id, top_n=3, timeout=None):
+        """
+        Ranking top_n del estudiante (bloquea hasta que se resuelve su lote).
+        Lanza EstudianteNoEncontrado si el estudiante no tiene embeddings y ValueError
+        si todavía no hay índice.
+        """
+        futuro = Future()
+        with self._condicion:
+            if not self._activo:
+                raise RuntimeError("El agrupador de recomendaciones está detenido.")
+            self._pendientes.append((estudiante_id, top_n, futuro))
+            self._condicion.notify_all()
+        return futuro.result(timeout)
+
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                while not self._pendientes and self._activo:
+                    self._condicion.wait()
+                if not self._pendientes:
+                    return
+                limite = time.monotonic() + self.ventana
+                while len(self._pendientes) < self.max_lote and self._activo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicion.wait(restante)
+                lote = [
+                    self._pendientes.popleft()
+                    for _ in range(min(self.max_lote, len(self._pendientes)))
+                ]
+            self._resolver(lote)
+
+    def _resolver(self, lote):
+        if self.metricas is not None:
+            self.metricas.observar("servicio_lote", len(lote))
+        ids = [estudiante_id for estudiante_id, _, _ in lote]
+        try:
+            rankings = self.recomendar_lote(ids, max(top_n for _, top_n, _ in lote))
+        except Exception as e:
+            for _, _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        for (estudiante_id, top_n, futuro), ranking in zip(lote, rankings):
+            if ranking is None:
+                futuro.set_exception(
+                    EstudianteNoEncontrado(
+                        f"EstudianteID {estudiante_id} no encontrado."
+                    )
+                )
+            else:
+                futuro.set_result(ranking[:top_n])
+
+    def detener(self):
+        """Atiende las solicitudes pendientes y termina el hilo de fondo."""
+        with self._condicion:
+            self._activo = False
+            self._condicion.notify_all()
+        self._hilo.join()
+
+
+def _ranking_json(ranking):
+    return [
+        {"curso_id": int(curso_id), "score": float(score)}
+        for curso_id, score in ranking
+    ]
+
+
+def _error(mensaje, estado):
+    return jsonify({"error": mensaje}), estado
+
+
+def _cuerpo_json():
+    """Objeto JSON de la solicitud ({} si no hay cuerpo). Lanza ValueError si no es un objeto."""
+    datos = request.get_json(silent=True)
+    if datos is None:
+        return {}
+    if not isinstance(datos, dict):
+        raise ValueError("El cuerpo de la solicitud debe ser un objeto JSON.")
+    return datos
+
+
+def _top_n():
+    """top_n del query string (por defecto 3). Lanza ValueError si no es válido."""
+    try:
+        top_n = int(request.args.get("top_n", 3))
+    except ValueError:
+        raise ValueError("top_n debe ser un entero.")
+    if not 1 <= top_n <= MAX_TOP_N:
+        raise ValueError(f"top_n debe estar entre 1 y {MAX_TOP_N}.")
+    return top_n
+
+
+def crear_app(api, ventana_ms=2.0, max_lote=64, agrupar=True):
+    """
+    Aplicación Flask (WSGI) sobre la instancia api. Con agrupar=True las recomendaciones
+    individuales se resuelven por lotes de hasta max_lote solicitudes reunidas en ventana_ms.
+    """
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+    agrupador = None
+    if agrupar:
+        agrupador = AgrupadorRecomendaciones(
+            api.recomendar_top_cursos_para_estudiantes,
+            ventana=ventana_ms / 1000,
+            max_lote=max_lote,
+            metricas=api.metricas,
+        )
+    app.extensions["recomendaciones"] = {"api": api, "agrupador": agrupador}
+
+    @app.before_request
+    def _iniciar_medicion():
+        g.inicio = time.perf_counter()
+
+    @app.after_request
+    def _registrar_medicion(respuesta):
+        ruta = request.url_rule.rule if request.url_rule else "desconocida"
+        api.metricas.observar(
+            "servicio_solicitud_segundos",
+            time.perf_counter() - g.inicio,
+            ruta=ruta,
+            metodo=request.method,
+        )
+        api.metricas.incrementar(
+            "servicio_respuestas_total", ruta=ruta, estado=respuesta.status_code
+        )
+        return respuesta
+
+    @app.get("/health")
+    def salud():
+        return jsonify({"estado": "ok"})
+
+    @app.get("/metrics")
+    def metricas():
+        return Response(
+            api.export_metrics("prometheus"),
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    # --- Recomendaciones ---
+    @app.get("/students/<int:estudiante_id>/recommendations")
+    def recomendar(estudiante_id):
+        try:
+            top_n = _top_n()
+        except ValueError as e:
+            return _error(str(e), 400)
+        try:
+            if agrupador is not None:
+                ranking = agrupador.recomendar(estudiante_id, top_n)
+            else:
+                (ranking,) = api.recomendar_top_cursos_para_estudiantes(
+                    [estudiante_id], top_n
+                )
+                if ranking is None:
+                    raise EstudianteNoEncontrado(
+                        f"EstudianteID {estudiante_id} no encontrado."
+                    )
+        except EstudianteNoEncontrado as e:
+            return _error(str(e), 404)
+        except ValueError as e:
+            # Todavía no hay embeddings con los que armar el índice
+            return _error(str(e), 503)
+        return jsonify(
+            {"estudiante_id": estudiante_id, "recomendaciones": _ranking_json(ranking)}
+        )
+
+    @app.post("/recommendations")
+    def recomendar_lote():
+        try:
+            datos = _cuerpo_json()
+        except ValueError as e:
+            return _error(str(e), 400)
+        ids = datos.get("estudiante_ids")
+        top_n = datos.get("top_n", 3)
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return _error("estudiante_ids debe ser una lista de enteros.", 400)
+        if not isinstance(top_n, int) or not 1 <= top_n <= MAX_TOP_N:
+            return _error(f"top_n debe estar entre 1 y {MAX_TOP_N}.", 400)
+        try:
+            rankings = api.recomendar_top_cursos_para_estudiantes(ids, top_n)
+        except ValueError as e:
+            return _error(str(e), 503)
+        no_encontrados = [i for i, ranking in zip(ids, rankings) if ranking is None]
+        if no_encontrados:
+            return (
+                jsonify(
+                    {
+                        "error": "Hay estudiantes sin embeddings.",
+                        "no_encontrados": no_encontrados,
+                    }
+                ),
+                404,
+            )
+        return jsonify(
+            {
+                "recomendaciones": [
+                    {
+                        "estudiante_id": estudiante_id,
+                        "recomendaciones": _ranking_json(r),
+                    }
+                    for estudiante_id, r in zip(ids, rankings)
+                ]
+            }
+        )
+
+    # --- Estudiantes ---
+    @app.post("/students")
+    def registrar_estudiante():
+        try:
+            datos = _cuerpo_json()
+            estudiante_id = api.register_student(
+                datos.get("nombre", ""),
+                datos.get("tags", ""),
+                datos.get("descripcion", ""),
+            )
+        except ValueError as e:
+            return _error(str(e), 400)
+        return jsonify({"estudiante_id": estudiante_id}), 201
+
+    @app.get("/students/<int:estudiante_id>")
+    def obtener_estudiante(estudiante_id):
+        try:
+            return jsonify(api.get_student(estudiante_id))
+        except ValueError as e:
+            return _error(str(e), 404)
+
+    @app.patch("/students/<int:estudiante_id>")
+    def editar_estudiante(estudiante_id):
+        try:
+            api.get_student(estudiante_id)
+        except ValueError as e:
+            return _error(str(e), 404)
+        try:
+            datos = _cuerpo_json()
+            api.edit_student(
+                estudiante_id,
+                nombre=datos.get("nombre"),
+                tags=datos.get("tags"),
+                descripcion=datos.get("descripcion"),
+            )
+        except ValueError as e:
+            return _error(str(e), 400)
+        return jsonify(api.get_student(estudiante_id))
+
+    # --- Cursos ---
+    @app.get("/courses")
+    def listar_cursos():
+        return jsonify(api.get_all_courses())
+
+    @app.post("/courses")
+    def registrar_curso():
+        try:
+            datos = _cuerpo_json()
+            curso_id = api.register_course(
+                datos.get("nombre", ""), datos.get("descripcion", "")
+            )
+        except ValueError as e:
+            return _error(str(e), 400)
+        return jsonify({"curso_id": curso_id}), 201
+
+    @app.get("/courses/<int:curso_id>")
+    def obtener_curso(curso_id):
+        try:
+            return jsonify(api.get_course(curso_id))
+        except ValueError as e:
+            return _error(str(e), 404)
+
+    @app.patch("/courses/<int:curso_id>")
+    def editar_curso(curso_id):
+        try:
+            api.get_course(curso_id)
+        except ValueError as e:
+            return _error(str(e), 404)
+        try:
+            datos = _cuerpo_json()
+            api.edit_course(
+                curso_id,
+                nombre=datos.get("nombre"),
+                descripcion=datos.get("descripcion"),
+            )
+        except ValueError as e:
+            return _error(str(e), 400)
+        return jsonify(api.get_course(curso_id))
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Servicio HTTP de recomendación de cursos optativos."
+    )
+    parser.add_argument("--data", default="data", help="Carpeta de datos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument(
+        "--ventana-ms",
+        type=float,
+        default=2.0,
+        help="Espera máxima para agrupar recomendaciones concurrentes",
+    )
+    parser.add_argument("--max-lote", type=int, default=64)
+    parser.add_argument(
+        "--sin-agrupar",
+        action="store_true",
+        help="Resolver cada recomendación por separado",
+    )
+    parser.add_argument(
+        "--indice-ann",
+        help="Backend ANN (auto, ivf, hnswlib, faiss); exacto si se omite",
+    )
+    parser.add_argument("--almacen", choices=("csv", "sqlite"), default="csv")
+    parser.add_argument(
+        "--compresion",
+        choices=("float16", "int8", "pca"),
+        help="Guardar los embeddings de estudiantes comprimidos en el índice",
+    )
+    parser.add_argument("--dimension-pca", type=int, default=128)
+    parser.add_argument(
+        "--recalculo-asincrono",
+        action="store_true",
+        help="Responder a registros/ediciones sin esperar la recalculación",
+    )
+    parser.add_argument(
+        "--sin-modelos",
+        action="store_true",
+        help="No precargar spaCy ni el SentenceTransformer al iniciar",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    api = ElectiveRecommendationAPI(
+        args.data,
+        indice_ann=args.indice_ann,
+        almacen=args.almacen,
+        recalculo_asincrono=args.recalculo_asincrono,
+        compresion=args.compresion,
+        dimension_pca=args.dimension_pca,
+    )
+    try:
+        api.warm_up(modelos=not args.sin_modelos)
+    except ValueError as e:
+        # Sin embeddings todavía: el índice se construirá con la primera recomendación
+        logger.warning("No se pudo precargar el índice: %s", e)
+    app = crear_app(
+        api,
+        ventana_ms=args.ventana_ms,
+        max_lote=args.max_lote,
+        agrupar=not args.sin_agrupar,
+    )
+    app.run(host=args.host, port=args.puerto, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Representaciones comprimidas de los embeddings de estudiantes para el ranking de cursos.
+La matriz de estudiantes crece con cada alta y es la que se guarda en memoria, así que es
+la que se comprime; los cursos quedan en float32 y se preparan una sola vez para que la
+puntuación de un bloque de estudiantes siga siendo un único producto matricial:
+
+    puntuaciones = codigos.astype(float32) @ A.T + b
+
+Modos disponibles:
+- "float32": sin compresión (referencia).
+- "float16": media precisión (1/2 de memoria).
+- "int8": cuantización escalar por dimensión con centro y escala propios (1/4 de memoria).
+- "pca": proyección sobre las componentes principales ajustadas al corpus (dimension/D).
+
+overlap_at_k mide cuánto coincide el top-k de un modo con el de precisión completa.
+"""
+
+import numpy as np
+
+try:
+    from src.recommender import normalizar_filas, top_k_filas
+except ModuleNotFoundError:
+    from recommender import normalizar_filas, top_k_filas
+
+# Filas usadas como máximo para ajustar la PCA
+MAX_MUESTRA_PCA = 20000
+
+
+class Compresion:
+    """
+    Modo sin compresión. Las subclases redefinen ajustar, comprimir, descomprimir y
+    preparar_cursos; puntuar es el mismo núcleo para todas.
+    """
+
+    modo = "float32"
+
+    def ajustar(self, matriz):
+        """Ajusta los parámetros del modo al corpus (filas normalizadas). Retorna self."""
+        return self
+
+    def comprimir(self, matriz):
+        return np.asarray(matriz, dtype=np.float32)
+
+    def descomprimir(self, codigos):
+        """Aproximación float32 de las filas originales (para consultar un índice ANN)."""
+        return np.asarray(codigos, dtype=np.float32)
+
+    def preparar_cursos(self, cursos):
+        """(A, b) tales que la similitud de los códigos con los cursos es codigos @ A.T + b."""
+        cursos = np.asarray(cursos, dtype=np.float32)
+        return cursos, np.zeros(len(cursos), dtype=np.float32)
+
+    def puntuar(self, codigos, cursos_preparados):
+        A, b = cursos_preparados
+        return np.asarray(codigos, dtype=np.float32) @ A.T + b
+
+    def parametros(self):
+        return {"modo": self.modo}
+
+
+class CompresionFloat16(Compresion):
+    modo = "float16"
+
+    def comprimir(self, matriz):
+        return np.asarray(matriz, dtype=np.float16)
+
+
+class CompresionInt8(Compresion):
+    """
+    Cada dimensión j se cuantiza a int8 en [-127, 127] con su propio centro y escala:
+    x_j ≈ centro_j + escala_j * q_j. Centro y escala se pliegan en los cursos
+    (A = cursos * escala, b = cursos @ centro), así el núcleo no descomprime nada.
+    """
+
+    modo = "int8"
+
+    def __init__(self):
+        self.centro = None
+        self.escala = None
+
+    def ajustar(self, matriz):
+        matriz = np.asarray(matriz, dtype=np.float32)
+        minimo, maximo = matriz.min(axis=0), matriz.max(axis=0)
+        self.centro = (maximo + minimo) / 2
+        self.escala = (maximo - minimo) / 254
+        self.escala[self.escala == 0] = 1.0
+        return self
+
+    def comprimir(self, matriz):
+        q = np.rint((np.asarray(matriz, dtype=np.float32) - self.centro) / self.escala)
+        return np.clip(q, -127, 127).astype(np.int8)
+
+    def descomprimir(self, codigos):
+        return self.centro + self.escala * np.asarray(codigos, dtype=np.float32)
+
+    def preparar_cursos(self, cursos):
+        cursos = np.asarray(cursos, dtype=np.float32)
+        return cursos * self.escala, cursos @ self.centro
+
+    def parametros(self):
+        return {"modo": self.modo, "dimension": len(self.centro)}
+
+
+class CompresionPCA(Compresion):
+    """
+    Proyección a 'dimension' componentes principales ajustadas al corpus:
+    x ≈ media + z @ W.T con z = (x - media) @ W. Los cursos se proyectan con la misma W
+    (A = cursos @ W, b = cursos @ media).
+    """
+
+    modo = "pca"
+
+    def __init__(self, dimension=128, max_muestra=MAX_MUESTRA_PCA, semilla=0):
+        self.dimension = dimension
+        self.max_muestra = max_muestra
+        self.semilla = semilla
+        self.media = None
+        self.componentes = None
+        self.varianza_explicada = None
+
+    def ajustar(self, matriz):
+        matriz = np.asarray(matriz, dtype=np.float32)
+        if len(matriz) > self.max_muestra:
+            rng = np.random.default_rng(self.semilla)
+            matriz = matriz[rng.choice(len(matriz), self.max_muestra, replace=False)]
+        self.media = matriz.mean(axis=0)
+        _, valores, vt = np.linalg.svd(matriz - self.media, full_matrices=False)
+        dimension = min(self.dimension, vt.shape[0])
+        # (D, dimension): las columnas son las componentes
+        self.componentes = np.ascontiguousarray(vt[:dimension].T)
+        varianza = valores**2
+        self.varianza_explicada = (
+            float(varianza[:dimension].sum() / varianza.sum())
+            if varianza.sum()
+            else 1.0
+        )
+        return self
+
+    def comprimir(self, matriz):
+        return (np.asarray(matriz, dtype=np.float32) - self.media) @ self.componentes
+
+    def descomprimir(self, codigos):
+        return self.media + np.asarray(codigos, dtype=np.float32) @ self.componentes.T
+
+    def preparar_cursos(self, cursos):
+        cursos = np.asarray(cursos, dtype=np.float32)
+        return cursos @ self.componentes, cursos @ self.media
+
+    def parametros(self):
+        return {
+            "modo": self.modo,
+            "dimension": self.componentes.shape[1],
+            "varianza_explicada": self.varianza_explicada,
+        }
+
+
+MODOS = {
+    "float32": Compresion,
+    "float16": CompresionFloat16,
+    "int8": CompresionInt8,
+    "pca": CompresionPCA,
+}
+
+
+def crear_compresion(modo="float32", **parametros):
+    """Instancia el modo de compresión (parametros: dimension para "pca")."""
+    if modo not in MODOS:
+        raise ValueError(
+            f"Modo de compresión desconocido: {modo}. Opciones: {', '.join(MODOS)}."
+        )
+    return MODOS[modo](**parametros)
+
+
+class MotorRankingComprimido:
+    """
+    Como MotorRanking, pero puntúa estudiantes ya comprimidos (compresion.comprimir sobre
+    filas normalizadas) contra la matriz de cursos preparada para ese modo.
+    """
+
+    def __init__(self, emb_cursos, ids_cursos, compresion):
+        self.compresion = compresion
+        self.cursos = compresion.preparar_cursos(normalizar_filas(emb_cursos))
+        self.ids_cursos = np.asarray(ids_cursos)
+
+    def top_k(self, codigos, k=3, tam_bloque=1024):
+        """Devuelve (ids, puntuaciones) de forma (n_estudiantes, k), de mayor a menor."""
+        codigos = codigos.reshape(1, -1) if codigos.ndim == 1 else codigos
+        n = len(codigos)
+        k = max(0, min(k, len(self.ids_cursos)))
+        ids = np.empty((n, k), dtype=self.ids_cursos.dtype)
+        puntuaciones = np.empty((n, k), dtype=np.float32)
+        for inicio in range(0, n, tam_bloque):
+            fin = min(inicio + tam_bloque, n)
+            bloque = self.compresion.puntuar(codigos[inicio:fin], self.cursos)
+            posiciones, valores = top_k_filas(bloque, k)
+            ids[inicio:fin] = self.ids_cursos[posiciones]
+            puntuaciones[inicio:fin] = valores
+        return ids, puntuaciones
+
+
+def comprimir_estudiantes(emb_estudiantes, modo="float32", **parametros):
+    """
+    Normaliza los embeddings, ajusta el modo sobre ellos y los comprime.
+    Retorna (compresion, codigos).
+    """
+    normalizados = normalizar_filas(emb_estudiantes)
+    compresion = crear_compresion(modo, **parametros).ajustar(normalizados)
+    return compresion, compresion.comprimir(normalizados)
+
+
+def overlap_at_k(ids_referencia, ids, k=None):
+    """
+    Fracción media de los k primeros IDs de cada fila de ids que también están en los k
+    primeros de ids_referencia (1.0 = mismos cursos en el top-k, sin importar el orden).
+    """
+    ids_referencia = np.atleast_2d(ids_referencia)
+    ids = np.atleast_2d(ids)
+    k = min(k or ids_referencia.shape[1], ids_referencia.shape[1], ids.shape[1])
+    if len(ids_referencia) == 0 or k == 0:
+        return 1.0
+    # (n, k, k): cada ID del top-k comprimido contra los k de la referencia
+    coincide = ids[:, :k, None] == ids_referencia[:, None, :k]
+    return float(coincide.any(axis=2).sum(axis=1).mean() / k)
@@ -1,98 +1,350 @@
 # Limpieza y preparación de datos
+import csv
+import os
 import pandas as pd
-import re
+import unicodedata
+from itertools import chain
 from io import StringIO
 
+try:
+    from src.metricas import get_metricas
+except ModuleNotFoundError:
+    from metricas import get_metricas
+
+# Reemplazos directos antes de NFD: las vocales acentuadas y la ñ del español (así, en
+# los textos habituales NFD no tiene nada que descomponer y termina enseguida) y las
+# letras que NFD no separa en letra base + acento
+_LETRAS_ESPECIALES = {
+    "á": "a",
+    "é": "e",
+    "í": "i",
+    "ó": "o",
+    "ú": "u",
+    "ü": "u",
+    "ñ": "n",
+    "ß": "ss",
+    "æ": "ae",
+    "œ": "oe",
+    "ø": "o",
+    "đ": "d",
+    "ð": "d",
+    "ł": "l",
+    "þ": "th",
+    "ı": "i",
+}
+# Espacios Unicode (\xa0, \u2009, \u3000...): pasan a " " antes de descartar lo no ASCII
+_ESPACIOS_UNICODE = str.maketrans(
+    {c: " " for c in map(chr, range(0x80, 0x3001)) if c.isspace()}
+)
+# Tabla de bytes precalculada: los espacios ASCII pasan a " " y se borra todo lo que
+# no sea a-z, 0-9, espacio o el separador interno de limpiar_texto_serie
+_SEPARADOR = "\x00"
+_ESPACIOS_ASCII = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "
+_TABLA_BYTES = bytes.maketrans(_ESPACIOS_ASCII, b" " * len(_ESPACIOS_ASCII))
+_BYTES_BORRADOS = bytes(
+    b
+    for b in range(128)
+    if b not in b"abcdefghijklmnopqrstuvwxyz0123456789" + _ESPACIOS_ASCII + b"\x00"
+)
+
+
+def _normalizar(texto):
+    # Minúsculas, letras especiales y NFD (separa los acentos: "à" -> "a" + acento grave);
+    # al pasar a ASCII se descartan los acentos y demás caracteres no ASCII. NFD, a
+    # diferencia de NFKD, no convierte º, ª, ², ½ o ﬁ en letras y dígitos: se descartan
+    texto = texto.lower()
+    for letra, reemplazo in _LETRAS_ESPECIALES.items():
+        if letra in texto:
+            texto = texto.replace(letra, reemplazo)
+    if not texto.isascii():
+        texto = unicodedata.normalize("NFD", texto.translate(_ESPACIOS_UNICODE))
+    datos = texto.encode("ascii", "ignore").translate(_TABLA_BYTES, _BYTES_BORRADOS)
+    # Colapsa los espacios y los quita de los extremos (también junto a cada separador)
+    while b"  " in datos:
+        datos = datos.replace(b"  ", b" ")
+    separador = _SEPARADOR.encode("ascii")
+    datos = datos.replace(b" " + separador, separador)
+    datos = datos.replace(separador + b" ", separador)
+    return datos.strip(b" ").decode("ascii")
+
 
 def limpiar_texto(texto):
+    """
+    Pasa el texto a minúsculas, quita acentos y diacríticos (á, ü, à, ç, ñ...), elimina los
+    caracteres que no son letras a-z, dígitos o espacios y colapsa los espacios.
+    """
     if pd.isnull(texto):
         return ""
-    # Elimina caracteres especiales, pasa a minúsculas y quita espacios extra
-    texto = str(texto).lower()
-    texto = (
-        texto.replace("á", "a")
-        .replace("é", "e")
-        .replace("í", "i")
-        .replace("ó", "o")
-        .replace("ú", "u")
+    return _normalizar(str(texto).replace(_SEPARADOR, ""))
+
+
+def limpiar_texto_serie(serie):
+    """
+    Versión vectorizada de limpiar_texto para una columna completa: une todos los textos
+    en una sola cadena, la normaliza con una única pasada de cada operación y la vuelve a separar.
+    Devuelve una Series con el mismo índice y el mismo resultado que serie.apply(limpiar_texto).
+    """
+    if len(serie) == 0:
+        return pd.Series([], index=serie.index, name=serie.name, dtype=object)
+    textos = [
+        "" if nulo else str(texto)
+        for texto, nulo in zip(serie.tolist(), serie.isna().tolist())
+    ]
+    unido = _SEPARADOR.join(textos)
+    if unido.count(_SEPARADOR) != len(textos) - 1:
+        # Algún texto ya contenía el separador: se quita antes de unir
+        unido = _SEPARADOR.join(texto.replace(_SEPARADOR, "") for texto in textos)
+    partes = _normalizar(unido).split(_SEPARADOR)
+    return pd.Series(partes, index=serie.index, name=serie.name)
+
+
+class CacheTextosLimpios:
+    """
+    Memoriza limpiar_texto por texto original, para no volver a limpiar las filas
+    que no cambiaron entre una carga y la siguiente. Se vacía al superar max_entradas.
+    """
+
+    def __init__(self, max_entradas=100000):
+        self.max_entradas = max_entradas
+        self._textos = {}
+        self.hits = 0
+        self.misses = 0
+
+    def limpiar(self, texto):
+        if pd.isnull(texto):
+            return ""
+        limpio = self._textos.get(texto)
+        if limpio is not None:
+            self.hits += 1
+            return limpio
+        self.misses += 1
+        if len(self._textos) >= self.max_entradas:
+            self._textos.clear()
+        limpio = self._textos[texto] = limpiar_texto(texto)
+        return limpio
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "textos_en_cache": len(self._textos),
+            "tasa_aciertos": self.hits / total if total else 0.0,
+        }
+
+
+def _limpiar_columna(serie, cache=None):
+    if cache is None:
+        return limpiar_texto_serie(serie)
+    return serie.apply(cache.limpiar)
+
+
+ENCABEZADO_CURSOS = ["CursoID", "Nombre", "Descripcion"]
+ENCABEZADO_ESTUDIANTES = ["EstudianteID", "Nombre", "Tags", "Descripcion"]
+
+
+def _es_comentario(linea):
+    linea = linea.strip()
+    return linea.startswith("#") or linea.startswith("//")
+
+
+class _ArchivoSinComentarios:
+    """
+    Envoltorio tipo archivo que entrega a pandas las líneas de f sin los comentarios
+    ('#' o '//') y con el encabezado agregado si la primera línea útil no lo es.
+    Se lee por partes: nunca guarda en memoria más que el fragmento pedido.
+    """
+
+    def __init__(self, f, encabezado):
+        self._lineas = (linea for linea in f if not _es_comentario(linea))
+        primera = next(self._lineas, "")
+        # Si la primera línea no es encabezado, lo agregamos manualmente
+        if not primera.lower().startswith(encabezado[0].lower()):
+            primera = ",".join(encabezado) + "\n" + primera
+        self._pendiente = primera
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            datos = self._pendiente + "".join(self._lineas)
+            self._pendiente = ""
+            return datos
+        partes = [self._pendiente]
+        total = len(self._pendiente)
+        for linea in self._lineas:
+            partes.append(linea)
+            total += len(linea)
+            if total >= n:
+                break
+        datos = "".join(partes)
+        self._pendiente = datos[n:]
+        return datos[:n]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pendiente:
+            linea, separador, resto = self._pendiente.partition("\n")
+            self._pendiente = resto
+            return linea + separador
+        return next(self._lineas)
+
+
+def _leer_csv_por_lotes(path, encabezado, tam_lote):
+    # Solo se mide la lectura de cada lote, no el trabajo de quien los consume
+    metricas = get_metricas()
+    with open(path, "r", encoding="utf-8") as f:
+        lotes = pd.read_csv(_ArchivoSinComentarios(f, encabezado), chunksize=tam_lote)
+        while True:
+            with metricas.medir("io_segundos", formato="csv", operacion="lectura"):
+                lote = next(lotes, None)
+            if lote is None:
+                break
+            yield lote
+    metricas.incrementar(
+        "io_bytes_total", os.path.getsize(path), formato="csv", operacion="lectura"
     )
-    texto = texto.replace("ñ", "n")
-    texto = re.sub(r"[^a-z0-9\s]", "", texto)
-    texto = re.sub(r"\s+", " ", texto).strip()
-    return texto
 
 
-def cargar_datos_cursos(path):
+def cargar_datos_cursos(path, cache=None):
     # Salta líneas que empiezan con '#' o '//' y usa el primer encabezado válido
-    with open(path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    # Filtra líneas que no son comentarios ni encabezados inválidos
-    lines = [
-        line
-        for line in lines
-        if not line.strip().startswith("#") and not line.strip().startswith("//")
-    ]
-    # Si la primera línea no es encabezado, lo agregamos manualmente
-    if not lines[0].lower().startswith("cursoid"):
-        lines.insert(0, "CursoID,Nombre,Descripcion\n")
-    df = pd.read_csv(StringIO("".join(lines)))
+    with get_metricas().medir_io("csv", "lectura", path):
+        with open(path, "r", encoding="utf-8") as f:
+            df = pd.read_csv(_ArchivoSinComentarios(f, ENCABEZADO_CURSOS))
+    return preparar_df_cursos(df, cache)
+
+
+def iterar_datos_cursos(path, tam_lote=10000, cache=None):
+    """
+    Lee el CSV de cursos por lotes de tam_lote filas (saltando comentarios y agregando el
+    encabezado si falta) y genera cada lote ya preparado como en cargar_datos_cursos.
+    """
+    for lote in _leer_csv_por_lotes(path, ENCABEZADO_CURSOS, tam_lote):
+        yield preparar_df_cursos(lote, cache)
+
+
+def preparar_df_cursos(df, cache=None):
+    """
+    Agrega las columnas limpias (Nombre_Limpio, Descripcion_Limpia) a un DataFrame de cursos.
+    Si se pasa un CacheTextosLimpios, los textos ya limpiados antes no se vuelven a procesar.
+    """
     # Normaliza los textos de nombre y descripcion
-    df["Nombre_Limpio"] = df["Nombre"].apply(limpiar_texto)
-    df["Descripcion_Limpia"] = df["Descripcion"].apply(limpiar_texto)
+    df["Nombre_Limpio"] = _limpiar_columna(df["Nombre"], cache)
+    df["Descripcion_Limpia"] = _limpiar_columna(df["Descripcion"], cache)
     return df
 
 
-def cargar_datos_estudiantes(path):
+def cargar_datos_estudiantes(path, cache=None):
     # Lee el archivo, ignora líneas que empiezan con '#' o '//'
-    with open(path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    lines = [
-        line
-        for line in lines
-        if not line.strip().startswith("#") and not line.strip().startswith("//")
-    ]
-    # Si la primera línea no es encabezado, lo agregamos manualmente
-    if not lines[0].lower().startswith("estudianteid"):
-        lines.insert(0, "EstudianteID,Nombre,Tags,Descripcion\n")
-    df = pd.read_csv(StringIO("".join(lines)))
+    with get_metricas().medir_io("csv", "lectura", path):
+        with open(path, "r", encoding="utf-8") as f:
+            df = pd.read_csv(_ArchivoSinComentarios(f, ENCABEZADO_ESTUDIANTES))
+    return preparar_df_estudiantes(df, cache)
+
+
+def iterar_datos_estudiantes(path, tam_lote=10000, cache=None):
+    """
+    Lee el CSV de estudiantes por lotes de tam_lote filas (saltando comentarios y agregando
+    el encabezado si falta) y genera cada lote ya preparado como en cargar_datos_estudiantes.
+    Permite procesar exportaciones muy grandes con memoria acotada.
+    """
+    for lote in _leer_csv_por_lotes(path, ENCABEZADO_ESTUDIANTES, tam_lote):
+        yield preparar_df_estudiantes(lote, cache)
+
+
+def preparar_df_estudiantes(df, cache=None):
+    """
+    Agrega las columnas limpias (Tags_Limpio, Descripcion_Limpia, Tags_List) a un DataFrame de estudiantes.
+    Si se pasa un CacheTextosLimpios, los textos ya limpiados antes no se vuelven a procesar.
+    """
     # Normaliza los textos de tags y descripcion
     df["Tags_Limpio"] = df["Tags"]
-    df["Descripcion_Limpia"] = df["Descripcion"].apply(limpiar_texto)
+    df["Descripcion_Limpia"] = _limpiar_columna(df["Descripcion"], cache)
     # Convierte los tags limpios en lista
     df["Tags_List"] = df["Tags_Limpio"].apply(
-        lambda x: [tag.strip() for tag in x.split(",") if tag.strip()]
+        lambda x: (
+            [tag.strip() for tag in x.split(",") if tag.strip()]
+            if isinstance(x, str)
+            else []
+        )
     )
     # print(df["Tags_List"].head())
     return df
 
 
-def preprocesar_curso_por_id(path, curso_id):
+def _leer_fila_csv(path, id_col, row_id, encabezado):
+    """
+    Busca en el CSV (saltando comentarios '#' y '//') la fila con el ID dado y la devuelve
+    como DataFrame de una fila, con los mismos tipos que daría pd.read_csv sobre el archivo.
+    Solo se parsea con pandas esa fila. Retorna None si no existe.
     """
-    Devuelve el DataFrame completo, pero con la fila del curso con el id dado 'limpia' (Nombre_Limpio, Descripcion_Limpia actualizados solo para esa fila).
+    with get_metricas().medir(
+        "io_segundos", formato="csv", operacion="lectura_fila"
+    ), open(path, "r", encoding="utf-8") as f:
+        lector = csv.reader(linea for linea in f if not _es_comentario(linea))
+        primera = next(lector, None)
+        if primera is None:
+            return None
+        if primera and primera[0].strip().lower() == id_col.lower():
+            columnas = primera
+            registros = lector
+        else:
+            columnas = encabezado
+            registros = chain([primera], lector)
+        posicion = columnas.index(id_col)
+        buscado = str(row_id).strip()
+        for registro in registros:
+            if len(registro) > posicion and registro[posicion].strip() == buscado:
+                salida = StringIO()
+                escritor = csv.writer(salida)
+                escritor.writerow(columnas)
+                escritor.writerow(registro)
+                salida.seek(0)
+                return pd.read_csv(salida)
+    return None
+
+
+def cargar_curso_por_id(path, curso_id, cache=None):
     """
-    df = cargar_datos_cursos(path)
-    idx = df[df["CursoID"] == curso_id].index
-    if len(idx) == 0:
+    Devuelve un DataFrame con solo la fila del curso con el id dado, ya limpia
+    (Nombre_Limpio, Descripcion_Limpia). No limpia el resto del catálogo.
+    """
+    df = _leer_fila_csv(path, "CursoID", curso_id, ENCABEZADO_CURSOS)
+    if df is None:
+        raise ValueError(f"No se encontró el curso con ID {curso_id}")
+    return preparar_df_cursos(df, cache)
+
+
+def cargar_estudiante_por_id(path, estudiante_id, cache=None):
+    """
+    Devuelve un DataFrame con solo la fila del estudiante con el id dado, ya limpia
+    (Tags_Limpio, Descripcion_Limpia, Tags_List). No limpia el resto de la tabla.
+    """
+    df = _leer_fila_csv(path, "EstudianteID", estudiante_id, ENCABEZADO_ESTUDIANTES)
+    if df is None:
+        raise ValueError(f"No se encontró el estudiante con ID {estudiante_id}")
+    return preparar_df_estudiantes(df, cache)
+
+
+def preprocesar_curso_por_id(path, curso_id, cache=None):
+    """
+    Devuelve el DataFrame completo con las columnas limpias (Nombre_Limpio, Descripcion_Limpia).
+    Con un CacheTextosLimpios solo se limpian los textos que no se habían visto.
+    Si solo se necesita la fila del curso, cargar_curso_por_id es más rápido.
+    """
+    df = cargar_datos_cursos(path, cache)
+    if not (df["CursoID"] == curso_id).any():
         raise ValueError(f"No se encontró el curso con ID {curso_id}")
-    i = idx[0]
-    df.at[i, "Nombre_Limpio"] = limpiar_texto(df.at[i, "Nombre"])
-    df.at[i, "Descripcion_Limpia"] = limpiar_texto(df.at[i, "Descripcion"])
     return df
 
 
-def preprocesar_estudiante_por_id(path, estudiante_id):
+def preprocesar_estudiante_por_id(path, estudiante_id, cache=None):
     """
-    Devuelve el DataFrame completo, pero con la fila del estudiante con el id dado 'limpia' (Tags_Limpio, Descripcion_Limpia, Tags_List actualizados solo para esa fila).
+    Devuelve el DataFrame completo con las columnas limpias (Tags_Limpio, Descripcion_Limpia, Tags_List).
+    Con un CacheTextosLimpios solo se limpian los textos que no se habían visto.
+    Si solo se necesita la fila del estudiante, cargar_estudiante_por_id es más rápido.
     """
-    df = cargar_datos_estudiantes(path)
-    idx = df[df["EstudianteID"] == estudiante_id].index
-    if len(idx) == 0:
+    df = cargar_datos_estudiantes(path, cache)
+    if not (df["EstudianteID"] == estudiante_id).any():
         raise ValueError(f"No se encontró el estudiante con ID {estudiante_id}")
-    i = idx[0]
-    df.at[i, "Tags_Limpio"] = df.at[i, "Tags"]
-    df.at[i, "Descripcion_Limpia"] = limpiar_texto(df.at[i, "Descripcion"])
-    df.at[i, "Tags_List"] = [
-        tag.strip() for tag in str(df.at[i, "Tags_Limpio"]).split(",") if tag.strip()
-    ]
-    print(df.at[i, "Tags_List"])
     return df
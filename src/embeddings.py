@@ -4,17 +4,42 @@ Incluye funciones para cargar modelos, procesar tags y gestionar embeddings en D
 """
 
 import os
+import json
+import hashlib
 import pickle
+import threading
+import time
 import pandas as pd
 import numpy as np
-from huggingface_hub import snapshot_download
+
+try:
+    from src import recursos
+    from src.generaciones import (
+        GENERACIONES_CONSERVADAS,
+        carpeta_generacion,
+        descartar_generacion,
+        generacion_vigente,
+        nueva_generacion,
+        publicar_generacion,
+    )
+    from src.metricas import get_metricas
+except ModuleNotFoundError:
+    import recursos
+    from generaciones import (
+        GENERACIONES_CONSERVADAS,
+        carpeta_generacion,
+        descartar_generacion,
+        generacion_vigente,
+        nueva_generacion,
+        publicar_generacion,
+    )
+    from metricas import get_metricas
 
 # =========================
 # Configuración de modelo
 # =========================
-MODEL_LOCAL_PATH = os.path.join(
-    "data", "models", "distiluse-base-multilingual-cased-v1"
-)
+MODEL_LOCAL_PATH = recursos.MODEL_LOCAL_PATH
+TAGS_CACHE_PATH = os.path.join("data", "tags_embeddings_cache.pkl")
 
 
 # =========================
@@ -22,13 +47,9 @@ MODEL_LOCAL_PATH = os.path.join(
 # =========================
 def get_sentence_transformer_model():
     """
-    Carga el modelo SentenceTransformer desde una carpeta local.
+    Carga el modelo SentenceTransformer desde una carpeta local (compartido entre módulos).
     """
-    if not hasattr(get_sentence_transformer_model, "_model"):
-        from sentence_transformers import SentenceTransformer
-
-        get_sentence_transformer_model._model = SentenceTransformer(MODEL_LOCAL_PATH)
-    return get_sentence_transformer_model._model
+    return recursos.get_sentence_transformer_model(MODEL_LOCAL_PATH)
 
 
 # =========================
@@ -54,6 +75,17 @@ def convertir_tags_a_lista(tags):
 # =========================
 # Embeddings de tags
 # =========================
+def _codificar(model, textos, **kwargs):
+    """Llama a model.encode registrando el tamaño del lote y su duración."""
+    metricas = get_metricas()
+    inicio = time.perf_counter()
+    vectores = model.encode(textos, **kwargs)
+    metricas.observar("encode_segundos", time.perf_counter() - inicio)
+    metricas.observar("encode_lote", len(textos))
+    metricas.incrementar("encode_textos_total", len(textos))
+    return vectores
+
+
 def obtener_embeddings_tags(tags, model=None):
     """
     Convierte una lista de tags (strings) en un embedding promedio usando Sentence Transformers.
@@ -65,85 +97,759 @@ def obtener_embeddings_tags(tags, model=None):
         tags = tags.tolist()
     if not tags or not isinstance(tags, list):
         return [0.0] * model.get_sentence_embedding_dimension()
-    embeddings = model.encode(tags)
+    embeddings = _codificar(model, tags)
     embeddings = np.array(embeddings)
     if embeddings.ndim == 1:
         return embeddings.tolist()
     return embeddings.mean(axis=0).tolist()
 
 
-def obtener_embeddings_tags_df(df, tags_col="Tags", model=None):
+def obtener_embeddings_tags_df(df, tags_col="Tags", model=None, cache=None):
     """
     Agrega una columna 'Tags_Embedding' al DataFrame con el embedding promedio de los tags.
+    Los tags únicos de todo el DataFrame se codifican una sola vez (en un único lote para
+    los que no estén en la caché) y cada fila se arma promediando los vectores cacheados.
+    Si no se pasa caché, se usa la caché global persistente (solo con el modelo por defecto).
     """
+    if cache is None:
+        cache = (
+            get_cache_embeddings_tags()
+            if model is None
+            else CacheEmbeddingsTags(path=None)
+        )
     if model is None:
         model = get_sentence_transformer_model()
     df = df.copy()
     df[tags_col] = df[tags_col].apply(convertir_tags_a_lista)
+    todos_los_tags = [tag for tags in df[tags_col] for tag in tags]
+    misses_previos = cache.misses
+    vectores = cache.obtener_vectores(todos_los_tags, model)
+    if cache.misses > misses_previos:
+        cache.guardar()
+    dimension = model.get_sentence_embedding_dimension()
     df["Tags_Embedding"] = df[tags_col].apply(
-        lambda tags: obtener_embeddings_tags(tags, model)
+        lambda tags: (
+            np.stack([vectores[tag] for tag in tags]).mean(axis=0).tolist()
+            if tags
+            else [0.0] * dimension
+        )
     )
     return df
 
 
 # =========================
-# Guardado y carga de embeddings
+# Caché global de embeddings por tag
 # =========================
-def guardar_embeddings_courses_df(df, path="data/courses_tags_embeddings.pkl"):
+class CacheEmbeddingsTags:
     """
-    Guarda el DataFrame de cursos con la columna 'Tags_Embedding' en un archivo pickle.
+    Almacén persistente tag -> vector (float32).
+    Los tags ya conocidos se sirven desde memoria; los nuevos se codifican en un único lote.
+    Lleva la cuenta de aciertos (hits) y fallos (misses) por tag único consultado.
+    Puede compartirse entre hilos (p. ej. las ramas de cursos y estudiantes del pipeline).
     """
-    df[["CursoID", "Tags", "Tags_Embedding"]].to_pickle(path)
-    return path
 
+    def __init__(self, path=TAGS_CACHE_PATH, modelo=MODEL_LOCAL_PATH):
+        self.path = path
+        self.modelo = modelo
+        self.vectores = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            with get_metricas().medir_io("pickle", "lectura", path):
+                with open(path, "rb") as f:
+                    datos = pickle.load(f)
+            # Los vectores de otro modelo no son comparables: se descartan
+            if datos.get("modelo") == modelo:
+                self.vectores = datos.get("vectores", {})
 
-def guardar_embeddings_estudiantes_df(df, path="data/students_tags_embeddings.pkl"):
+    def obtener_vectores(self, tags, model, batch_size=64):
+        """
+        Devuelve un diccionario {tag: vector} para los tags dados.
+        Solo los tags que no están en la caché se codifican, todos en una sola llamada a model.encode.
+        """
+        unicos = list(dict.fromkeys(tags))
+        with self._lock:
+            faltantes = [tag for tag in unicos if tag not in self.vectores]
+            self.hits += len(unicos) - len(faltantes)
+            self.misses += len(faltantes)
+            if faltantes:
+                nuevos = np.asarray(
+                    _codificar(model, faltantes, batch_size=batch_size),
+                    dtype=np.float32,
+                )
+                for tag, vector in zip(faltantes, nuevos.reshape(len(faltantes), -1)):
+                    self.vectores[tag] = vector
+            return {tag: self.vectores[tag] for tag in unicos}
+
+    def guardar(self):
+        """
+        Guarda la caché en disco (escritura atómica). No hace nada si la caché es solo en memoria.
+        """
+        if not self.path:
+            return None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with get_metricas().medir_io("pickle", "escritura", tmp_path), open(
+                tmp_path, "wb"
+            ) as f:
+                pickle.dump(
+                    {"modelo": self.modelo, "vectores": self.vectores},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, self.path)
+        return self.path
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de aciertos y fallos de la caché.
+        """
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tags_en_cache": len(self.vectores),
+            "tasa_aciertos": self.hits / consultas if consultas else 0.0,
+        }
+
+
+def get_cache_embeddings_tags():
     """
-    Guarda el DataFrame de estudiantes con la columna 'Tags_Embedding' en un archivo pickle.
+    Devuelve la caché global de embeddings de tags, cargándola desde disco la primera vez
+    (de TAGS_CACHE_PATH o de la ruta dada a configurar_cache_embeddings_tags).
+    """
+    if not hasattr(get_cache_embeddings_tags, "_cache"):
+        path = getattr(get_cache_embeddings_tags, "_path", TAGS_CACHE_PATH)
+        get_cache_embeddings_tags._cache = CacheEmbeddingsTags(path=path)
+    return get_cache_embeddings_tags._cache
+
+
+def configurar_cache_embeddings_tags(path=TAGS_CACHE_PATH):
     """
-    df[["EstudianteID", "Tags", "Tags_Embedding"]].to_pickle(path)
+    Ubica la caché global de embeddings de tags en path (p. ej. dentro de la carpeta de
+    datos en uso; con None queda solo en memoria). Se carga al pedirla por primera vez;
+    si ya estaba cargada desde otra ruta, se descarta.
+    """
+    get_cache_embeddings_tags._path = path
+    cache = getattr(get_cache_embeddings_tags, "_cache", None)
+    if cache is not None and cache.path != path:
+        del get_cache_embeddings_tags._cache
+
+
+# =========================
+# Almacén de embeddings (matriz float32 + índice)
+# =========================
+# Cada almacén es una carpeta con un archivo CURRENT que nombra la generación vigente
+# (subcarpeta gen-<marca>) y esa generación contiene:
+#   embeddings.npy        matriz contigua float32 (filas x dimension), se abre con memmap
+#   ids.npy               ID de cada fila (int64)
+#   hashes.npy            hash de los tags de cada fila (uint64)
+#   ids_ordenados.npy     IDs ordenados y la fila que les corresponde (filas_ordenadas.npy),
+#   filas_ordenadas.npy   para buscar la fila de un ID sin recorrer la matriz
+#   meta.json             columna de ID, número de filas, dimensión y modelo
+# Cada escritura crea una generación nueva y la publica reemplazando CURRENT de forma
+# atómica (ver src/generaciones.py), así un lector nunca mezcla archivos de dos escrituras.
+ARCHIVOS_ALMACEN = (
+    "embeddings.npy",
+    "ids.npy",
+    "hashes.npy",
+    "ids_ordenados.npy",
+    "filas_ordenadas.npy",
+)
+
+
+class AlmacenEmbeddings:
+    """
+    Embeddings de tags de cursos o estudiantes como una matriz float32 contigua
+    (normalmente un memmap de solo lectura) con su índice ID -> fila.
+    """
+
+    def __init__(
+        self,
+        id_col,
+        ids,
+        matriz,
+        hashes=None,
+        ids_ordenados=None,
+        filas_ordenadas=None,
+        meta=None,
+    ):
+        self.id_col = id_col
+        self.ids = ids
+        self.matriz = matriz
+        self.hashes = hashes if hashes is not None else np.zeros(len(ids), np.uint64)
+        if ids_ordenados is None or filas_ordenadas is None:
+            filas_ordenadas = np.argsort(ids, kind="stable")
+            ids_ordenados = ids[filas_ordenadas]
+        self.ids_ordenados = ids_ordenados
+        self.filas_ordenadas = filas_ordenadas
+        self.meta = meta or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1]
+
+    def filas(self, ids):
+        """
+        Devuelve la fila de cada ID dado (-1 si el ID no está en el almacén).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        filas = np.full(len(ids), -1, dtype=np.int64)
+        if len(self.ids_ordenados) == 0:
+            return filas
+        pos = np.searchsorted(self.ids_ordenados, ids)
+        pos = np.minimum(pos, len(self.ids_ordenados) - 1)
+        encontrados = self.ids_ordenados[pos] == ids
+        filas[encontrados] = self.filas_ordenadas[pos[encontrados]]
+        return filas
+
+    def fila(self, id_valor):
+        """
+        Devuelve la fila del ID dado o lanza ValueError si no existe.
+        """
+        fila = int(self.filas([id_valor])[0])
+        if fila < 0:
+            raise ValueError(f"{self.id_col} {id_valor} no encontrado.")
+        return fila
+
+    def vector(self, id_valor):
+        """
+        Devuelve el embedding (vista sin copia) del ID dado.
+        """
+        return self.matriz[self.fila(id_valor)]
+
+    def a_dataframe(self):
+        """
+        Devuelve un DataFrame con el ID, el hash de tags y 'Tags_Embedding'
+        (cada fila es una vista de la matriz, sin copiar los datos).
+        """
+        return pd.DataFrame(
+            {
+                self.id_col: self.ids,
+                "Tags_Hash": self.hashes,
+                "Tags_Embedding": list(self.matriz),
+            }
+        )
+
+
+def _ruta_almacen(path):
+    """
+    Rutas antiguas terminadas en '.pkl' se traducen a la carpeta del almacén equivalente.
+    """
+    return path[: -len(".pkl")] if path.endswith(".pkl") else path
+
+
+def guardar_almacen_embeddings(path, id_col, ids, matriz, hashes=None):
+    """
+    Guarda un almacén de embeddings en la carpeta path como una generación nueva, que
+    se publica al final de una sola vez. Los lectores (y los memmap ya abiertos) siguen
+    viendo la generación anterior completa hasta ese momento.
+    """
+    path = _ruta_almacen(path)
+    generacion = nueva_generacion(path)
+    try:
+        matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+        np.save(os.path.join(generacion, "embeddings.npy"), matriz)
+        dimension = int(matriz.shape[1]) if matriz.ndim == 2 else 0
+        _guardar_ids_y_meta(generacion, id_col, ids, hashes, dimension)
+    except BaseException:
+        descartar_generacion(generacion)
+        raise
+    _publicar_generacion(path, generacion)
     return path
 
 
-def cargar_embeddings_tags_df(path="data/courses_tags_embeddings.pkl"):
+def _publicar_generacion(path, generacion):
+    """Publica la generación y borra los archivos del formato sin generaciones."""
+    publicar_generacion(path, generacion, (*ARCHIVOS_ALMACEN, "meta.json"))
+
+
+def generacion_almacen(path):
+    """
+    Identificador de la generación vigente del almacén (cambia con cada escritura),
+    o None si no hay embeddings guardados.
+    """
+    path = _ruta_almacen(path)
+    vigente = generacion_vigente(path)
+    if vigente is not None:
+        return vigente
+    # Formato anterior, con los archivos directamente en la carpeta
+    try:
+        return str(os.stat(os.path.join(path, "meta.json")).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+
+def _guardar_ids_y_meta(
+    path, id_col, ids, hashes, dimension, ids_ordenados=None, filas_ordenadas=None
+):
+    """
+    Escribe en la carpeta de una generación los IDs, hashes, el índice ordenado y meta.json.
+    Si no se pasa el índice ordenado (ids_ordenados, filas_ordenadas), se calcula.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if hashes is None:
+        hashes = np.zeros(len(ids), dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if ids_ordenados is None or filas_ordenadas is None:
+        filas_ordenadas = np.argsort(ids, kind="stable")
+        ids_ordenados = ids[filas_ordenadas]
+    arrays = {
+        "ids.npy": ids,
+        "hashes.npy": hashes,
+        "ids_ordenados.npy": np.asarray(ids_ordenados, dtype=np.int64),
+        "filas_ordenadas.npy": np.asarray(filas_ordenadas, dtype=np.int64),
+    }
+    for nombre, array in arrays.items():
+        np.save(os.path.join(path, nombre), array)
+    meta = {
+        "formato": 2,
+        "id_col": id_col,
+        "filas": int(len(ids)),
+        "dimension": dimension,
+        "dtype": "float32",
+        "modelo": MODEL_LOCAL_PATH,
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+class EscritorAlmacenEmbeddings:
+    """
+    Escribe un almacén de embeddings por lotes sin tener la matriz completa en memoria.
+    Las filas se vuelcan a un archivo temporal de una generación nueva a medida que llegan;
+    al cerrar se copia por bloques al embeddings.npy definitivo, se escriben IDs, hashes y
+    meta.json y se publica la generación. Hasta cerrar, el almacén anterior en path sigue
+    intacto. Se usa como gestor de contexto.
+    """
+
+    def __init__(self, path, id_col, tam_bloque_copia=65536):
+        self.path = _ruta_almacen(path)
+        self.id_col = id_col
+        self.tam_bloque_copia = tam_bloque_copia
+        self._generacion = nueva_generacion(self.path)
+        self._ruta_parcial = os.path.join(self._generacion, "embeddings.parcial")
+        self._archivo = open(self._ruta_parcial, "wb")
+        self._ids = []
+        self._hashes = []
+        self.filas = 0
+        self.dimension = None
+
+    def agregar(self, ids, matriz, hashes=None):
+        matriz = np.ascontiguousarray(matriz, dtype=np.float32).reshape(len(ids), -1)
+        if self.dimension is None:
+            self.dimension = matriz.shape[1]
+        elif matriz.shape[1] != self.dimension:
+            raise ValueError(
+                f"Dimensión {matriz.shape[1]} distinta de la del almacén ({self.dimension})."
+            )
+        self._archivo.write(matriz.tobytes())
+        self._ids.append(np.asarray(ids, dtype=np.int64))
+        self._hashes.append(
+            np.zeros(len(ids), dtype=np.uint64)
+            if hashes is None
+            else np.asarray(hashes, dtype=np.uint64)
+        )
+        self.filas += len(ids)
+
+    def cerrar(self):
+        self._archivo.close()
+        dimension = self.dimension or 0
+        destino = np.lib.format.open_memmap(
+            os.path.join(self._generacion, "embeddings.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(self.filas, dimension),
+        )
+        if self.filas and dimension:
+            origen = np.memmap(
+                self._ruta_parcial,
+                dtype=np.float32,
+                mode="r",
+                shape=(self.filas, dimension),
+            )
+            for inicio in range(0, self.filas, self.tam_bloque_copia):
+                fin = inicio + self.tam_bloque_copia
+                destino[inicio:fin] = origen[inicio:fin]
+            del origen
+        destino.flush()
+        del destino
+        os.remove(self._ruta_parcial)
+        vacio = np.empty(0, dtype=np.int64)
+        _guardar_ids_y_meta(
+            self._generacion,
+            self.id_col,
+            np.concatenate(self._ids) if self._ids else vacio,
+            np.concatenate(self._hashes) if self._hashes else vacio.astype(np.uint64),
+            dimension,
+        )
+        _publicar_generacion(self.path, self._generacion)
+        return self.path
+
+    def descartar(self):
+        self._archivo.close()
+        descartar_generacion(self._generacion)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+
+
+def cargar_almacen_embeddings(path="data/courses_tags_embeddings", mmap=True):
     """
-    Carga el DataFrame con embeddings de tags desde un archivo pickle.
+    Abre la generación vigente de un almacén de embeddings sin copiar la matriz (memmap
+    de solo lectura). Si solo existe el pickle antiguo, lo migra primero al nuevo formato.
+    Devuelve None si no hay embeddings guardados.
     """
-    if os.path.exists(path):
-        return pd.read_pickle(path)
-    return None
+    path = _ruta_almacen(path)
+    if generacion_almacen(path) is None:
+        if not os.path.exists(path + ".pkl"):
+            return None
+        migrar_embeddings_pkl(path + ".pkl", path)
+    intentos = GENERACIONES_CONSERVADAS + 2
+    for intento in range(intentos):
+        carpeta = carpeta_generacion(path)
+        try:
+            almacen = _abrir_generacion(carpeta, mmap)
+        except FileNotFoundError:
+            # Otra escritura publicó y borró esta generación mientras se abría
+            if intento == intentos - 1:
+                raise
+            continue
+        almacen.meta["generacion"] = (
+            os.path.basename(carpeta) if carpeta != path else generacion_almacen(path)
+        )
+        return almacen
+
+
+def _abrir_generacion(carpeta, mmap):
+    with open(os.path.join(carpeta, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    modo = "r" if mmap else None
+    arrays = {
+        nombre: np.load(os.path.join(carpeta, nombre), mmap_mode=modo)
+        for nombre in ARCHIVOS_ALMACEN
+    }
+    return AlmacenEmbeddings(
+        meta["id_col"],
+        arrays["ids.npy"],
+        arrays["embeddings.npy"].reshape(meta["filas"], meta["dimension"]),
+        hashes=arrays["hashes.npy"],
+        ids_ordenados=arrays["ids_ordenados.npy"],
+        filas_ordenadas=arrays["filas_ordenadas.npy"],
+        meta=meta,
+    )
+
+
+def migrar_embeddings_pkl(path_pkl, path=None):
+    """
+    Convierte un DataFrame pickle antiguo (ID, Tags, Tags_Embedding) al almacén float32.
+    """
+    df = pd.read_pickle(path_pkl)
+    id_col = "CursoID" if "CursoID" in df.columns else "EstudianteID"
+    hashes = (
+        df["Tags_Hash"] if "Tags_Hash" in df.columns else df["Tags"].apply(hash_tags)
+    )
+    return guardar_almacen_embeddings(
+        path or _ruta_almacen(path_pkl),
+        id_col,
+        df[id_col].values,
+        _matriz_desde_columna(df["Tags_Embedding"]),
+        hashes.values.astype(np.uint64),
+    )
+
+
+def _matriz_desde_columna(columna, dimension=0):
+    """
+    Apila una columna de embeddings (listas o arrays) en una matriz float32.
+    """
+    if len(columna) == 0:
+        return np.zeros((0, dimension), dtype=np.float32)
+    return np.stack([np.asarray(v, dtype=np.float32) for v in columna])
+
+
+def guardar_embeddings_courses_df(df, path="data/courses_tags_embeddings"):
+    """
+    Guarda los embeddings de la columna 'Tags_Embedding' de cursos en un almacén float32.
+    """
+    hashes = (
+        df["Tags_Hash"] if "Tags_Hash" in df.columns else df["Tags"].apply(hash_tags)
+    )
+    return guardar_almacen_embeddings(
+        path,
+        "CursoID",
+        df["CursoID"].values,
+        _matriz_desde_columna(df["Tags_Embedding"]),
+        hashes.values.astype(np.uint64),
+    )
+
+
+def guardar_embeddings_estudiantes_df(df, path="data/students_tags_embeddings"):
+    """
+    Guarda los embeddings de la columna 'Tags_Embedding' de estudiantes en un almacén float32.
+    """
+    hashes = (
+        df["Tags_Hash"] if "Tags_Hash" in df.columns else df["Tags"].apply(hash_tags)
+    )
+    return guardar_almacen_embeddings(
+        path,
+        "EstudianteID",
+        df["EstudianteID"].values,
+        _matriz_desde_columna(df["Tags_Embedding"]),
+        hashes.values.astype(np.uint64),
+    )
+
+
+def cargar_embeddings_tags_df(path="data/courses_tags_embeddings"):
+    """
+    Carga los embeddings de tags como DataFrame (ID, Tags_Hash, Tags_Embedding).
+    La columna 'Tags_Embedding' contiene vistas del memmap, sin copiar la matriz.
+    """
+    almacen = cargar_almacen_embeddings(path)
+    if almacen is None:
+        return None
+    return almacen.a_dataframe()
 
 
 # =========================
 # Actualización inteligente de embeddings
 # =========================
-def actualizar_embeddings_si_necesario(df, path):
+def hash_tags(tags):
+    """
+    Devuelve un hash de contenido (entero sin signo de 64 bits) de una entrada de tags.
+    Dos entradas con los mismos tags en el mismo orden producen el mismo hash.
+    """
+    contenido = "\x1f".join(convertir_tags_a_lista(tags))
+    return int.from_bytes(
+        hashlib.blake2b(contenido.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def actualizar_embeddings_por_lotes(lotes, path, model=None, cache=None):
     """
-    Recalcula y guarda los embeddings solo si hay cursos o estudiantes nuevos o modificados.
-    Devuelve el DataFrame actualizado con embeddings.
+    Versión por lotes de actualizar_embeddings_si_necesario para tablas muy grandes.
+    lotes es un iterable de DataFrames con CursoID/EstudianteID y Tags; cada lote se compara
+    con el almacén anterior (por ID y hash de tags), se codifican solo sus filas nuevas o
+    modificadas y se escribe enseguida con EscritorAlmacenEmbeddings, así la memoria depende
+    del tamaño del lote y no del total. Devuelve un resumen con filas y filas codificadas.
+    """
+    anterior = cargar_almacen_embeddings(path)
+    escritor = None
+    codificadas = 0
+    try:
+        for lote in lotes:
+            id_col = "CursoID" if "CursoID" in lote.columns else "EstudianteID"
+            if escritor is None:
+                if anterior is not None and anterior.id_col != id_col:
+                    anterior = None
+                escritor = EscritorAlmacenEmbeddings(path, id_col)
+            tags = lote["Tags"].apply(convertir_tags_a_lista)
+            hashes = tags.apply(hash_tags).values.astype(np.uint64)
+            ids = lote[id_col].values
+            filas_previas = (
+                np.full(len(lote), -1, dtype=np.int64)
+                if anterior is None
+                else anterior.filas(ids)
+            )
+            cambiados = filas_previas < 0
+            existe = ~cambiados
+            if existe.any():
+                cambiados[existe] = (
+                    np.asarray(anterior.hashes)[filas_previas[existe]] != hashes[existe]
+                )
+            matriz = None
+            if cambiados.any():
+                df_nuevos = obtener_embeddings_tags_df(
+                    pd.DataFrame({"Tags": tags[cambiados].tolist()}),
+                    tags_col="Tags",
+                    model=model,
+                    cache=cache,
+                )
+                nuevos = _matriz_desde_columna(df_nuevos["Tags_Embedding"])
+                matriz = np.empty((len(lote), nuevos.shape[1]), dtype=np.float32)
+                matriz[cambiados] = nuevos
+                codificadas += int(cambiados.sum())
+            if not cambiados.all():
+                previas = anterior.matriz[filas_previas[~cambiados]]
+                if matriz is None:
+                    matriz = np.empty((len(lote), previas.shape[1]), dtype=np.float32)
+                matriz[~cambiados] = previas
+            escritor.agregar(ids, matriz, hashes)
+    except BaseException:
+        if escritor is not None:
+            escritor.descartar()
+        raise
+    if escritor is None:
+        return {"filas": 0, "codificadas": 0}
+    # Se suelta el memmap anterior antes de reemplazar sus archivos
+    anterior = None
+    escritor.cerrar()
+    return {"filas": escritor.filas, "codificadas": codificadas}
+
+
+def actualizar_embeddings_si_necesario(df, path, model=None, cache=None):
+    """
+    Actualiza de forma incremental los embeddings guardados en path.
+    Compara por CursoID/EstudianteID y por el hash de los tags: solo se codifican las filas
+    nuevas o con tags modificados, se descartan los IDs que ya no existen y el resultado
+    se fusiona con lo guardado. Devuelve el DataFrame actualizado con embeddings.
     """
-    df_existente = cargar_embeddings_tags_df(path)
-    recalcular = False
-    id_col = None
     if "CursoID" in df.columns:
         id_col = "CursoID"
     elif "EstudianteID" in df.columns:
         id_col = "EstudianteID"
     else:
         raise ValueError("El DataFrame debe tener 'CursoID' o 'EstudianteID'.")
-    if df_existente is None or len(df_existente) != len(df):
-        recalcular = True
+    df = df.copy()
+    df["Tags"] = df["Tags"].apply(convertir_tags_a_lista)
+    df["Tags_Hash"] = df["Tags"].apply(hash_tags).astype("uint64")
+
+    almacen = cargar_almacen_embeddings(path)
+    if almacen is not None and almacen.id_col != id_col:
+        almacen = None
+    if almacen is None:
+        filas_previas = np.full(len(df), -1, dtype=np.int64)
     else:
-        if not (
-            df_existente[id_col].equals(df[id_col])
-            and df_existente["Tags"].equals(df["Tags"])
-        ):
-            recalcular = True
-    if recalcular:
-        df = obtener_embeddings_tags_df(df, tags_col="Tags")
-        if id_col == "CursoID":
-            guardar_embeddings_courses_df(df, path)
-        else:
-            guardar_embeddings_estudiantes_df(df, path)
+        filas_previas = almacen.filas(df[id_col].values)
+    existe = filas_previas >= 0
+    cambiados = ~existe
+    if existe.any():
+        cambiados[existe] = (
+            np.asarray(almacen.hashes)[filas_previas[existe]]
+            != df["Tags_Hash"].values[existe]
+        )
+    sin_cambios = (
+        almacen is not None
+        and not cambiados.any()
+        and np.array_equal(almacen.ids, df[id_col].values)
+    )
+    if sin_cambios:
+        df["Tags_Embedding"] = list(almacen.matriz)
         return df
-    return df_existente
+
+    nuevos = None
+    if cambiados.any():
+        df_nuevos = obtener_embeddings_tags_df(
+            df[cambiados], tags_col="Tags", model=model, cache=cache
+        )
+        nuevos = _matriz_desde_columna(df_nuevos["Tags_Embedding"])
+    if nuevos is not None:
+        dimension = nuevos.shape[1]
+    else:
+        dimension = almacen.dimension if almacen is not None else 0
+    matriz = np.empty((len(df), dimension), dtype=np.float32)
+    if nuevos is not None:
+        matriz[cambiados] = nuevos
+    if not cambiados.all():
+        # Se copian de una vez las filas que no cambiaron desde el almacén anterior
+        matriz[~cambiados] = almacen.matriz[filas_previas[~cambiados]]
+    # Se suelta el memmap anterior antes de reemplazar sus archivos
+    almacen = None
+    guardar_almacen_embeddings(
+        path, id_col, df[id_col].values, matriz, df["Tags_Hash"].values
+    )
+    df["Tags_Embedding"] = list(matriz)
+    return df
+
+
+def actualizar_filas_embeddings(
+    path, id_col, ids, tags, model=None, cache=None, tam_bloque_copia=65536
+):
+    """
+    Actualiza solo las filas dadas (IDs y sus tags) del almacén en path, sin leer la tabla
+    completa: los hashes de esas filas se comparan con los guardados y solo se codifican
+    las nuevas o con tags modificados. La generación nueva copia por bloques la matriz
+    anterior, reemplaza las filas modificadas y agrega las nuevas al final (el índice
+    ordenado se actualiza insertando los IDs nuevos, sin reordenar todo).
+    Es el camino de los registros y ediciones de la API; el flujo por lotes sigue usando
+    la comparación de la tabla completa (que además descarta los IDs que ya no existen).
+    Devuelve un resumen con filas y codificadas, o None si aún no hay un almacén de id_col
+    en path (en ese caso hay que construirlo con actualizar_embeddings_si_necesario).
+    """
+    anterior = cargar_almacen_embeddings(path)
+    if anterior is None or anterior.id_col != id_col:
+        return None
+    ids = np.asarray(ids, dtype=np.int64)
+    # Si un ID se repite, vale su última aparición
+    _, ultimas = np.unique(ids[::-1], return_index=True)
+    seleccion = np.sort(len(ids) - 1 - ultimas)
+    ids = ids[seleccion]
+    tags = [convertir_tags_a_lista(tags[i]) for i in seleccion]
+    hashes = np.array([hash_tags(t) for t in tags], dtype=np.uint64)
+    filas_previas = anterior.filas(ids)
+    cambiados = filas_previas < 0
+    existe = ~cambiados
+    if existe.any():
+        cambiados[existe] = (
+            np.asarray(anterior.hashes)[filas_previas[existe]] != hashes[existe]
+        )
+    if not cambiados.any():
+        return {"filas": len(anterior), "codificadas": 0}
+
+    df_nuevos = obtener_embeddings_tags_df(
+        pd.DataFrame({"Tags": [tags[i] for i in np.flatnonzero(cambiados)]}),
+        tags_col="Tags",
+        model=model,
+        cache=cache,
+    )
+    nuevos = _matriz_desde_columna(df_nuevos["Tags_Embedding"])
+    if len(anterior) and nuevos.shape[1] != anterior.dimension:
+        raise ValueError(
+            f"Dimensión {nuevos.shape[1]} distinta de la del almacén ({anterior.dimension})."
+        )
+    filas_cambiadas = filas_previas[cambiados]
+    parchear = filas_cambiadas >= 0
+    ids_agregados = ids[cambiados][~parchear]
+    n = len(anterior)
+    dimension = nuevos.shape[1]
+
+    generacion = nueva_generacion(_ruta_almacen(path))
+    try:
+        destino = np.lib.format.open_memmap(
+            os.path.join(generacion, "embeddings.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(n + len(ids_agregados), dimension),
+        )
+        for inicio in range(0, n, tam_bloque_copia):
+            fin = min(inicio + tam_bloque_copia, n)
+            destino[inicio:fin] = anterior.matriz[inicio:fin]
+        destino[filas_cambiadas[parchear]] = nuevos[parchear]
+        destino[n:] = nuevos[~parchear]
+        destino.flush()
+        del destino
+        hashes_todos = np.concatenate(
+            [np.asarray(anterior.hashes, dtype=np.uint64), hashes[cambiados][~parchear]]
+        )
+        hashes_todos[filas_cambiadas[parchear]] = hashes[cambiados][parchear]
+        # Los IDs agregados se insertan en el índice ordenado en su posición
+        orden = np.argsort(ids_agregados, kind="stable")
+        posiciones = np.searchsorted(anterior.ids_ordenados, ids_agregados[orden])
+        _guardar_ids_y_meta(
+            generacion,
+            id_col,
+            np.concatenate([np.asarray(anterior.ids, dtype=np.int64), ids_agregados]),
+            hashes_todos,
+            dimension,
+            ids_ordenados=np.insert(
+                anterior.ids_ordenados, posiciones, ids_agregados[orden]
+            ),
+            filas_ordenadas=np.insert(anterior.filas_ordenadas, posiciones, n + orden),
+        )
+    except BaseException:
+        descartar_generacion(generacion)
+        raise
+    # Se suelta el memmap anterior antes de publicar
+    anterior = None
+    _publicar_generacion(_ruta_almacen(path), generacion)
+    return {"filas": n + len(ids_agregados), "codificadas": int(cambiados.sum())}
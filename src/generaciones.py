@@ -0,0 +1,80 @@
+"""
+Carpetas publicadas por generaciones: cada escritura crea una subcarpeta nueva
+(gen-<marca>) y la hace vigente reemplazando de forma atómica el archivo CURRENT, que
+guarda su nombre. Un lector abre siempre los archivos de una sola generación completa y
+los memmap ya abiertos sobre una generación anterior siguen siendo válidos.
+
+Lo usan los almacenes de embeddings (src/embeddings.py) y el índice ANN de cursos
+(src/indice_ann.py).
+"""
+
+import itertools
+import os
+import shutil
+import time
+
+ARCHIVO_GENERACION = "CURRENT"
+# Generaciones anteriores que se conservan para los lectores que aún las están abriendo
+GENERACIONES_CONSERVADAS = 1
+_contador_generaciones = itertools.count()
+
+
+def nueva_generacion(path):
+    """Crea la carpeta (aún sin publicar, con sufijo .tmp) de una generación nueva."""
+    os.makedirs(path, exist_ok=True)
+    nombre = (
+        f"gen-{time.time_ns():016x}-{os.getpid()}-{next(_contador_generaciones)}.tmp"
+    )
+    generacion = os.path.join(path, nombre)
+    os.makedirs(generacion)
+    return generacion
+
+
+def publicar_generacion(path, generacion, archivos_anteriores=()):
+    """
+    Hace vigente la generación: la renombra sin .tmp y reemplaza CURRENT de forma atómica.
+    Después borra las generaciones viejas y archivos_anteriores (los del formato sin
+    generaciones, directamente en path).
+    """
+    final = generacion[: -len(".tmp")]
+    os.replace(generacion, final)
+    tmp_path = os.path.join(path, ARCHIVO_GENERACION + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(final))
+    os.replace(tmp_path, os.path.join(path, ARCHIVO_GENERACION))
+    anteriores = sorted(
+        nombre
+        for nombre in os.listdir(path)
+        if nombre.startswith("gen-")
+        and not nombre.endswith(".tmp")
+        and nombre < os.path.basename(final)
+    )
+    for nombre in anteriores[: max(0, len(anteriores) - GENERACIONES_CONSERVADAS)]:
+        # Los memmap abiertos sobre esos archivos siguen siendo válidos (POSIX)
+        shutil.rmtree(os.path.join(path, nombre), ignore_errors=True)
+    for nombre in archivos_anteriores:
+        try:
+            os.remove(os.path.join(path, nombre))
+        except OSError:
+            pass
+    return final
+
+
+def descartar_generacion(generacion):
+    """Borra una generación que no llegó a publicarse."""
+    shutil.rmtree(generacion, ignore_errors=True)
+
+
+def generacion_vigente(path):
+    """Nombre de la generación vigente de path, o None si no tiene CURRENT."""
+    try:
+        with open(os.path.join(path, ARCHIVO_GENERACION), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def carpeta_generacion(path):
+    """Carpeta con los archivos de la generación vigente (o path sin generaciones)."""
+    vigente = generacion_vigente(path)
+    return path if vigente is None else os.path.join(path, vigente)
@@ -0,0 +1,351 @@
+"""
+Índices de vecinos más cercanos aproximados (ANN) sobre la matriz de embeddings de cursos.
+Para catálogos muy grandes evitan comparar cada estudiante con todos los cursos.
+
+Backends disponibles:
+- "ivf": índice de listas invertidas (k-means esférico) implementado con NumPy.
+- "hnswlib" y "faiss": grafos HNSW, solo si la librería correspondiente está instalada.
+- "exacto": fuerza bruta, útil como referencia para medir el recall.
+
+Todos usan similitud coseno y exponen el mismo parámetro de calidad/latencia, 'esfuerzo':
+número de listas sondeadas (IVF) o tamaño de la lista de candidatos ef (HNSW).
+"""
+
+import os
+import json
+import numpy as np
+
+try:
+    from src.generaciones import (
+        GENERACIONES_CONSERVADAS,
+        carpeta_generacion,
+        descartar_generacion,
+        nueva_generacion,
+        publicar_generacion,
+    )
+    from src.recommender import normalizar_filas, top_k_filas
+except ModuleNotFoundError:
+    from generaciones import (
+        GENERACIONES_CONSERVADAS,
+        carpeta_generacion,
+        descartar_generacion,
+        nueva_generacion,
+        publicar_generacion,
+    )
+    from recommender import normalizar_filas, top_k_filas
+
+# Archivos que el formato sin generaciones dejaba directamente en la carpeta del índice
+ARCHIVOS_INDICE = (
+    "ids.npy",
+    "meta.json",
+    "vectores.npy",
+    "centroides.npy",
+    "inicios.npy",
+    "hnswlib.bin",
+    "faiss.index",
+)
+
+
+class IndiceExacto:
+    """
+    Búsqueda exacta por fuerza bruta (producto con todos los cursos).
+    """
+
+    backend = "exacto"
+
+    def __init__(self, matriz, ids):
+        self.vectores = normalizar_filas(matriz)
+        self.ids = np.asarray(ids)
+
+    def buscar(self, consultas, k=3, esfuerzo=None):
+        posiciones, puntuaciones = top_k_filas(
+            normalizar_filas(consultas) @ self.vectores.T, k
+        )
+        return self.ids[posiciones], puntuaciones
+
+    def _guardar_datos(self, path):
+        np.save(os.path.join(path, "vectores.npy"), self.vectores)
+        return {}
+
+    @classmethod
+    def _cargar_datos(cls, path, ids, meta):
+        indice = cls.__new__(cls)
+        indice.vectores = np.load(os.path.join(path, "vectores.npy"), mmap_mode="r")
+        indice.ids = ids
+        return indice
+
+
+class IndiceIVF:
+    """
+    Índice de listas invertidas: los cursos se agrupan con k-means esférico y cada consulta
+    solo se compara con los cursos de las 'esfuerzo' listas cuyos centroides son más cercanos.
+    Con esfuerzo = n_listas la búsqueda es exacta.
+    """
+
+    backend = "ivf"
+
+    def __init__(
+        self,
+        matriz,
+        ids,
+        n_listas=None,
+        n_sondas=8,
+        n_iter=10,
+        max_muestra=100000,
+        semilla=0,
+    ):
+        vectores = normalizar_filas(matriz)
+        n = len(vectores)
+        if n_listas is None:
+            n_listas = max(1, int(np.sqrt(n)))
+        n_listas = max(1, min(n_listas, n))
+        self.n_sondas = n_sondas
+        self.centroides = _kmeans_esferico(
+            vectores, n_listas, n_iter=n_iter, max_muestra=max_muestra, semilla=semilla
+        )
+        asignacion = _asignar(vectores, self.centroides)
+        # Los vectores se reordenan por lista: cada lista es un bloque contiguo
+        orden = np.argsort(asignacion, kind="stable")
+        self.vectores = vectores[orden]
+        self.ids = np.asarray(ids)[orden]
+        self.inicios = np.searchsorted(asignacion[orden], np.arange(n_listas + 1))
+
+    @property
+    def n_listas(self):
+        return len(self.centroides)
+
+    def buscar(self, consultas, k=3, esfuerzo=None):
+        """
+        Devuelve (ids, puntuaciones) de forma (n_consultas, k). Si una consulta tiene menos
+        de k candidatos, las posiciones sobrantes quedan con id -1 y puntuación -inf.
+        """
+        consultas = normalizar_filas(consultas)
+        n_sondas = max(1, min(esfuerzo or self.n_sondas, self.n_listas))
+        listas, _ = top_k_filas(consultas @ self.centroides.T, n_sondas)
+        ids = np.full((len(consultas), k), -1, dtype=np.int64)
+        puntuaciones = np.full((len(consultas), k), -np.inf, dtype=np.float32)
+        for i, consulta in enumerate(consultas):
+            bloques = [
+                np.arange(self.inicios[lista], self.inicios[lista + 1])
+                for lista in listas[i]
+            ]
+            filas = np.concatenate(bloques)
+            if len(filas) == 0:
+                continue
+            posiciones, valores = top_k_filas(self.vectores[filas] @ consulta, k)
+            encontrados = posiciones.shape[1]
+            ids[i, :encontrados] = self.ids[filas[posiciones[0]]]
+            puntuaciones[i, :encontrados] = valores[0]
+        return ids, puntuaciones
+
+    def _guardar_datos(self, path):
+        np.save(os.path.join(path, "vectores.npy"), self.vectores)
+        np.save(os.path.join(path, "centroides.npy"), self.centroides)
+        np.save(os.path.join(path, "inicios.npy"), self.inicios)
+        return {"n_sondas": self.n_sondas}
+
+    @classmethod
+    def _cargar_datos(cls, path, ids, meta):
+        indice = cls.__new__(cls)
+        indice.vectores = np.load(os.path.join(path, "vectores.npy"), mmap_mode="r")
+        indice.centroides = np.load(os.path.join(path, "centroides.npy"))
+        indice.inicios = np.load(os.path.join(path, "inicios.npy"))
+        indice.ids = ids
+        indice.n_sondas = meta.get("n_sondas", 8)
+        return indice
+
+
+def _asignar(vectores, centroides, tam_bloque=8192):
+    """
+    Índice del centroide más cercano (mayor producto) de cada vector, por bloques.
+    """
+    asignacion = np.empty(len(vectores), dtype=np.int64)
+    for inicio in range(0, len(vectores), tam_bloque):
+        bloque = vectores[inicio : inicio + tam_bloque]
+        asignacion[inicio : inicio + tam_bloque] = np.argmax(
+            bloque @ centroides.T, axis=1
+        )
+    return asignacion
+
+
+def _kmeans_esferico(vectores, n_listas, n_iter=10, max_muestra=100000, semilla=0):
+    """
+    k-means con similitud coseno sobre una muestra de los vectores (ya normalizados).
+    """
+    rng = np.random.default_rng(semilla)
+    if len(vectores) > max_muestra:
+        vectores = vectores[rng.choice(len(vectores), max_muestra, replace=False)]
+    centroides = vectores[rng.choice(len(vectores), n_listas, replace=False)].copy()
+    for _ in range(n_iter):
+        asignacion = _asignar(vectores, centroides)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignacion, vectores)
+        vacias = ~np.any(sumas, axis=1)
+        if vacias.any():
+            # Las listas vacías se reinician con vectores al azar
+            sumas[vacias] = vectores[rng.choice(len(vectores), vacias.sum())]
+        centroides = normalizar_filas(sumas)
+    return centroides
+
+
+class IndiceHNSWLib:
+    """
+    Grafo HNSW de hnswlib con producto interno sobre vectores normalizados.
+    """
+
+    backend = "hnswlib"
+
+    def __init__(self, matriz, ids, M=16, ef_construccion=200, ef_busqueda=64):
+        import hnswlib
+
+        vectores = normalizar_filas(matriz)
+        self.ids = np.asarray(ids)
+        self.ef_busqueda = ef_busqueda
+        self.indice = hnswlib.Index(space="ip", dim=vectores.shape[1])
+        self.indice.init_index(
+            max_elements=len(vectores), ef_construction=ef_construccion, M=M
+        )
+        self.indice.add_items(vectores, np.arange(len(vectores)))
+
+    def buscar(self, consultas, k=3, esfuerzo=None):
+        k = min(k, len(self.ids))
+        self.indice.set_ef(max(esfuerzo or self.ef_busqueda, k))
+        posiciones, distancias = self.indice.knn_query(normalizar_filas(consultas), k=k)
+        return self.ids[posiciones], (1.0 - distancias).astype(np.float32)
+
+    def _guardar_datos(self, path):
+        self.indice.save_index(os.path.join(path, "hnswlib.bin"))
+        return {"dimension": self.indice.dim, "ef_busqueda": self.ef_busqueda}
+
+    @classmethod
+    def _cargar_datos(cls, path, ids, meta):
+        import hnswlib
+
+        indice = cls.__new__(cls)
+        indice.ids = ids
+        indice.ef_busqueda = meta["ef_busqueda"]
+        indice.indice = hnswlib.Index(space="ip", dim=meta["dimension"])
+        indice.indice.load_index(os.path.join(path, "hnswlib.bin"), len(ids))
+        return indice
+
+
+class IndiceFaiss:
+    """
+    Grafo HNSW de faiss con producto interno sobre vectores normalizados.
+    """
+
+    backend = "faiss"
+
+    def __init__(self, matriz, ids, M=16, ef_construccion=200, ef_busqueda=64):
+        import faiss
+
+        vectores = normalizar_filas(matriz)
+        self.ids = np.asarray(ids)
+        self.ef_busqueda = ef_busqueda
+        self.indice = faiss.IndexHNSWFlat(
+            vectores.shape[1], M, faiss.METRIC_INNER_PRODUCT
+        )
+        self.indice.hnsw.efConstruction = ef_construccion
+        self.indice.add(vectores)
+
+    def buscar(self, consultas, k=3, esfuerzo=None):
+        k = min(k, len(self.ids))
+        self.indice.hnsw.efSearch = max(esfuerzo or self.ef_busqueda, k)
+        puntuaciones, posiciones = self.indice.search(normalizar_filas(consultas), k)
+        ids = np.where(posiciones >= 0, self.ids[np.maximum(posiciones, 0)], -1)
+        return ids, puntuaciones
+
+    def _guardar_datos(self, path):
+        import faiss
+
+        faiss.write_index(self.indice, os.path.join(path, "faiss.index"))
+        return {"ef_busqueda": self.ef_busqueda}
+
+    @classmethod
+    def _cargar_datos(cls, path, ids, meta):
+        import faiss
+
+        indice = cls.__new__(cls)
+        indice.ids = ids
+        indice.ef_busqueda = meta["ef_busqueda"]
+        indice.indice = faiss.read_index(os.path.join(path, "faiss.index"))
+        return indice
+
+
+BACKENDS = {
+    clase.backend: clase
+    for clase in (IndiceExacto, IndiceIVF, IndiceHNSWLib, IndiceFaiss)
+}
+
+
+def backend_disponible(backend):
+    """
+    Indica si las dependencias del backend están instaladas.
+    """
+    if backend in ("exacto", "ivf"):
+        return True
+    from importlib.util import find_spec
+
+    return find_spec(backend) is not None
+
+
+def construir_indice_cursos(matriz, ids, backend="auto", **parametros):
+    """
+    Construye un índice ANN sobre la matriz de embeddings de cursos.
+    Con backend="auto" usa hnswlib o faiss si están instalados y si no el IVF de NumPy.
+    """
+    if backend == "auto":
+        backend = next(b for b in ("hnswlib", "faiss", "ivf") if backend_disponible(b))
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Backend ANN desconocido: {backend}. Opciones: {sorted(BACKENDS)}"
+        )
+    return BACKENDS[backend](matriz, ids, **parametros)
+
+
+def guardar_indice_cursos(indice, path, meta_extra=None):
+    """
+    Guarda el índice en la carpeta path (ids.npy, datos del backend y meta.json) como una
+    generación nueva que se publica de una sola vez (ver src/generaciones.py): los índices
+    ya cargados, con sus memmap, siguen leyendo la generación anterior completa.
+    meta_extra permite guardar datos propios (por ejemplo, de qué versión de los cursos proviene).
+    """
+    generacion = nueva_generacion(path)
+    try:
+        np.save(os.path.join(generacion, "ids.npy"), np.asarray(indice.ids))
+        meta = dict(meta_extra or {})
+        meta["backend"] = indice.backend
+        meta.update(indice._guardar_datos(generacion))
+        with open(os.path.join(generacion, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+    except BaseException:
+        descartar_generacion(generacion)
+        raise
+    publicar_generacion(path, generacion, ARCHIVOS_INDICE)
+    indice.meta = meta
+    return path
+
+
+def cargar_indice_cursos(path):
+    """
+    Carga la generación vigente de un índice guardado con guardar_indice_cursos.
+    Devuelve None si no existe.
+    """
+    intentos = GENERACIONES_CONSERVADAS + 2
+    for intento in range(intentos):
+        carpeta = carpeta_generacion(path)
+        meta_path = os.path.join(carpeta, "meta.json")
+        if carpeta == path and not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            ids = np.load(os.path.join(carpeta, "ids.npy"))
+            indice = BACKENDS[meta["backend"]]._cargar_datos(carpeta, ids, meta)
+        except FileNotFoundError:
+            # Otra escritura publicó y borró esta generación mientras se abría
+            if intento == intentos - 1:
+                raise
+            continue
+        indice.meta = meta
+        return indice
@@ -0,0 +1,262 @@
+"""
+Instrumentación del sistema: contadores, distribuciones (latencias, tamaños de lote) y
+perfiles cProfile por etapa. Los módulos registran sobre una instancia global
+(get_metricas), que se vuelca como JSON o en el formato de texto de Prometheus.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Muestras recientes que se conservan por distribución para calcular percentiles
+MAX_MUESTRAS = 4096
+PERCENTILES = (50, 90, 99)
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _texto_clave(clave, extra=()):
+    nombre, etiquetas = clave
+    etiquetas = etiquetas + tuple(extra)
+    if not etiquetas:
+        return nombre
+    return nombre + "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas) + "}"
+
+
+def _tamano(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+class _Distribucion:
+    """Cuenta, suma y máximo exactos más una ventana de muestras recientes."""
+
+    def __init__(self, max_muestras):
+        self.n = 0
+        self.total = 0.0
+        self.maximo = None
+        self.muestras = deque(maxlen=max_muestras)
+
+    def agregar(self, valor):
+        self.n += 1
+        self.total += valor
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        self.muestras.append(valor)
+
+    def resumen(self, percentiles=PERCENTILES):
+        resumen = {"n": self.n, "total": self.total, "max": self.maximo}
+        valores = np.percentile(np.fromiter(self.muestras, float), percentiles)
+        for p, valor in zip(percentiles, valores):
+            resumen[f"p{p}"] = float(valor)
+        return resumen
+
+
+class Metricas:
+    """
+    Registro de métricas seguro entre hilos.
+    - incrementar(nombre, valor, **etiquetas): contadores (bytes, documentos, fallos...).
+    - observar / medir(nombre, **etiquetas): distribuciones con percentiles (latencias).
+    - medir_io(formato, operacion, path): tiempo y bytes de lecturas/escrituras de archivos.
+    - etapa(nombre): duración de una etapa y, con el perfilado activado, su perfil cProfile.
+    """
+
+    def __init__(self, max_muestras=MAX_MUESTRAS):
+        self.max_muestras = max_muestras
+        self.perfilado = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._contadores = {}
+        self._distribuciones = {}
+        self._perfiles = {}
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            distribucion = self._distribuciones.get(clave)
+            if distribucion is None:
+                distribucion = self._distribuciones[clave] = _Distribucion(
+                    self.max_muestras
+                )
+            distribucion.agregar(float(valor))
+
+    @contextlib.contextmanager
+    def medir(self, nombre, **etiquetas):
+        """Observa en nombre los segundos que tarda el bloque (también si lanza una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    @contextlib.contextmanager
+    def medir_io(self, formato, operacion, path, agregar=False):
+        """
+        Mide una lectura o escritura ('lectura'/'escritura') del archivo path: al terminar
+        el bloque se suma su tamaño a io_bytes_total y la duración a io_segundos.
+        Con agregar=True (escritura al final del archivo) solo se cuentan los bytes nuevos.
+        """
+        previo = _tamano(path) if agregar else 0
+        with self.medir("io_segundos", formato=formato, operacion=operacion):
+            yield
+        tamano = _tamano(path)
+        if tamano is not None:
+            self.incrementar(
+                "io_bytes_total",
+                tamano - (previo or 0),
+                formato=formato,
+                operacion=operacion,
+            )
+
+    # =========================
+    # Etapas y perfilado
+    # =========================
+    def activar_perfilado(self, activo=True):
+        """Con el perfilado activo, cada bloque etapa(...) se perfila con cProfile."""
+        self.perfilado = activo
+
+    @contextlib.contextmanager
+    def etapa(self, nombre):
+        """
+        Mide una etapa en etapa_segundos{etapa=nombre}. Si el perfilado está activo se
+        acumula además su perfil (las etapas anidadas quedan dentro del perfil exterior,
+        y si otro perfilador ya está activo la etapa solo se mide).
+        """
+        perfil = None
+        if self.perfilado and not getattr(self._local, "perfilando", False):
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+                self._local.perfilando = True
+            except ValueError:
+                perfil = None
+        try:
+            with self.medir("etapa_segundos", etapa=nombre):
+                yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+                self._local.perfilando = False
+                with self._lock:
+                    if nombre in self._perfiles:
+                        self._perfiles[nombre].add(perfil)
+                    else:
+                        self._perfiles[nombre] = pstats.Stats(perfil)
+
+    def perfil(self, nombre, orden="cumulative", lineas=20):
+        """Texto con las funciones más costosas de la etapa, o None si no se perfiló."""
+        with self._lock:
+            stats = self._perfiles.get(nombre)
+            if stats is None:
+                return None
+            salida = io.StringIO()
+            stats.stream = salida
+            stats.sort_stats(orden).print_stats(lineas)
+        return salida.getvalue()
+
+    def guardar_perfiles(self, carpeta):
+        """Escribe un archivo <etapa>.prof (legible con pstats/snakeviz) por etapa perfilada."""
+        os.makedirs(carpeta, exist_ok=True)
+        paths = []
+        with self._lock:
+            for nombre, stats in self._perfiles.items():
+                path = os.path.join(carpeta, f"{nombre}.prof")
+                stats.dump_stats(path)
+                paths.append(path)
+        return paths
+
+    # =========================
+    # Consulta y volcado
+    # =========================
+    def contador(self, nombre, **etiquetas):
+        with self._lock:
+            return self._contadores.get(_clave(nombre, etiquetas), 0)
+
+    def resumen(self, nombre, **etiquetas):
+        """n, total, max y percentiles de una distribución, o None si no tiene muestras."""
+        with self._lock:
+            distribucion = self._distribuciones.get(_clave(nombre, etiquetas))
+            return None if distribucion is None else distribucion.resumen()
+
+    def instantanea(self):
+        """Diccionario con todos los contadores, los resúmenes y las etapas perfiladas."""
+        with self._lock:
+            return {
+                "contadores": {
+                    _texto_clave(clave): valor
+                    for clave, valor in sorted(self._contadores.items())
+                },
+                "distribuciones": {
+                    _texto_clave(clave): distribucion.resumen()
+                    for clave, distribucion in sorted(self._distribuciones.items())
+                },
+                "perfiles": sorted(self._perfiles),
+            }
+
+    def a_json(self, path=None):
+        texto = json.dumps(self.instantanea(), indent=2, ensure_ascii=False)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(texto)
+        return texto
+
+    def a_prometheus(self, prefijo="optativas_"):
+        """Métricas en el formato de texto de Prometheus (contadores y summaries)."""
+        lineas = []
+        with self._lock:
+            tipos = set()
+            for clave, valor in sorted(self._contadores.items()):
+                nombre = prefijo + clave[0]
+                if nombre not in tipos:
+                    tipos.add(nombre)
+                    lineas.append(f"# TYPE {nombre} counter")
+                lineas.append(f"{_texto_clave((nombre, clave[1]))} {valor}")
+            for clave, distribucion in sorted(self._distribuciones.items()):
+                nombre = prefijo + clave[0]
+                if nombre not in tipos:
+                    tipos.add(nombre)
+                    lineas.append(f"# TYPE {nombre} summary")
+                resumen = distribucion.resumen()
+                for p in PERCENTILES:
+                    cuantil = (("quantile", str(p / 100)),)
+                    lineas.append(
+                        f"{_texto_clave((nombre, clave[1]), cuantil)} {resumen[f'p{p}']}"
+                    )
+                lineas.append(
+                    f"{_texto_clave((nombre + '_sum', clave[1]))} {resumen['total']}"
+                )
+                lineas.append(
+                    f"{_texto_clave((nombre + '_count', clave[1]))} {resumen['n']}"
+                )
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._distribuciones.clear()
+            self._perfiles.clear()
+
+
+def get_metricas():
+    """Devuelve el registro global de métricas compartido por todos los módulos."""
+    return get_metricas._metricas
+
+
+# Se crea al importar el módulo para que todos los hilos registren en la misma instancia
+get_metricas._metricas = Metricas()
@@ -0,0 +1,715 @@
+"""
+Flujo completo (tags, embeddings, afinidad y recomendaciones) como un grafo de etapas.
+Cada etapa declara sus archivos de entrada y de salida y las dependencias se deducen de
+ellos. En un archivo de estado se guarda el hash del contenido de entradas y salidas: una
+etapa cuyas entradas, parámetros y código no cambiaron (y cuyas salidas siguen intactas)
+se omite. Las salidas cuyo tamaño y fecha de modificación no cambiaron no se vuelven a
+leer. Las ramas independientes (cursos y estudiantes) se ejecutan en paralelo.
+
+Uso:
+    python -m src.pipeline
+    python -m src.pipeline --etapas embeddings_cursos --forzar tags_cursos
+    python -m src.pipeline --secuencial --sin-ia
+    python -m src.pipeline --afinidad-densa
+"""
+
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ESTADO_NOMBRE = ".pipeline_estado.json"
+TAM_LOTE = 10000
+# Los archivos temporales de las escrituras atómicas no forman parte del contenido
+SUFIJOS_TEMPORALES = (".tmp", ".parcial")
+_TAM_LECTURA_HASH = 1 << 20
+
+
+def _modulo(nombre):
+    """Importa un módulo hermano, tanto desde la raíz del repositorio como desde src."""
+    try:
+        return importlib.import_module(f"src.{nombre}")
+    except ModuleNotFoundError as e:
+        if e.name not in ("src", f"src.{nombre}"):
+            raise
+        return importlib.import_module(nombre)
+
+
+# =========================
+# Hash de contenido
+# =========================
+def hash_archivo(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(_TAM_LECTURA_HASH), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def hash_ruta(path):
+    """
+    Hash del contenido de un archivo, o de todos los archivos de una carpeta (con sus
+    nombres relativos; en un almacén de embeddings, los de su generación vigente).
+    Retorna None si la ruta no existe.
+    """
+    if os.path.isfile(path):
+        return hash_archivo(path)
+    if not os.path.isdir(path):
+        return None
+    generacion = os.path.join(path, "CURRENT")
+    if os.path.isfile(generacion):
+        # Almacén con generaciones: cuenta solo el contenido de la vigente
+        with open(generacion, "r", encoding="utf-8") as f:
+            path = os.path.join(path, f.read().strip())
+    h = hashlib.blake2b(digest_size=16)
+    for raiz, carpetas, archivos in os.walk(path):
+        carpetas.sort()
+        for nombre in sorted(archivos):
+            if nombre.endswith(SUFIJOS_TEMPORALES):
+                continue
+            completo = os.path.join(raiz, nombre)
+            h.update(os.path.relpath(completo, path).encode("utf-8") + b"\0")
+            h.update(hash_archivo(completo).encode("ascii"))
+    return h.hexdigest()
+
+
+def huella_ruta(path):
+    """
+    Huella barata de un archivo o carpeta (tamaño y fecha de modificación de cada archivo,
+    sin leer su contenido; en un almacén con generaciones, los de la vigente).
+    Retorna None si la ruta no existe.
+    """
+    if os.path.isfile(path):
+        info = os.stat(path)
+        return [info.st_size, info.st_mtime_ns]
+    if not os.path.isdir(path):
+        return None
+    generacion = os.path.join(path, "CURRENT")
+    huella = []
+    if os.path.isfile(generacion):
+        with open(generacion, "r", encoding="utf-8") as f:
+            vigente = f.read().strip()
+        huella.append(vigente)
+        path = os.path.join(path, vigente)
+    for raiz, carpetas, archivos in os.walk(path):
+        carpetas.sort()
+        for nombre in sorted(archivos):
+            if nombre.endswith(SUFIJOS_TEMPORALES):
+                continue
+            completo = os.path.join(raiz, nombre)
+            info = os.stat(completo)
+            huella.append(
+                [os.path.relpath(completo, path), info.st_size, info.st_mtime_ns]
+            )
+    return huella
+
+
+def _hash_texto(texto):
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# =========================
+# Grafo de etapas
+# =========================
+class Etapa:
+    """
+    Paso del pipeline: funcion(config) lee las rutas de entradas y escribe las de salidas.
+    parametros son los valores de configuración que cambian el resultado; junto con el
+    código de la función y el hash de las entradas forman la firma de la etapa.
+    modulos son los módulos de src cuyo código usa la función (su fuente también entra en
+    la firma) y versiones las de las dependencias externas que afectan al resultado.
+    """
+
+    def __init__(
+        self,
+        nombre,
+        funcion,
+        entradas=(),
+        salidas=(),
+        parametros=None,
+        modulos=(),
+        versiones=None,
+    ):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.entradas = list(entradas)
+        self.salidas = list(salidas)
+        self.parametros = dict(parametros or {})
+        self.modulos = list(modulos)
+        self.versiones = dict(versiones or {})
+
+    def __repr__(self):
+        return f"Etapa({self.nombre!r})"
+
+
+class Pipeline:
+    """
+    Ejecuta un conjunto de etapas respetando sus dependencias (una etapa depende de la
+    que produce alguno de sus archivos de entrada) y guarda en path_estado la firma y el
+    hash de las salidas de cada etapa completada.
+    """
+
+    def __init__(self, etapas, path_estado):
+        self.etapas = {}
+        productor = {}
+        for etapa in etapas:
+            if etapa.nombre in self.etapas:
+                raise ValueError(f"Etapa duplicada: {etapa.nombre}.")
+            self.etapas[etapa.nombre] = etapa
+            for salida in etapa.salidas:
+                if salida in productor:
+                    raise ValueError(
+                        f"{salida} lo producen {productor[salida]} y {etapa.nombre}."
+                    )
+                productor[salida] = etapa.nombre
+        self.dependencias = {
+            nombre: {productor[e] for e in etapa.entradas if e in productor}
+            for nombre, etapa in self.etapas.items()
+        }
+        self.orden = self._orden_topologico()
+        self.path_estado = path_estado
+        self.estado = self._cargar_estado()
+
+    def _orden_topologico(self):
+        orden, visitadas, en_curso = [], set(), set()
+
+        def visitar(nombre):
+            if nombre in visitadas:
+                return
+            if nombre in en_curso:
+                raise ValueError(f"Ciclo en las dependencias de la etapa {nombre}.")
+            en_curso.add(nombre)
+            for dependencia in sorted(self.dependencias[nombre]):
+                visitar(dependencia)
+            en_curso.discard(nombre)
+            visitadas.add(nombre)
+            orden.append(nombre)
+
+        for nombre in self.etapas:
+            visitar(nombre)
+        return orden
+
+    def _cargar_estado(self):
+        if self.path_estado and os.path.exists(self.path_estado):
+            with open(self.path_estado, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _guardar_estado(self):
+        if not self.path_estado:
+            return
+        os.makedirs(os.path.dirname(self.path_estado) or ".", exist_ok=True)
+        tmp_path = self.path_estado + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.estado, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path_estado)
+
+    def con_dependencias(self, nombres):
+        """Devuelve las etapas pedidas más todas las que necesitan, en orden de ejecución."""
+        desconocidas = set(nombres) - set(self.etapas)
+        if desconocidas:
+            raise ValueError(
+                f"Etapas desconocidas: {sorted(desconocidas)}. Disponibles: {self.orden}."
+            )
+        necesarias, pendientes = set(), list(nombres)
+        while pendientes:
+            nombre = pendientes.pop()
+            if nombre not in necesarias:
+                necesarias.add(nombre)
+                pendientes.extend(self.dependencias[nombre])
+        return [nombre for nombre in self.orden if nombre in necesarias]
+
+    def firma(self, etapa):
+        """
+        Firma de la etapa: hash de sus entradas, sus parámetros, su código (la función y
+        los módulos que usa) y las versiones de sus dependencias externas.
+        """
+        try:
+            codigo = inspect.getsource(etapa.funcion)
+        except (OSError, TypeError):
+            codigo = getattr(etapa.funcion, "__qualname__", repr(etapa.funcion))
+        contenido = {
+            "entradas": {e: hash_ruta(e) for e in etapa.entradas},
+            "parametros": etapa.parametros,
+            "codigo": _hash_texto(codigo),
+            "modulos": {m: hash_archivo(_modulo(m).__file__) for m in etapa.modulos},
+            "versiones": etapa.versiones,
+        }
+        return _hash_texto(json.dumps(contenido, sort_keys=True, default=str))
+
+    def al_dia(self, etapa, firma):
+        """
+        True si la última ejecución registrada tiene la misma firma y sus salidas no cambiaron.
+        Una salida con la misma huella (tamaño y fecha) que la registrada no se vuelve a
+        hashear; si la huella cambió, se compara el hash de su contenido.
+        """
+        registro = self.estado.get(etapa.nombre)
+        if not registro or registro.get("firma") != firma:
+            return False
+        salidas = registro.get("salidas", {})
+        huellas = registro.get("huellas", {})
+        for salida in etapa.salidas:
+            if salidas.get(salida) is None:
+                return False
+            huella = huella_ruta(salida)
+            if huella is None:
+                return False
+            if huella != huellas.get(salida) and hash_ruta(salida) != salidas[salida]:
+                return False
+        return True
+
+    def _ejecutar_etapa(self, nombre, config, forzar):
+        etapa = self.etapas[nombre]
+        inicio = time.perf_counter()
+        faltantes = [e for e in etapa.entradas if not os.path.exists(e)]
+        if faltantes:
+            raise FileNotFoundError(f"La etapa {nombre} necesita {faltantes}.")
+        firma = self.firma(etapa)
+        if not forzar and self.al_dia(etapa, firma):
+            return {
+                "etapa": nombre,
+                "estado": "omitida",
+                "segundos": time.perf_counter() - inicio,
+            }, None
+        with _modulo("metricas").get_metricas().etapa(nombre):
+            resumen = etapa.funcion(config)
+        salidas = {salida: hash_ruta(salida) for salida in etapa.salidas}
+        sin_generar = [salida for salida, h in salidas.items() if h is None]
+        if sin_generar:
+            raise RuntimeError(f"La etapa {nombre} no generó {sin_generar}.")
+        segundos = time.perf_counter() - inicio
+        registro = {
+            "firma": firma,
+            "salidas": salidas,
+            "huellas": {salida: huella_ruta(salida) for salida in etapa.salidas},
+            "segundos": round(segundos, 3),
+        }
+        resultado = {"etapa": nombre, "estado": "ejecutada", "segundos": segundos}
+        if resumen is not None:
+            resultado["resumen"] = resumen
+        return resultado, registro
+
+    def ejecutar(
+        self,
+        config=None,
+        etapas=None,
+        forzar=(),
+        paralelo=True,
+        max_hilos=None,
+        informar=print,
+    ):
+        """
+        Ejecuta las etapas pedidas (todas por defecto) y las que necesitan. Una etapa se
+        lanza en cuanto terminan sus dependencias, por lo que las ramas independientes
+        corren a la vez (paralelo=False las ejecuta de una en una). forzar es una lista de
+        etapas a ejecutar aunque estén al día, o True para todas.
+        Retorna la lista de resultados (etapa, estado 'ejecutada'/'omitida', segundos).
+        Si una etapa falla no se lanzan más, se guarda el estado de las completadas y se
+        propaga la excepción.
+        """
+        objetivo = self.con_dependencias(etapas) if etapas else list(self.orden)
+        forzadas = set(objetivo) if forzar is True else set(forzar or ())
+        pendientes = {n: set(self.dependencias[n]) & set(objetivo) for n in objetivo}
+        resultados, error = [], None
+        hilos = (max_hilos or len(objetivo) or 1) if paralelo else 1
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            en_curso = {}
+            while pendientes or en_curso:
+                if error is None:
+                    for nombre in [n for n in objetivo if pendientes.get(n) == set()]:
+                        del pendientes[nombre]
+                        futuro = ejecutor.submit(
+                            self._ejecutar_etapa, nombre, config, nombre in forzadas
+                        )
+                        en_curso[futuro] = nombre
+                if not en_curso:
+                    break
+                terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        resultado, registro = futuro.result()
+                    except Exception as e:
+                        informar(f"[{nombre}] error: {e}")
+                        error = error or e
+                        continue
+                    if registro is not None:
+                        self.estado[nombre] = registro
+                        self._guardar_estado()
+                    resultados.append(resultado)
+                    informar(_linea_resultado(resultado))
+                    for dependencias in pendientes.values():
+                        dependencias.discard(nombre)
+        if error is not None:
+            raise error
+        return resultados
+
+
+def _linea_resultado(resultado):
+    if resultado["estado"] == "omitida":
+        return f"[{resultado['etapa']}] sin cambios, omitida ({resultado['segundos']:.2f} s)"
+    linea = f"[{resultado['etapa']}] ejecutada en {resultado['segundos']:.2f} s"
+    if "resumen" in resultado:
+        linea += f" {resultado['resumen']}"
+    return linea
+
+
+def formatear_tiempos(resultados, total=None):
+    """Tabla de tiempos por etapa (y total de pared si se da) para imprimir al final."""
+    ancho = max([len(r["etapa"]) for r in resultados] + [5])
+    lineas = [f"{'Etapa':<{ancho}}  {'Estado':<9}  Segundos"]
+    for r in resultados:
+        lineas.append(f"{r['etapa']:<{ancho}}  {r['estado']:<9}  {r['segundos']:8.2f}")
+    if total is not None:
+        lineas.append(f"{'Total':<{ancho}}  {'':<9}  {total:8.2f}")
+    return "\n".join(lineas)
+
+
+# =========================
+# Etapas del flujo de recomendación
+# =========================
+def _etapa_tags_cursos(config):
+    data_preprocessing = _modulo("data_preprocessing")
+    tag_extraction = _modulo("tag_extraction")
+    df = data_preprocessing.cargar_datos_cursos(config["cursos_csv"])
+    if config["usar_ia"]:
+        df = _modulo("tag_ia_suggestion").sugerir_tags_df(
+            df, concurrencia=config["concurrencia_llm"]
+        )
+    df = tag_extraction.extraer_tags_cursos_df(df)
+    tag_extraction.guardar_tags_cursos_csv(df, config["cursos_tags_csv"])
+    return {"cursos": len(df)}
+
+
+def _etapa_tags_estudiantes(config):
+    data_preprocessing = _modulo("data_preprocessing")
+    tag_extraction = _modulo("tag_extraction")
+    lotes = tag_extraction.extraer_tags_estudiantes_por_lotes(
+        data_preprocessing.iterar_datos_estudiantes(
+            config["estudiantes_csv"], tam_lote=config["tam_lote"]
+        )
+    )
+    filas = 0
+    for i, lote in enumerate(lotes):
+        tag_extraction.guardar_tags_estudiantes_csv(
+            lote, config["estudiantes_tags_csv"], agregar=i > 0
+        )
+        filas += len(lote)
+    return {"estudiantes": filas}
+
+
+def _actualizar_almacen(path_csv, path_almacen, tam_lote):
+    import pandas as pd
+
+    return _modulo("embeddings").actualizar_embeddings_por_lotes(
+        pd.read_csv(path_csv, chunksize=tam_lote), path_almacen
+    )
+
+
+def _etapa_embeddings_cursos(config):
+    return _actualizar_almacen(
+        config["cursos_tags_csv"], config["cursos_embeddings"], config["tam_lote"]
+    )
+
+
+def _etapa_embeddings_estudiantes(config):
+    return _actualizar_almacen(
+        config["estudiantes_tags_csv"],
+        config["estudiantes_embeddings"],
+        config["tam_lote"],
+    )
+
+
+def _almacenes(config):
+    embeddings = _modulo("embeddings")
+    return (
+        embeddings.cargar_almacen_embeddings(config["estudiantes_embeddings"]),
+        embeddings.cargar_almacen_embeddings(config["cursos_embeddings"]),
+    )
+
+
+def _etapa_afinidad(config):
+    df_estudiantes, df_cursos = _almacenes(config)
+    matriz = _modulo("similarity").calcular_matriz_afinidad(
+        df_estudiantes, df_cursos, path_memmap=config["afinidad_npy"]
+    )
+    # Los valores ya están en el .npy: el .npz guarda los IDs y una referencia a él
+    _modulo("recommender").guardar_matrices_iteracion(
+        matriz,
+        matriz,
+        iteracion=config["iteracion"],
+        ruta_salida=config["salida"],
+        path_npy=config["afinidad_npy"],
+    )
+    return {"forma": list(matriz.shape)}
+
+
+def _etapa_recomendaciones(config):
+    df_estudiantes, df_cursos = _almacenes(config)
+    estudiantes = _modulo("similarity").guardar_top_k_afinidad_csv(
+        df_estudiantes, df_cursos, config["recomendaciones_csv"], k=config["top_k"]
+    )
+    return {"estudiantes": estudiantes}
+
+
+def configuracion(
+    data_path="data",
+    salida="experimentos",
+    iteracion=1,
+    top_k=3,
+    usar_ia=True,
+    concurrencia_llm=1,
+    tam_lote=TAM_LOTE,
+    afinidad_densa=False,
+):
+    """
+    Rutas y parámetros del flujo a partir de las carpetas de datos y de salida.
+    afinidad_densa agrega la etapa que guarda la matriz densa estudiantes x cursos; por
+    defecto solo se guarda el top-k de cada estudiante (etapa recomendaciones).
+    """
+    return {
+        "data_path": data_path,
+        "salida": salida,
+        "cursos_csv": os.path.join(data_path, "courses.csv"),
+        "estudiantes_csv": os.path.join(data_path, "students.csv"),
+        "cursos_tags_csv": os.path.join(data_path, "courses_with_tags.csv"),
+        "estudiantes_tags_csv": os.path.join(data_path, "students_with_tags.csv"),
+        "cursos_embeddings": os.path.join(data_path, "courses_tags_embeddings"),
+        "estudiantes_embeddings": os.path.join(data_path, "students_tags_embeddings"),
+        "cache_lemas": os.path.join(data_path, "cache_lemas.pkl"),
+        "cache_embeddings_tags": os.path.join(data_path, "tags_embeddings_cache.pkl"),
+        "cache_llm": os.path.join(data_path, "cache_llm"),
+        "tags_predefinidos": os.path.join(data_path, "predefined_tags.py"),
+        "afinidad_npy": os.path.join(salida, f"afinidad_iter_{iteracion}.npy"),
+        "iteracion_npz": os.path.join(salida, f"iteracion_{iteracion}.npz"),
+        "recomendaciones_csv": os.path.join(
+            salida, f"recomendaciones_iter_{iteracion}.csv"
+        ),
+        "estado": os.path.join(salida, ESTADO_NOMBRE),
+        "iteracion": iteracion,
+        "top_k": top_k,
+        "usar_ia": usar_ia,
+        "concurrencia_llm": concurrencia_llm,
+        "tam_lote": tam_lote,
+        "afinidad_densa": afinidad_densa,
+    }
+
+
+def definir_etapas(config):
+    """
+    Etapas del flujo de recomendación con las rutas de config. La etapa afinidad (matriz
+    densa) solo se incluye con config["afinidad_densa"].
+    """
+    recursos = _modulo("recursos")
+    modelo = recursos.MODEL_LOCAL_PATH
+    spacy = {"spacy": recursos.version_spacy(), "modelo_spacy": recursos.MODELO_SPACY}
+    modulos_tags = ["data_preprocessing", "tag_extraction", "recursos"]
+    modulos_afinidad = ["similarity", "recommender", "embeddings"]
+    etapas = [
+        Etapa(
+            "tags_cursos",
+            _etapa_tags_cursos,
+            entradas=[config["cursos_csv"], config["tags_predefinidos"]],
+            salidas=[config["cursos_tags_csv"]],
+            parametros={"usar_ia": config["usar_ia"]},
+            modulos=modulos_tags + ["tag_ia_suggestion"],
+            versiones=spacy,
+        ),
+        Etapa(
+            "tags_estudiantes",
+            _etapa_tags_estudiantes,
+            entradas=[config["estudiantes_csv"], config["tags_predefinidos"]],
+            salidas=[config["estudiantes_tags_csv"]],
+            modulos=modulos_tags,
+            versiones=spacy,
+        ),
+        Etapa(
+            "embeddings_cursos",
+            _etapa_embeddings_cursos,
+            entradas=[config["cursos_tags_csv"]],
+            salidas=[config["cursos_embeddings"]],
+            parametros={"modelo": modelo},
+            modulos=["embeddings"],
+        ),
+        Etapa(
+            "embeddings_estudiantes",
+            _etapa_embeddings_estudiantes,
+            entradas=[config["estudiantes_tags_csv"]],
+            salidas=[config["estudiantes_embeddings"]],
+            parametros={"modelo": modelo},
+            modulos=["embeddings"],
+        ),
+        Etapa(
+            "recomendaciones",
+            _etapa_recomendaciones,
+            entradas=[config["estudiantes_embeddings"], config["cursos_embeddings"]],
+            salidas=[config["recomendaciones_csv"]],
+            parametros={"top_k": config["top_k"]},
+            modulos=modulos_afinidad,
+        ),
+    ]
+    if config.get("afinidad_densa"):
+        etapas.append(
+            Etapa(
+                "afinidad",
+                _etapa_afinidad,
+                entradas=[
+                    config["estudiantes_embeddings"],
+                    config["cursos_embeddings"],
+                ],
+                salidas=[config["afinidad_npy"], config["iteracion_npz"]],
+                modulos=modulos_afinidad,
+            )
+        )
+    return etapas
+
+
+def ejecutar_pipeline(
+    config,
+    etapas=None,
+    forzar=(),
+    paralelo=True,
+    path_metricas=None,
+    carpeta_perfiles=None,
+):
+    """
+    Ejecuta el flujo de recomendación con config (ver configuracion) e imprime los
+    tiempos por etapa y las estadísticas de las cachés. Retorna los resultados.
+    path_metricas: archivo donde volcar las métricas (.prom en formato Prometheus,
+    cualquier otro en JSON). carpeta_perfiles: perfila cada etapa con cProfile y
+    guarda ahí un <etapa>.prof por etapa ejecutada.
+    """
+    tag_extraction = _modulo("tag_extraction")
+    embeddings = _modulo("embeddings")
+    metricas = _modulo("metricas").get_metricas()
+    metricas.activar_perfilado(carpeta_perfiles is not None)
+    # Cachés compartidas por las dos ramas: se crean antes de lanzar los hilos
+    cache_lemas = tag_extraction.configurar_cache_lemas(config["cache_lemas"])
+    embeddings.configurar_cache_embeddings_tags(config["cache_embeddings_tags"])
+    cache_embeddings = embeddings.get_cache_embeddings_tags()
+    if config["usar_ia"]:
+        _modulo("tag_ia_suggestion").configurar_cache_respuestas_llm(
+            config["cache_llm"]
+        )
+    pipeline = Pipeline(definir_etapas(config), config["estado"])
+    inicio = time.perf_counter()
+    resultados = pipeline.ejecutar(
+        config, etapas=etapas, forzar=forzar, paralelo=paralelo
+    )
+    print()
+    print(formatear_tiempos(resultados, time.perf_counter() - inicio))
+    if any(r["estado"] == "ejecutada" for r in resultados):
+        cache_lemas.guardar()
+        print(f"Caché de lemas: {cache_lemas.estadisticas()}")
+        print(f"Caché de embeddings de tags: {cache_embeddings.estadisticas()}")
+        if config["usar_ia"]:
+            print(
+                "Caché de respuestas del LLM: "
+                f"{_modulo('tag_ia_suggestion').get_cache_respuestas_llm().estadisticas()}"
+            )
+    if carpeta_perfiles is not None:
+        for path in metricas.guardar_perfiles(carpeta_perfiles):
+            print(f"Perfil guardado: {path}")
+    if path_metricas:
+        if path_metricas.endswith(".prom"):
+            with open(path_metricas, "w", encoding="utf-8") as f:
+                f.write(metricas.a_prometheus())
+        else:
+            metricas.a_json(path_metricas)
+        print(f"Métricas guardadas: {path_metricas}")
+    return resultados
+
+
+def mostrar_recomendaciones(config, estudiante_id):
+    """Imprime el top-k guardado por la etapa de recomendaciones para un estudiante."""
+    import pandas as pd
+
+    df = pd.read_csv(config["recomendaciones_csv"])
+    filas = df[df["EstudianteID"] == estudiante_id]
+    print(
+        f"\nTop {config['top_k']} cursos recomendados para el estudiante {estudiante_id}:"
+    )
+    for curso_id, score in zip(filas["CursoID"], filas["Similitud"]):
+        print(f"CursoID: {curso_id} | Score: {score:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ejecuta el flujo de recomendación omitiendo las etapas sin cambios."
+    )
+    parser.add_argument("--data", default="data", help="Carpeta de datos")
+    parser.add_argument(
+        "--salida", default="experimentos", help="Carpeta de resultados"
+    )
+    parser.add_argument("--iteracion", type=int, default=1)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument(
+        "--etapas", nargs="+", help="Ejecutar solo estas etapas (y las que necesitan)"
+    )
+    parser.add_argument(
+        "--forzar", nargs="*", help="Ejecutar aunque estén al día (sin nombres: todas)"
+    )
+    parser.add_argument(
+        "--secuencial", action="store_true", help="No ejecutar ramas en paralelo"
+    )
+    parser.add_argument(
+        "--sin-ia", action="store_true", help="No sugerir tags con el LLM"
+    )
+    parser.add_argument("--concurrencia-llm", type=int, default=1)
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE)
+    parser.add_argument(
+        "--afinidad-densa",
+        action="store_true",
+        help="Guardar también la matriz densa estudiantes x cursos",
+    )
+    parser.add_argument(
+        "--estudiante", type=int, help="Mostrar al final el top-k de este estudiante"
+    )
+    parser.add_argument(
+        "--listar", action="store_true", help="Mostrar las etapas y sus dependencias"
+    )
+    parser.add_argument(
+        "--metricas", help="Volcar las métricas a este archivo (.json o .prom)"
+    )
+    parser.add_argument(
+        "--perfilar", metavar="CARPETA", help="Guardar un perfil cProfile por etapa"
+    )
+    args = parser.parse_args(argv)
+
+    config = configuracion(
+        data_path=args.data,
+        salida=args.salida,
+        iteracion=args.iteracion,
+        top_k=args.top_k,
+        usar_ia=not args.sin_ia,
+        concurrencia_llm=args.concurrencia_llm,
+        tam_lote=args.tam_lote,
+        afinidad_densa=args.afinidad_densa,
+    )
+    if args.listar:
+        pipeline = Pipeline(definir_etapas(config), None)
+        for nombre in pipeline.orden:
+            dependencias = ", ".join(sorted(pipeline.dependencias[nombre])) or "-"
+            print(f"{nombre}: {dependencias}")
+        return 0
+    forzar = True if args.forzar == [] else (args.forzar or ())
+    ejecutar_pipeline(
+        config,
+        etapas=args.etapas,
+        forzar=forzar,
+        paralelo=not args.secuencial,
+        path_metricas=args.metricas,
+        carpeta_perfiles=args.perfilar,
+    )
+    if args.estudiante is not None and os.path.exists(config["recomendaciones_csv"]):
+        mostrar_recomendaciones(config, args.estudiante)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
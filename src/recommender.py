@@ -1,29 +1,129 @@
 # Lógica principal del sistema de recomendación
+import numpy as np
 import pandas as pd
 
 
+# =========================
+# Motor de ranking vectorizado
+# =========================
+def normalizar_filas(matriz, dtype=np.float32):
+    """
+    Devuelve una copia de la matriz con cada fila de norma 1 (las filas nulas quedan en cero).
+    Con filas normalizadas, la similitud coseno es un simple producto matricial.
+    """
+    matriz = np.array(matriz, dtype=dtype, ndmin=2)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    matriz /= normas
+    return matriz
+
+
+def top_k_filas(puntuaciones, k):
+    """
+    Devuelve (posiciones, valores) de los k mayores valores de cada fila, de mayor a menor.
+    Usa argpartition y solo ordena los k elegidos; a igual valor va primero la menor posición.
+    """
+    puntuaciones = np.atleast_2d(puntuaciones)
+    n_filas, n_cols = puntuaciones.shape
+    k = max(0, min(k, n_cols))
+    if k == 0:
+        return (
+            np.empty((n_filas, 0), dtype=np.int64),
+            np.empty((n_filas, 0), dtype=puntuaciones.dtype),
+        )
+    if k < n_cols:
+        candidatos = np.argpartition(-puntuaciones, k - 1, axis=1)[:, :k]
+    else:
+        candidatos = np.broadcast_to(np.arange(n_cols), (n_filas, n_cols))
+    valores = np.take_along_axis(puntuaciones, candidatos, axis=1)
+    orden = np.lexsort((candidatos, -valores), axis=1)
+    posiciones = np.take_along_axis(candidatos, orden, axis=1)
+    return posiciones, np.take_along_axis(valores, orden, axis=1)
+
+
+class MotorRanking:
+    """
+    Ranking top-k de cursos por similitud coseno.
+    Guarda la matriz de cursos ya normalizada y puntúa bloques de estudiantes
+    con un único producto matricial por bloque.
+    """
+
+    def __init__(self, emb_cursos, ids_cursos, dtype=np.float32):
+        self.dtype = dtype
+        self.cursos = normalizar_filas(emb_cursos, dtype=dtype)
+        self.ids_cursos = np.asarray(ids_cursos)
+
+    def puntuar(self, emb_estudiantes, normalizados=False):
+        """
+        Devuelve la matriz de similitud (estudiantes x cursos) de los embeddings dados.
+        """
+        X = (
+            np.asarray(emb_estudiantes, dtype=self.dtype)
+            if normalizados
+            else normalizar_filas(emb_estudiantes, dtype=self.dtype)
+        )
+        return X @ self.cursos.T
+
+    def top_k(self, emb_estudiantes, k=3, tam_bloque=1024, normalizados=False):
+        """
+        Devuelve (ids, puntuaciones), ambos de forma (n_estudiantes, k), con los k cursos
+        más similares a cada estudiante ordenados de mayor a menor similitud.
+        """
+        emb_estudiantes = np.atleast_2d(emb_estudiantes)
+        n = emb_estudiantes.shape[0]
+        k = max(0, min(k, len(self.ids_cursos)))
+        ids = np.empty((n, k), dtype=self.ids_cursos.dtype)
+        puntuaciones = np.empty((n, k), dtype=self.dtype)
+        for inicio in range(0, n, tam_bloque):
+            fin = min(inicio + tam_bloque, n)
+            bloque = self.puntuar(emb_estudiantes[inicio:fin], normalizados)
+            posiciones, valores = top_k_filas(bloque, k)
+            ids[inicio:fin] = self.ids_cursos[posiciones]
+            puntuaciones[inicio:fin] = valores
+        return ids, puntuaciones
+
+
+def ranking_top_k(emb_estudiantes, emb_cursos, ids_cursos, k=3, tam_bloque=1024):
+    """
+    Atajo para calcular los top-k cursos de cada estudiante a partir de los embeddings.
+    Devuelve (ids, puntuaciones) con forma (n_estudiantes, k).
+    """
+    motor = MotorRanking(emb_cursos, ids_cursos)
+    return motor.top_k(emb_estudiantes, k=k, tam_bloque=tam_bloque)
+
+
+# =========================
+# Recomendaciones a partir de la matriz de afinidad
+# =========================
 def recomendar_cursos_para_estudiante(estudiante_id, matriz_afinidad, top_n=3):
     """
     Dado un EstudianteID y la matriz de afinidad, retorna los top_n cursos recomendados (CursoID y score).
     """
-    if estudiante_id not in matriz_afinidad.index:
+    fila = matriz_afinidad.index.get_indexer([estudiante_id])[0]
+    if fila < 0:
         raise ValueError(
             f"EstudianteID {estudiante_id} no encontrado en la matriz de afinidad."
         )
-    afinidades = matriz_afinidad.loc[estudiante_id]
-    recomendaciones = afinidades.sort_values(ascending=False).head(top_n)
-    return list(zip(recomendaciones.index, recomendaciones.values))
+    posiciones, valores = top_k_filas(matriz_afinidad.values[fila], top_n)
+    return list(zip(matriz_afinidad.columns.values[posiciones[0]], valores[0]))
 
 
-def recomendar_cursos_todos_los_estudiantes(matriz_afinidad, top_n=3):
+def recomendar_cursos_todos_los_estudiantes(matriz_afinidad, top_n=3, tam_bloque=1024):
     """
     Retorna un diccionario {EstudianteID: [(CursoID, score), ...]} con los top_n cursos recomendados para cada estudiante.
     """
     recomendaciones = {}
-    for estudiante_id in matriz_afinidad.index:
-        recomendaciones[estudiante_id] = recomendar_cursos_para_estudiante(
-            estudiante_id, matriz_afinidad, top_n
+    valores_matriz = matriz_afinidad.values
+    ids_cursos = matriz_afinidad.columns.values
+    ids_estudiantes = matriz_afinidad.index.values
+    for inicio in range(0, len(ids_estudiantes), tam_bloque):
+        posiciones, valores = top_k_filas(
+            valores_matriz[inicio : inicio + tam_bloque], top_n
         )
+        for estudiante_id, pos, val in zip(
+            ids_estudiantes[inicio : inicio + tam_bloque], posiciones, valores
+        ):
+            recomendaciones[estudiante_id] = list(zip(ids_cursos[pos], val))
     return recomendaciones
 
 
@@ -32,23 +132,159 @@ def ranking_top_cursos_por_similitud(df_similitud, top_n=3):
     Recibe un DataFrame con columnas ['CursoID', 'Similitud'] y retorna los top_n cursos recomendados,
     ordenados de mayor a menor similitud. Devuelve una lista de tuplas (CursoID, Similitud).
     """
-    top = df_similitud.sort_values("Similitud", ascending=False).head(top_n)
-    return list(zip(top["CursoID"], top["Similitud"]))
+    posiciones, valores = top_k_filas(df_similitud["Similitud"].values, top_n)
+    return list(zip(df_similitud["CursoID"].values[posiciones[0]], valores[0]))
+
+
+# =========================
+# Artefactos de iteración
+# =========================
+def _mismas_matrices(a, b):
+    """
+    True si dos matrices de afinidad (DataFrames) tienen los mismos IDs y valores.
+    """
+    if a is b:
+        return True
+    return (
+        a.shape == b.shape
+        and np.array_equal(a.index.values, b.index.values)
+        and np.array_equal(a.columns.values, b.columns.values)
+        and np.array_equal(a.values, b.values)
+    )
 
 
 def guardar_matrices_iteracion(
-    matriz_preferencias, matriz_similitud, iteracion, ruta_salida="experimentos"
+    matriz_preferencias,
+    matriz_similitud,
+    iteracion,
+    ruta_salida="experimentos",
+    exportar_csv=False,
+    path_npy=None,
 ):
     """
-    Guarda la matriz de preferencias y la matriz de similitud coseno en archivos CSV para una iteración dada.
-    Los archivos se nombran como preferencias_iter_{iteracion}.csv y similitud_iter_{iteracion}.csv
-    Se guardan en la carpeta 'experimentos' por defecto.
+    Guarda la matriz de preferencias y la matriz de similitud coseno de una iteración
+    en un único archivo binario comprimido iteracion_{iteracion}.npz dentro de ruta_salida.
+    Los IDs de filas y columnas se guardan una sola vez y, si ambas matrices son idénticas,
+    la de similitud no se duplica.
+    Si los valores de preferencias ya están en un .npy (path_npy, p. ej. el volcado por
+    bloques de la afinidad), el .npz guarda solo su ruta relativa en lugar de copiarlos.
+    Con exportar_csv=True también se escriben preferencias_iter_{iteracion}.csv y
+    similitud_iter_{iteracion}.csv como antes.
+    Retorna la ruta del .npz.
     """
     import os
 
     os.makedirs(ruta_salida, exist_ok=True)
-    preferencias_path = f"{ruta_salida}/preferencias_iter_{iteracion}.csv"
-    similitud_path = f"{ruta_salida}/similitud_iter_{iteracion}.csv"
-    matriz_preferencias.to_csv(preferencias_path)
-    matriz_similitud.to_csv(similitud_path)
-    print(f"Matrices guardadas: {preferencias_path}, {similitud_path}")
+    path = os.path.join(ruta_salida, f"iteracion_{iteracion}.npz")
+    arrays = {
+        "ids_filas": np.asarray(matriz_preferencias.index.values),
+        "ids_columnas": np.asarray(matriz_preferencias.columns.values),
+    }
+    if path_npy is None:
+        arrays["preferencias"] = matriz_preferencias.values
+    else:
+        arrays["preferencias_npy"] = np.array(os.path.relpath(path_npy, ruta_salida))
+    if not _mismas_matrices(matriz_preferencias, matriz_similitud):
+        arrays["similitud"] = matriz_similitud.values
+        if not (
+            np.array_equal(matriz_similitud.index.values, arrays["ids_filas"])
+            and np.array_equal(matriz_similitud.columns.values, arrays["ids_columnas"])
+        ):
+            arrays["similitud_ids_filas"] = np.asarray(matriz_similitud.index.values)
+            arrays["similitud_ids_columnas"] = np.asarray(
+                matriz_similitud.columns.values
+            )
+    # Se escribe a un temporal y se renombra: un lector nunca ve un archivo a medias
+    temporal = path + ".tmp.npz"
+    np.savez_compressed(temporal, **arrays)
+    os.replace(temporal, path)
+    print(f"Matrices guardadas: {path}")
+    if exportar_csv:
+        preferencias_path = f"{ruta_salida}/preferencias_iter_{iteracion}.csv"
+        similitud_path = f"{ruta_salida}/similitud_iter_{iteracion}.csv"
+        matriz_preferencias.to_csv(preferencias_path)
+        matriz_similitud.to_csv(similitud_path)
+        print(f"Matrices exportadas: {preferencias_path}, {similitud_path}")
+    return path
+
+
+class IteracionExperimento:
+    """
+    Artefactos de una iteración abiertos de forma perezosa: cada matriz se descomprime
+    solo la primera vez que se pide (o, si el .npz referencia un .npy, se abre como
+    memmap de solo lectura). Se puede usar como gestor de contexto.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._npz = np.load(path, allow_pickle=False)
+        self._matrices = {}
+
+    def _ids(self, nombre):
+        prefijo = f"{nombre}_" if f"{nombre}_ids_filas" in self._npz.files else ""
+        return self._npz[f"{prefijo}ids_filas"], self._npz[f"{prefijo}ids_columnas"]
+
+    def _tiene(self, nombre):
+        return nombre in self._npz.files or f"{nombre}_npy" in self._npz.files
+
+    def _valores(self, clave):
+        if f"{clave}_npy" in self._npz.files:
+            import os
+
+            relativa = str(self._npz[f"{clave}_npy"])
+            path = os.path.join(os.path.dirname(self.path), relativa)
+            return np.load(path, mmap_mode="r")
+        return self._npz[clave]
+
+    def _matriz(self, nombre):
+        if nombre not in self._matrices:
+            clave = nombre if self._tiene(nombre) else "preferencias"
+            ids_filas, ids_columnas = self._ids(clave)
+            self._matrices[nombre] = pd.DataFrame(
+                self._valores(clave),
+                index=pd.Index(ids_filas, name="EstudianteID"),
+                columns=pd.Index(ids_columnas, name="CursoID"),
+                copy=False,
+            )
+        return self._matrices[nombre]
+
+    @property
+    def preferencias(self):
+        return self._matriz("preferencias")
+
+    @property
+    def similitud(self):
+        return self._matriz("similitud")
+
+    @property
+    def matrices_identicas(self):
+        return not self._tiene("similitud")
+
+    def exportar_csv(self, ruta_salida, iteracion):
+        """
+        Escribe las dos matrices en el formato CSV anterior.
+        """
+        self.preferencias.to_csv(f"{ruta_salida}/preferencias_iter_{iteracion}.csv")
+        self.similitud.to_csv(f"{ruta_salida}/similitud_iter_{iteracion}.csv")
+
+    def close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cargar_matrices_iteracion(iteracion, ruta_salida="experimentos"):
+    """
+    Abre los artefactos guardados por guardar_matrices_iteracion para una iteración.
+    Retorna un IteracionExperimento; las matrices se leen al acceder a .preferencias o .similitud.
+    """
+    import os
+
+    path = os.path.join(ruta_salida, f"iteracion_{iteracion}.npz")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No hay artefactos para la iteración {iteracion}.")
+    return IteracionExperimento(path)
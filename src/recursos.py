@@ -0,0 +1,94 @@
+"""
+Recursos pesados compartidos por todos los módulos: modelo de spaCy, modelo
+SentenceTransformer y configuración de la API de OpenRouter.
+Se cargan de forma perezosa la primera vez que se usan, una sola vez por proceso.
+"""
+
+import os
+import sys
+import threading
+
+MODELO_SPACY = "es_core_news_sm"
+MODEL_LOCAL_PATH = os.path.join(
+    "data", "models", "distiluse-base-multilingual-cased-v1"
+)
+
+_recursos = {}
+_lock = threading.RLock()
+# Un Language de spaCy no es seguro entre hilos: quien lo use (ramas del pipeline en
+# paralelo, recalculaciones de la API) debe tomar este lock mientras procesa sus textos
+lock_nlp = threading.Lock()
+
+
+def _obtener(nombre, cargar):
+    """
+    Devuelve el recurso ya cargado o lo carga (una sola vez, aunque lo pidan varios hilos).
+    """
+    if nombre not in _recursos:
+        with _lock:
+            if nombre not in _recursos:
+                _recursos[nombre] = cargar()
+    return _recursos[nombre]
+
+
+def get_nlp():
+    """
+    Devuelve el pipeline de spaCy en español (se comparte: usarlo con lock_nlp tomado).
+    """
+
+    def cargar():
+        import spacy
+
+        return spacy.load(MODELO_SPACY)
+
+    return _obtener("nlp", cargar)
+
+
+def version_spacy():
+    """
+    Versión instalada de spaCy, sin importar el paquete.
+    """
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        return version("spacy")
+    except PackageNotFoundError:
+        return None
+
+
+def get_sentence_transformer_model(path=MODEL_LOCAL_PATH):
+    """
+    Devuelve el modelo SentenceTransformer guardado en la carpeta local path.
+    """
+
+    def cargar():
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(path)
+
+    return _obtener(("sentence_transformer", path), cargar)
+
+
+def get_config_openrouter():
+    """
+    Devuelve la configuración de OpenRouter, leyendo el archivo .env la primera vez.
+    """
+
+    def cargar():
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        return {"api_key": os.getenv("OPENROUTER_API_KEY")}
+
+    return _obtener("openrouter", cargar)
+
+
+def agregar_raiz_al_path():
+    """
+    Asegura que la raíz del repositorio esté en sys.path para poder importar 'src.*'
+    (por ejemplo desde la app de Streamlit, que solo agrega la carpeta app/).
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if raiz not in sys.path:
+        sys.path.insert(0, raiz)
+    return raiz
@@ -1,40 +1,175 @@
 # Cálculo de similitud y ranking
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+
 import numpy as np
 import pandas as pd
 
+try:
+    from src.recommender import MotorRanking, normalizar_filas, top_k_filas
+except ModuleNotFoundError:
+    from recommender import MotorRanking, normalizar_filas, top_k_filas
+
+
+def cosine_similarity(X, Y):
+    """
+    Similitud coseno de scikit-learn, importada solo cuando se necesita (su import es lento).
+    """
+    from sklearn.metrics.pairwise import cosine_similarity as _cosine_similarity
+
+    return _cosine_similarity(X, Y)
+
 
 def calcular_similitud(embedding1, embedding2):
     return cosine_similarity([embedding1], [embedding2])[0][0]
 
 
-def calcular_matriz_afinidad(df_estudiantes, df_cursos):
+def _ids_y_matriz(datos, id_col):
+    """
+    Devuelve (ids, matriz de embeddings) de un DataFrame con 'Tags_Embedding'
+    o de un AlmacenEmbeddings (en ese caso la matriz es el memmap, sin copia).
+    """
+    if hasattr(datos, "matriz"):
+        return np.asarray(datos.ids), datos.matriz
+    return datos[id_col].values, np.stack(datos["Tags_Embedding"].values)
+
+
+def calcular_matriz_afinidad(
+    df_estudiantes, df_cursos, path_memmap=None, tam_bloque=4096
+):
     """
     Calcula la matriz de afinidad entre estudiantes y cursos usando la similitud coseno entre embeddings.
+    Acepta DataFrames con 'Tags_Embedding' o almacenes de embeddings.
     Retorna un DataFrame donde filas=EstudianteID, columnas=CursoID, valores=similitud.
+    Si se indica path_memmap, la matriz se calcula por bloques en float32 y se vuelca a un
+    archivo .npy en disco; el DataFrame queda respaldado por ese memmap sin cargarlo en memoria.
     """
     # Extraer embeddings
-    X = np.stack(df_estudiantes["Tags_Embedding"].values)
-    Y = np.stack(df_cursos["Tags_Embedding"].values)
-    matriz = cosine_similarity(X, Y)
+    ids_est, X = _ids_y_matriz(df_estudiantes, "EstudianteID")
+    ids_cursos, Y = _ids_y_matriz(df_cursos, "CursoID")
+    if path_memmap is None:
+        matriz = cosine_similarity(X, Y)
+    else:
+        matriz = _volcar_memmap(ids_est, X, ids_cursos, Y, path_memmap, tam_bloque)
     return pd.DataFrame(
-        matriz, index=df_estudiantes["EstudianteID"], columns=df_cursos["CursoID"]
+        matriz,
+        index=pd.Index(ids_est, name="EstudianteID"),
+        columns=pd.Index(ids_cursos, name="CursoID"),
+        copy=False,
+    )
+
+
+# =========================
+# Afinidad por bloques (memoria acotada)
+# =========================
+def iterar_afinidad_por_bloques(
+    df_estudiantes, df_cursos, tam_bloque=4096, dtype=np.float32
+):
+    """
+    Recorre la matriz de afinidad por bloques de estudiantes sin construirla entera.
+    Genera tuplas (ids_estudiantes, ids_cursos, bloque) donde bloque tiene forma
+    (len(ids_estudiantes), n_cursos); solo un bloque vive en memoria a la vez.
+    """
+    ids_est, X = _ids_y_matriz(df_estudiantes, "EstudianteID")
+    ids_cursos, Y = _ids_y_matriz(df_cursos, "CursoID")
+    return _bloques_afinidad(ids_est, X, ids_cursos, Y, tam_bloque, dtype)
+
+
+def _bloques_afinidad(ids_est, X, ids_cursos, Y, tam_bloque, dtype=np.float32):
+    """iterar_afinidad_por_bloques con los IDs y las matrices ya extraídos."""
+    motor = MotorRanking(Y, ids_cursos, dtype=dtype)
+    for inicio in range(0, len(ids_est), tam_bloque):
+        fin = min(inicio + tam_bloque, len(ids_est))
+        bloque = motor.puntuar(normalizar_filas(X[inicio:fin], dtype=dtype), True)
+        yield ids_est[inicio:fin], motor.ids_cursos, bloque
+
+
+def top_k_afinidad_por_bloques(
+    df_estudiantes, df_cursos, k=3, tam_bloque=4096, dtype=np.float32
+):
+    """
+    Versión en flujo del ranking: por cada bloque de estudiantes genera
+    (ids_estudiantes, ids_cursos_top, puntuaciones_top), ambos top de forma (n_bloque, k),
+    ordenados de mayor a menor similitud. Se descarta el resto del bloque.
+    """
+    for ids_est, ids_cursos, bloque in iterar_afinidad_por_bloques(
+        df_estudiantes, df_cursos, tam_bloque=tam_bloque, dtype=dtype
+    ):
+        posiciones, valores = top_k_filas(bloque, k)
+        yield ids_est, ids_cursos[posiciones], valores
+
+
+def guardar_top_k_afinidad_csv(df_estudiantes, df_cursos, path, k=3, tam_bloque=4096):
+    """
+    Escribe el top-k de cada estudiante en un CSV (EstudianteID, Rank, CursoID, Similitud)
+    bloque a bloque, de modo que la memoria no depende del número de estudiantes.
+    Retorna el número de estudiantes procesados.
+    """
+    total = 0
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write("EstudianteID,Rank,CursoID,Similitud\n")
+        for ids_est, ids_top, valores in top_k_afinidad_por_bloques(
+            df_estudiantes, df_cursos, k=k, tam_bloque=tam_bloque
+        ):
+            n, k_real = ids_top.shape
+            pd.DataFrame(
+                {
+                    "EstudianteID": np.repeat(ids_est, k_real),
+                    "Rank": np.tile(np.arange(1, k_real + 1), n),
+                    "CursoID": ids_top.ravel(),
+                    "Similitud": valores.ravel(),
+                }
+            ).to_csv(f, header=False, index=False)
+            total += n
+    return total
+
+
+def volcar_matriz_afinidad_memmap(df_estudiantes, df_cursos, path, tam_bloque=4096):
+    """
+    Calcula la matriz de afinidad completa por bloques y la escribe en un .npy (float32)
+    abierto como memmap. Retorna el memmap de solo lectura.
+    """
+    ids_est, X = _ids_y_matriz(df_estudiantes, "EstudianteID")
+    ids_cursos, Y = _ids_y_matriz(df_cursos, "CursoID")
+    return _volcar_memmap(ids_est, X, ids_cursos, Y, path, tam_bloque)
+
+
+def _volcar_memmap(ids_est, X, ids_cursos, Y, path, tam_bloque):
+    """volcar_matriz_afinidad_memmap con los IDs y las matrices ya extraídos."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    salida = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(len(ids_est), len(ids_cursos))
     )
+    inicio = 0
+    for ids_bloque, _, bloque in _bloques_afinidad(
+        ids_est, X, ids_cursos, Y, tam_bloque
+    ):
+        salida[inicio : inicio + len(ids_bloque)] = bloque
+        inicio += len(ids_bloque)
+    salida.flush()
+    del salida
+    return np.load(path, mmap_mode="r")
 
 
 def similitud_estudiante_con_todos_los_cursos(df_estudiantes, df_cursos, estudiante_id):
     """
     Calcula la similitud coseno entre un estudiante (por ID) y todos los cursos.
+    Acepta DataFrames con 'Tags_Embedding' o almacenes de embeddings.
     Retorna un DataFrame con las columnas: CursoID, Similitud.
     """
-    if estudiante_id not in df_estudiantes["EstudianteID"].values:
-        raise ValueError(f"EstudianteID {estudiante_id} no encontrado.")
-    emb_est = df_estudiantes[df_estudiantes["EstudianteID"] == estudiante_id][
-        "Tags_Embedding"
-    ].values[0]
-    emb_cursos = np.stack(df_cursos["Tags_Embedding"].values)
+    if hasattr(df_estudiantes, "matriz"):
+        if df_estudiantes.filas([estudiante_id])[0] < 0:
+            raise ValueError(f"EstudianteID {estudiante_id} no encontrado.")
+        emb_est = df_estudiantes.vector(estudiante_id)
+    else:
+        if estudiante_id not in df_estudiantes["EstudianteID"].values:
+            raise ValueError(f"EstudianteID {estudiante_id} no encontrado.")
+        emb_est = df_estudiantes[df_estudiantes["EstudianteID"] == estudiante_id][
+            "Tags_Embedding"
+        ].values[0]
+    ids_cursos, emb_cursos = _ids_y_matriz(df_cursos, "CursoID")
     sim = cosine_similarity([emb_est], emb_cursos)[0]
-    return pd.DataFrame({"CursoID": df_cursos["CursoID"], "Similitud": sim})
+    return pd.DataFrame({"CursoID": ids_cursos, "Similitud": sim})
 
 
 # ...otras funciones de ranking...
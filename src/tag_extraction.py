@@ -1,25 +1,57 @@
 # Extracción automática de tags usando NLP
-import spacy
 import pandas as pd
-import importlib.util
 import os
+import atexit
+import pickle
+import threading
+import time
+from collections import OrderedDict
 
-nlp = spacy.load("es_core_news_sm")
+try:
+    from src import recursos
+    from src.data_preprocessing import limpiar_texto
+    from src.metricas import get_metricas
+except ModuleNotFoundError:
+    import recursos
+    from data_preprocessing import limpiar_texto
+    from metricas import get_metricas
 
-# Importar limpiar_texto de data_preprocessing.py solo una vez
-data_preprocessing_path = os.path.join(
-    os.path.dirname(__file__), "data_preprocessing.py"
-)
-spec = importlib.util.spec_from_file_location(
-    "data_preprocessing", data_preprocessing_path
-)
-data_preprocessing = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(data_preprocessing)
-limpiar_texto = data_preprocessing.limpiar_texto
+MODELO_SPACY = recursos.MODELO_SPACY
+
+
+def get_nlp():
+    """
+    Devuelve el pipeline de spaCy compartido (se carga la primera vez que se usa).
+    """
+    return recursos.get_nlp()
+
+
+def __getattr__(nombre):
+    # Compatibilidad con el antiguo atributo de módulo 'nlp', ahora perezoso
+    if nombre == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+# Componentes del pipeline que no aportan a pos_, lemma_ ni is_stop
+COMPONENTES_INNECESARIOS = ("parser", "ner")
 
 
 def extraer_tags_spacy(texto):
-    doc = nlp(texto)
+    return procesar_textos_spacy([texto])[texto][0]
+
+
+def lematizar_texto(texto):
+    """
+    Lematiza un concepto completo (puede tener más de una palabra), usando la caché de lemas.
+    """
+    return procesar_textos_spacy([texto])[texto][1]
+
+
+def _tags_de_doc(doc):
+    """
+    Lemas únicos (ordenados) de los sustantivos y nombres propios que no son stopwords.
+    """
     return sorted(
         set(
             [
@@ -31,49 +63,236 @@ def extraer_tags_spacy(texto):
     )
 
 
+def _lema_de_doc(doc):
+    """
+    Lematiza un concepto completo (puede tener más de una palabra).
+    """
+    return " ".join([token.lemma_ for token in doc])
+
+
+def procesar_textos_spacy(textos, batch_size=256, n_process=1, cache=None):
+    """
+    Procesa en lote los textos únicos con nlp.pipe, sin los componentes que no se usan.
+    Los textos que ya están en la caché de lemas no pasan por spaCy. El pipeline de spaCy
+    es compartido, así que los hilos que lo usan a la vez se turnan (recursos.lock_nlp).
+    Devuelve un diccionario {texto: (tags, lema)} donde tags es lo que devolvería
+    extraer_tags_spacy(texto) y lema el texto completo lematizado.
+    """
+    if cache is None:
+        cache = get_cache_lemas()
+    resultados = {}
+    faltantes = []
+    for texto in dict.fromkeys(textos):
+        valor = cache.obtener(texto)
+        if valor is None:
+            faltantes.append(texto)
+        else:
+            resultados[texto] = valor
+    if faltantes:
+        nlp = get_nlp()
+        metricas = get_metricas()
+        with recursos.lock_nlp:
+            inicio = time.perf_counter()
+            deshabilitar = [c for c in COMPONENTES_INNECESARIOS if c in nlp.pipe_names]
+            docs = nlp.pipe(
+                faltantes,
+                batch_size=batch_size,
+                n_process=n_process,
+                disable=deshabilitar,
+            )
+            for texto, doc in zip(faltantes, docs):
+                valor = (tuple(_tags_de_doc(doc)), _lema_de_doc(doc))
+                cache.agregar(texto, valor)
+                resultados[texto] = valor
+            segundos = time.perf_counter() - inicio
+        metricas.incrementar("spacy_docs_total", len(faltantes))
+        metricas.observar("spacy_lote_segundos", segundos)
+        metricas.observar("spacy_doc_segundos", segundos / len(faltantes))
+    return {texto: (list(tags), lema) for texto, (tags, lema) in resultados.items()}
+
+
+# =========================
+# Caché de lematización
+# =========================
+class CacheLemas:
+    """
+    Caché LRU acotada {texto: (tags, lema)} compartida por todas las funciones de
+    extracción de tags. Opcionalmente se respalda en un archivo para sobrevivir entre ejecuciones.
+    La clave es el texto exacto que se lematiza: spaCy convierte los espacios de los extremos
+    en tokens, así que " redes " y "redes" no tienen por qué dar el mismo lema.
+    """
+
+    def __init__(self, max_entradas=50000, path=None):
+        self.max_entradas = max_entradas
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with get_metricas().medir_io("pickle", "lectura", path):
+                with open(path, "rb") as f:
+                    datos = pickle.load(f)
+            # Lemas de otro modelo o versión de spaCy no son reutilizables
+            if datos.get("modelo") == self._firma_modelo():
+                for clave, valor in datos.get("entradas", []):
+                    self.agregar(clave, valor)
+
+    @staticmethod
+    def _firma_modelo():
+        return f"{MODELO_SPACY}@{recursos.version_spacy()}"
+
+    def obtener(self, clave):
+        """
+        Devuelve el valor cacheado (y lo marca como usado recientemente) o None.
+        """
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def agregar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def guardar(self):
+        """
+        Guarda las entradas en disco (escritura atómica). No hace nada si no hay archivo.
+        """
+        if not self.path:
+            return None
+        with self._lock:
+            entradas = list(self._datos.items())
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with get_metricas().medir_io("pickle", "escritura", tmp_path):
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {"modelo": self._firma_modelo(), "entradas": entradas},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entradas": len(self._datos),
+            "tasa_aciertos": self.hits / consultas if consultas else 0.0,
+        }
+
+
+def get_cache_lemas():
+    """
+    Devuelve la caché global de lemas (solo en memoria hasta que se configure un archivo).
+    """
+    if not hasattr(get_cache_lemas, "_cache"):
+        get_cache_lemas._cache = CacheLemas()
+    return get_cache_lemas._cache
+
+
+def configurar_cache_lemas(path=None, max_entradas=50000):
+    """
+    Reemplaza la caché global de lemas. Si se da path, la caché se carga desde ese archivo
+    y se guarda automáticamente al terminar el proceso. La caché reemplazada, si tenía
+    archivo, se guarda en ese momento.
+    """
+    anterior = getattr(get_cache_lemas, "_cache", None)
+    if anterior is not None:
+        anterior.guardar()
+    get_cache_lemas._cache = CacheLemas(max_entradas=max_entradas, path=path)
+    return get_cache_lemas._cache
+
+
+def _guardar_cache_lemas_vigente():
+    """Guarda la caché global de lemas vigente (no hace nada si no tiene archivo)."""
+    cache = getattr(get_cache_lemas, "_cache", None)
+    if cache is not None:
+        cache.guardar()
+
+
+# Un único hook para todo el proceso, sin importar cuántas veces se configure la caché
+atexit.register(_guardar_cache_lemas_vigente)
+
+
 def extraer_tags_cursos_df(
-    df, columna="Descripcion_Limpia", n_max=10, ia_tags_col="Tags_IA"
+    df,
+    columna="Descripcion_Limpia",
+    n_max=10,
+    ia_tags_col="Tags_IA",
+    batch_size=256,
+    n_process=1,
+    lematizar_ia=True,
 ):
     """
     Extrae tags de la columna de descripciones limpias de un DataFrame de cursos
     y los guarda en una nueva columna 'Tags'. Si existe la columna de tags sugeridos por IA,
     los usa primero y luego añade los extraídos por spaCy, sin duplicados.
+    Todas las descripciones y tags IA se procesan juntos con nlp.pipe (ver procesar_textos_spacy).
+    Con lematizar_ia=False los tags IA se usan tal cual (ya vienen lematizados de
+    sugerir_tags_df), como hace extraer_guardar_tags_curso_por_id.
     """
+    if ia_tags_col in df.columns:
+        ia_tags_filas = [
+            tags if isinstance(tags, list) else [] for tags in df[ia_tags_col]
+        ]
+    else:
+        ia_tags_filas = [[] for _ in range(len(df))]
+    textos = list(df[columna])
+    if lematizar_ia:
+        textos += [tag for tags in ia_tags_filas for tag in tags]
+    procesados = procesar_textos_spacy(
+        textos, batch_size=batch_size, n_process=n_process
+    )
 
-    def combinar_tags(row):
-        ia_tags = (
-            row[ia_tags_col]
-            if ia_tags_col in row and isinstance(row[ia_tags_col], list)
-            else []
-        )
+    def combinar_tags(descripcion, ia_tags):
         # Lematizar cada tag IA (puede devolver varias palabras por tag)
         ia_tags_lemmatized = []
         for tag in ia_tags:
-            lemas = extraer_tags_spacy(tag)
-            lemas = [" ".join(lemas)]
+            lemas = [" ".join(procesados[tag][0])] if lematizar_ia else [tag]
             ia_tags_lemmatized.extend(lemas if lemas else [tag])
-            # ia_tags_lemmatized = lemas
         # Quitar duplicados manteniendo orden
         ia_tags_final = []
         for t in ia_tags_lemmatized:
             if t not in ia_tags_final:
                 ia_tags_final.append(t)
-        spacy_tags = extraer_tags_spacy(row[columna])[:n_max]
+        spacy_tags = procesados[descripcion][0][:n_max]
         # IA tags primero, luego los de spaCy que no estén ya
         tags = ia_tags_final + [tag for tag in spacy_tags if tag not in ia_tags_final]
-        # print(f"Tags extraídos para el curso {row['CursoID']}:")
-        # print(tags)
         return tags[:n_max]
 
-    df["Tags"] = df.apply(combinar_tags, axis=1)
+    df["Tags"] = [
+        combinar_tags(descripcion, ia_tags)
+        for descripcion, ia_tags in zip(df[columna], ia_tags_filas)
+    ]
     return df
 
 
-def guardar_tags_cursos_csv(df, path="data/courses_with_tags.csv"):
+def extraer_tags_cursos_por_lotes(lotes, **kwargs):
+    """
+    Aplica extraer_tags_cursos_df a cada lote (por ejemplo, de iterar_datos_cursos)
+    y genera los lotes con la columna 'Tags'. Acepta los mismos parámetros.
+    """
+    for lote in lotes:
+        yield extraer_tags_cursos_df(lote, **kwargs)
+
+
+def guardar_tags_cursos_csv(df, path="data/courses_with_tags.csv", agregar=False):
     """
     Guarda solo CursoID y Tags en un archivo CSV.
     Convierte la lista de tags a una cadena separada por comas para guardar en el CSV.
     Elimina tags vacíos y espacios extra antes de guardar.
+    Con agregar=True las filas se añaden al final del archivo sin repetir el encabezado.
     """
     df_copy = df.copy()
     if "Tags" in df_copy.columns:
@@ -86,36 +305,69 @@ def guardar_tags_cursos_csv(df, path="data/courses_with_tags.csv"):
         )
     # Solo guarda las columnas necesarias
     df_copy = df_copy[["CursoID", "Tags"]]
-    df_copy.to_csv(path, index=False)
+    _escribir_csv(df_copy, path, agregar)
     return path
 
 
+def _escribir_csv(df, path, agregar):
+    with get_metricas().medir_io("csv", "escritura", path, agregar=agregar):
+        if agregar:
+            df.to_csv(path, mode="a", header=False, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+
+def _leer_csv_tags(csv_path):
+    import pandas as pd
+
+    with get_metricas().medir_io("csv", "lectura", csv_path):
+        return pd.read_csv(csv_path)
+
+
 def extraer_tags_estudiantes_df(
-    df, tags_col="Tags_Limpio", desc_col="Descripcion_Limpia", n_max=5
+    df,
+    tags_col="Tags_Limpio",
+    desc_col="Descripcion_Limpia",
+    n_max=5,
+    batch_size=256,
+    n_process=1,
 ):
     """
     Extrae tags de la columna de tags seleccionados y de la descripción libre, y los guarda en una nueva columna 'Tags_Final'.
     Si ya hay tags seleccionados, los usa; si no, extrae de la descripción.
+    Todos los tags y descripciones se procesan juntos con nlp.pipe (ver procesar_textos_spacy).
     """
+    tags_filas = [
+        (
+            [tag.strip() for tag in valor.split(",") if tag.strip()]
+            if isinstance(valor, str) and valor.strip()
+            else []
+        )
+        for valor in df[tags_col]
+    ]
+    descripciones = [
+        valor if isinstance(valor, str) and valor.strip() else None
+        for valor in df[desc_col]
+    ]
+    textos = [tag for tags in tags_filas for tag in tags] + [
+        desc for desc in descripciones if desc is not None
+    ]
+    procesados = procesar_textos_spacy(
+        textos, batch_size=batch_size, n_process=n_process
+    )
 
-    def combinar_tags(row):
-        tags = set()
-        # Usa los tags seleccionados si existen
-        if isinstance(row[tags_col], str) and row[tags_col].strip():
-            # Lematiza cada concepto completo (puede tener más de una palabra)
-            tags.update(
-                [
-                    " ".join([token.lemma_ for token in nlp(tag.strip())])
-                    for tag in row[tags_col].split(",")
-                    if tag.strip()
-                ]
-            )
+    def combinar_tags(tags_seleccionados, descripcion):
+        # Lematiza cada concepto completo (puede tener más de una palabra)
+        tags = set(procesados[tag][1] for tag in tags_seleccionados)
         # Extrae de la descripción si existe
-        if isinstance(row[desc_col], str) and row[desc_col].strip():
-            tags.update(extraer_tags_spacy(row[desc_col])[:n_max])
+        if descripcion is not None:
+            tags.update(procesados[descripcion][0][:n_max])
         return sorted(list(tags))  # Ordena los tags para asegurar determinismo
 
-    df["Tags_Final"] = df.apply(combinar_tags, axis=1)
+    df["Tags_Final"] = [
+        combinar_tags(tags, descripcion)
+        for tags, descripcion in zip(tags_filas, descripciones)
+    ]
     if "Tags" in df.columns:
         df = df.drop(columns=["Tags"])
     df = df.rename(columns={"Tags_Final": "Tags"})
@@ -123,10 +375,20 @@ def extraer_tags_estudiantes_df(
     return df
 
 
-def guardar_tags_estudiantes_csv(df, path="data/students_with_tags.csv"):
+def extraer_tags_estudiantes_por_lotes(lotes, **kwargs):
+    """
+    Aplica extraer_tags_estudiantes_df a cada lote (por ejemplo, de iterar_datos_estudiantes)
+    y genera los lotes con la columna 'Tags'. Acepta los mismos parámetros.
+    """
+    for lote in lotes:
+        yield extraer_tags_estudiantes_df(lote, **kwargs)
+
+
+def guardar_tags_estudiantes_csv(df, path="data/students_with_tags.csv", agregar=False):
     """
     Guarda solo EstudianteID y Tags en un archivo CSV.
     Convierte la lista de tags a una cadena separada por punto y coma para evitar conflictos con comas internas.
+    Con agregar=True las filas se añaden al final del archivo sin repetir el encabezado.
     """
     df_copy = df.copy()
     if "Tags" in df_copy.columns:
@@ -135,7 +397,7 @@ def guardar_tags_estudiantes_csv(df, path="data/students_with_tags.csv"):
         )
     # Solo guarda las columnas necesarias
     df_copy = df_copy[["EstudianteID", "Tags"]]
-    df_copy.to_csv(path, index=False)
+    _escribir_csv(df_copy, path, agregar)
     return path
 
 
@@ -153,19 +415,10 @@ def extraer_guardar_tags_curso_por_id(
     Si se pasa csv_path, guarda la fila modificada en el CSV correspondiente (solo esa fila).
     Si usar_ia=True y existe la función sugerir_tags_descripcion, usa también los tags IA como en extraer_tags_cursos_df.
     """
-    import importlib.util
-    import sys
-    import os
-
     try:
         from src.tag_ia_suggestion import sugerir_tags_descripcion
     except ModuleNotFoundError:
-        module_path = os.path.join(os.path.dirname(__file__), "tag_ia_suggestion.py")
-        spec = importlib.util.spec_from_file_location("tag_ia_suggestion", module_path)
-        tag_ia_suggestion = importlib.util.module_from_spec(spec)
-        sys.modules["tag_ia_suggestion"] = tag_ia_suggestion
-        spec.loader.exec_module(tag_ia_suggestion)
-        sugerir_tags_descripcion = tag_ia_suggestion.sugerir_tags_descripcion
+        from tag_ia_suggestion import sugerir_tags_descripcion
 
     if "Tags" not in df.columns:
         df["Tags"] = None
@@ -198,8 +451,8 @@ def extraer_guardar_tags_estudiante_por_id(
     Devuelve el DataFrame completo, pero solo la fila del estudiante con el id dado tiene la columna 'Tags' actualizada.
     Si se pasa csv_path, guarda la fila modificada en el CSV correspondiente (solo esa fila).
     """
-    if "Tags" not in df.columns:
-        df["Tags"] = None
+    # Columna de objetos: cada celda guarda una lista (el CSV la trae como texto)
+    df["Tags"] = df["Tags"].astype(object) if "Tags" in df.columns else None
     idx = df[df["EstudianteID"] == estudiante_id].index
     if len(idx) == 0:
         raise ValueError(f"No se encontró el estudiante con ID {estudiante_id}")
@@ -208,23 +461,39 @@ def extraer_guardar_tags_estudiante_por_id(
     tags_str = df.at[i, tags_col]
     desc = df.at[i, desc_col]
     if isinstance(tags_str, str) and tags_str.strip():
-        tags.update(
-            [
-                " ".join([token.lemma_ for token in nlp(tag.strip())])
-                for tag in tags_str.split(",")
-                if tag.strip()
-            ]
-        )
+        tags_seleccionados = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+        procesados = procesar_textos_spacy(tags_seleccionados)
+        tags.update([procesados[tag][1] for tag in tags_seleccionados])
     if isinstance(desc, str) and desc.strip():
         tags.update(extraer_tags_spacy(desc)[:n_max])
     # Limpiar los tags antes de asignar
     df.at[i, "Tags"] = sorted([limpiar_texto(t) for t in tags])
-    print(f"Tags extraídos para el estudiante {estudiante_id}: {df.at[i, 'Tags']}")
     if csv_path:
         _guardar_fila_tags_csv(df, i, "EstudianteID", estudiante_id, csv_path)
     return df
 
 
+def guardar_filas_tags_csv(df, id_col, csv_path):
+    """
+    Versión en lote de _guardar_fila_tags_csv: actualiza o agrega en el CSV de tags
+    todas las filas de df (id_col y Tags) con una sola lectura y una sola escritura.
+    """
+    import pandas as pd
+
+    filas = df[[id_col, "Tags"]].copy()
+    filas["Tags"] = filas["Tags"].apply(
+        lambda tags: ", ".join(tags) if isinstance(tags, list) else ""
+    )
+    try:
+        df_csv = _leer_csv_tags(csv_path)
+        df_csv = df_csv[~df_csv[id_col].isin(filas[id_col])]
+        df_csv = pd.concat([df_csv, filas], ignore_index=True)
+    except Exception:
+        df_csv = filas
+    _escribir_csv(df_csv, csv_path, agregar=False)
+    return csv_path
+
+
 def _guardar_fila_tags_csv(df, idx, id_col, id_value, csv_path):
     """
     Guarda solo la fila modificada (curso o estudiante) en el CSV correspondiente.
@@ -237,7 +506,7 @@ def _guardar_fila_tags_csv(df, idx, id_col, id_value, csv_path):
         lambda tags: ", ".join(tags) if isinstance(tags, list) else ""
     )
     try:
-        df_csv = pd.read_csv(csv_path)
+        df_csv = _leer_csv_tags(csv_path)
         idx_csv = df_csv[df_csv[id_col] == id_value].index
         if len(idx_csv) > 0:
             df_csv.loc[idx_csv[0], "Tags"] = row_to_save.iloc[0]["Tags"]
@@ -245,4 +514,4 @@ def _guardar_fila_tags_csv(df, idx, id_col, id_value, csv_path):
             df_csv = pd.concat([df_csv, row_to_save], ignore_index=True)
     except Exception:
         df_csv = row_to_save
-    df_csv.to_csv(csv_path, index=False)
+    _escribir_csv(df_csv, csv_path, agregar=False)
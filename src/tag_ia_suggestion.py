@@ -3,48 +3,209 @@ Sugerencia automática de tags usando LLM (OpenRouter/mistral-7b-instruct:free)
 """
 
 import os
+import logging
 import pandas as pd
 from typing import List
 import requests
-from dotenv import load_dotenv
-import importlib.util
-import sys
-
-# Cargar limpiar_texto dinámicamente
-_data_preprocessing_path = os.path.join(
-    os.path.dirname(__file__), "data_preprocessing.py"
-)
-spec_dp = importlib.util.spec_from_file_location(
-    "data_preprocessing", _data_preprocessing_path
-)
-data_preprocessing = importlib.util.module_from_spec(spec_dp)
-sys.modules["data_preprocessing"] = data_preprocessing
-spec_dp.loader.exec_module(data_preprocessing)
-limpiar_texto = data_preprocessing.limpiar_texto
-
-# Cargar extraer_tags_spacy dinámicamente
-_tag_extraction_path = os.path.join(os.path.dirname(__file__), "tag_extraction.py")
-spec_te = importlib.util.spec_from_file_location("tag_extraction", _tag_extraction_path)
-tag_extraction = importlib.util.module_from_spec(spec_te)
-sys.modules["tag_extraction"] = tag_extraction
-spec_te.loader.exec_module(tag_extraction)
-extraer_tags_spacy = tag_extraction.extraer_tags_spacy
-
-load_dotenv()
+from requests.adapters import HTTPAdapter
+import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from src import recursos
+    from src.data_preprocessing import limpiar_texto
+    from src.tag_extraction import extraer_tags_spacy
+    from src.metricas import get_metricas
+except ModuleNotFoundError:
+    import recursos
+    from data_preprocessing import limpiar_texto
+    from tag_extraction import extraer_tags_spacy
+    from metricas import get_metricas
+
+logger = logging.getLogger(__name__)
 
 # Configuración de la API de OpenRouter
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 OPENROUTER_MODEL = "mistralai/mistral-7b-instruct:free"
 
 
-def sugerir_tags_descripcion(
-    descripcion: str, nombre: str = None, n_tags: int = 5, language: str = "Spanish"
-) -> List[str]:
+OPENROUTER_TIMEOUT = 30
+# Incrementar al cambiar el texto de _construir_prompt: invalida las respuestas cacheadas
+PROMPT_VERSION = 1
+LLM_CACHE_DIR = os.path.join("data", "cache_llm")
+# Respuestas que vale la pena reintentar: límite de tasa y errores transitorios del servidor
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+# =========================
+# Cliente HTTP compartido
+# =========================
+def get_sesion_http(max_conexiones=10):
     """
-    Usa la API de OpenRouter para sugerir tags relevantes a partir de una descripción y nombre de curso.
-    Devuelve una lista de tags sugeridos, limpios y lematizados.
+    Devuelve una sesión HTTP compartida que reutiliza conexiones (keep-alive).
+    Si se pide un pool mayor que el de la sesión actual, se crea una nueva.
+    """
+    sesion = getattr(get_sesion_http, "_sesion", None)
+    if sesion is None or get_sesion_http._max_conexiones < max_conexiones:
+        sesion = requests.Session()
+        adaptador = HTTPAdapter(
+            pool_connections=max_conexiones, pool_maxsize=max_conexiones
+        )
+        sesion.mount("https://", adaptador)
+        sesion.mount("http://", adaptador)
+        get_sesion_http._sesion = sesion
+        get_sesion_http._max_conexiones = max_conexiones
+    return sesion
+
+
+class LimitadorTasa:
+    """
+    Limita las solicitudes por segundo, compartido entre todos los hilos.
+    """
+
+    def __init__(self, max_por_segundo):
+        self.intervalo = 1.0 / max_por_segundo
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+# =========================
+# Caché persistente de respuestas
+# =========================
+class CacheRespuestasLLM:
     """
+    Caché en disco, direccionada por contenido, de las respuestas del LLM.
+    Cada respuesta se guarda en un archivo JSON cuyo nombre es el hash del modelo, la versión
+    del prompt, n_tags y el nombre y la descripción del curso. Si el total supera max_bytes
+    se eliminan las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, directorio=LLM_CACHE_DIR, max_bytes=50 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.escrituras = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        self._bytes = sum(os.path.getsize(path) for path in self._archivos())
+
+    @staticmethod
+    def clave(nombre, descripcion, n_tags=5, modelo=None):
+        contenido = json.dumps(
+            [modelo or OPENROUTER_MODEL, PROMPT_VERSION, n_tags, nombre, descripcion],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + ".json")
+
+    def _archivos(self):
+        if not os.path.isdir(self.directorio):
+            return []
+        return [
+            os.path.join(raiz, nombre)
+            for raiz, _, nombres in os.walk(self.directorio)
+            for nombre in nombres
+            if nombre.endswith(".json")
+        ]
+
+    def obtener(self, clave):
+        """
+        Devuelve la respuesta cacheada o None. Un acierto renueva la fecha de uso de la entrada.
+        """
+        path = self._ruta(clave)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                respuesta = json.load(f)["respuesta"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return respuesta
+
+    def guardar(self, clave, respuesta):
+        path = self._ruta(clave)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        contenido = json.dumps(
+            {"modelo": OPENROUTER_MODEL, "respuesta": respuesta}, ensure_ascii=False
+        ).encode("utf-8")
+        with self._lock:
+            previo = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(contenido)
+            os.replace(tmp_path, path)
+            self._bytes += len(contenido) - previo
+            self.escrituras += 1
+            if self._bytes > self.max_bytes:
+                self._desalojar()
+
+    def _desalojar(self):
+        # Se eliminan las entradas menos usadas hasta quedar en el 90% del límite
+        archivos = sorted(
+            (os.stat(path).st_mtime, os.path.getsize(path), path)
+            for path in self._archivos()
+        )
+        self._bytes = sum(tam for _, tam, _ in archivos)
+        for _, tam, path in archivos:
+            if self._bytes <= self.max_bytes * 0.9:
+                break
+            os.remove(path)
+            self._bytes -= tam
+            self.desalojos += 1
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "escrituras": self.escrituras,
+            "desalojos": self.desalojos,
+            "bytes": self._bytes,
+            "tasa_aciertos": self.hits / consultas if consultas else 0.0,
+        }
+
+
+def get_cache_respuestas_llm():
+    """
+    Devuelve la caché global de respuestas del LLM (en LLM_CACHE_DIR o en el directorio
+    dado a configurar_cache_respuestas_llm).
+    """
+    if not hasattr(get_cache_respuestas_llm, "_cache"):
+        directorio = getattr(get_cache_respuestas_llm, "_directorio", LLM_CACHE_DIR)
+        get_cache_respuestas_llm._cache = CacheRespuestasLLM(directorio=directorio)
+    return get_cache_respuestas_llm._cache
+
+
+def configurar_cache_respuestas_llm(directorio=LLM_CACHE_DIR):
+    """
+    Ubica la caché global de respuestas del LLM en directorio (p. ej. dentro de la carpeta
+    de datos en uso). Se abre al pedirla por primera vez; si ya estaba abierta en otro
+    directorio, se descarta.
+    """
+    get_cache_respuestas_llm._directorio = directorio
+    cache = getattr(get_cache_respuestas_llm, "_cache", None)
+    if cache is not None and cache.directorio != directorio:
+        del get_cache_respuestas_llm._cache
+
+
+def _construir_prompt(descripcion, nombre=None, n_tags=5):
     prompt = (
         f"Dada la siguiente información de un curso universitario, sugiere como máximo {n_tags} etiquetas (tags) relevantes y concisas "
         f"(palabras en Español) que resuman los temas principales, no uses las mismas palabras de la descripción. Devuelve solo una lista separada por comas.\n\n"
@@ -52,8 +213,25 @@ def sugerir_tags_descripcion(
     if nombre:
         prompt += f"Nombre del curso: {nombre}\n"
     prompt += f"Descripción: {descripcion}"
+    return prompt
+
+
+def _solicitar_completado(
+    prompt,
+    sesion=None,
+    reintentos=3,
+    backoff=1.0,
+    limitador=None,
+    api_url=None,
+    timeout=OPENROUTER_TIMEOUT,
+):
+    """
+    Envía el prompt a OpenRouter y devuelve el texto de la respuesta.
+    Reintenta con espera exponencial (o la indicada en Retry-After) ante 429/5xx y errores de red.
+    """
+    sesion = sesion or get_sesion_http()
     headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Authorization": f"Bearer {recursos.get_config_openrouter()['api_key']}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://openrouter.ai/",
         "X-Title": "optative-recommendation-bot",
@@ -62,34 +240,100 @@ def sugerir_tags_descripcion(
         "model": OPENROUTER_MODEL,
         "messages": [{"role": "system", "content": prompt}],
     }
+    metricas = get_metricas()
+    for intento in range(reintentos + 1):
+        if limitador is not None:
+            limitador.esperar()
+        espera = backoff * (2**intento)
+        if intento:
+            metricas.incrementar("llm_reintentos_total")
+        metricas.incrementar("llm_solicitudes_total")
+        try:
+            with metricas.medir("llm_solicitud_segundos"):
+                response = sesion.post(
+                    api_url or OPENROUTER_API_URL,
+                    headers=headers,
+                    json=data,
+                    timeout=timeout,
+                )
+        except (requests.ConnectionError, requests.Timeout):
+            if intento == reintentos:
+                metricas.incrementar("llm_fallos_total")
+                raise
+        else:
+            if (
+                response.status_code not in CODIGOS_REINTENTABLES
+                or intento == reintentos
+            ):
+                try:
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+                except Exception:
+                    metricas.incrementar("llm_fallos_total")
+                    raise
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                espera = float(retry_after)
+        time.sleep(espera)
+
+
+def _procesar_respuesta_tags(tags_str, n_tags=5):
+    """
+    Limpia y lematiza los tags devueltos por el LLM, sin duplicados y como máximo n_tags.
+    """
+    tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+    tags_limpios = []
+    for tag in tags:
+        tag_limpio = limpiar_texto(tag)
+        lemas = extraer_tags_spacy(tag_limpio)
+        lemas = [" ".join(lemas)]
+        # Solo agregar si el resultado no es vacío
+        for lema in lemas:
+            if lema.strip():
+                tags_limpios.append(lema)
+    # Quitar duplicados y limitar a n_tags
+    tags_final = []
+    for t in tags_limpios:
+        if t not in tags_final:
+            tags_final.append(t)
+        if len(tags_final) >= n_tags:
+            break
+    return tags_final
+
+
+def sugerir_tags_descripcion(
+    descripcion: str,
+    nombre: str = None,
+    n_tags: int = 5,
+    language: str = "Spanish",
+    sesion: requests.Session = None,
+    reintentos: int = 3,
+    limitador: LimitadorTasa = None,
+    cache: CacheRespuestasLLM = None,
+    usar_cache: bool = True,
+) -> List[str]:
+    """
+    Usa la API de OpenRouter para sugerir tags relevantes a partir de una descripción y nombre de curso.
+    Solo se consulta la red si la respuesta no está en la caché persistente.
+    Devuelve una lista de tags sugeridos, limpios y lematizados.
+    """
+    if usar_cache and cache is None:
+        cache = get_cache_respuestas_llm()
+    clave = CacheRespuestasLLM.clave(nombre, descripcion, n_tags)
     try:
-        response = requests.post(
-            OPENROUTER_API_URL, headers=headers, json=data, timeout=30
-        )
-        response.raise_for_status()
-        tags_str = response.json()["choices"][0]["message"]["content"]
-        # Procesar cada tag: limpiar y lematizar
-        tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
-        tags_limpios = []
-        for tag in tags:
-            tag_limpio = limpiar_texto(tag)
-            lemas = extraer_tags_spacy(tag_limpio)
-            lemas = [" ".join(lemas)]
-            # Solo agregar si el resultado no es vacío
-            for lema in lemas:
-                if lema.strip():
-                    tags_limpios.append(lema)
-        print(f"Tags sugeridos: {tags_limpios}")
-        # Quitar duplicados y limitar a n_tags
-        tags_final = []
-        for t in tags_limpios:
-            if t not in tags_final:
-                tags_final.append(t)
-            if len(tags_final) >= n_tags:
-                break
-        return tags_final
+        tags_str = cache.obtener(clave) if usar_cache else None
+        if tags_str is None:
+            tags_str = _solicitar_completado(
+                _construir_prompt(descripcion, nombre, n_tags),
+                sesion=sesion,
+                reintentos=reintentos,
+                limitador=limitador,
+            )
+            if usar_cache:
+                cache.guardar(clave, tags_str)
+        return _procesar_respuesta_tags(tags_str, n_tags)
     except Exception as e:
-        print(f"Error al obtener tags sugeridos: {e}")
+        logger.warning("Error al obtener tags sugeridos: %s", e)
         return []
 
 
@@ -99,15 +343,62 @@ def sugerir_tags_df(
     desc_col: str = "Descripcion_Limpia",
     n_tags: int = 5,
     nueva_col: str = "Tags_IA",
+    concurrencia: int = 1,
+    max_por_segundo: float = None,
+    reintentos: int = 3,
+    cache: CacheRespuestasLLM = None,
+    usar_cache: bool = True,
 ) -> pd.DataFrame:
     """
     Aplica la sugerencia de tags IA a un DataFrame de cursos y agrega una columna con los tags sugeridos.
+    Con concurrencia > 1 las solicitudes se hacen en paralelo (hilos con una sesión HTTP compartida),
+    opcionalmente limitadas a max_por_segundo; el resultado respeta el orden de las filas.
+    Los cursos cuya respuesta está en la caché persistente no se envían a la red.
     """
     df = df.copy()
-    df[nueva_col] = df.apply(
-        lambda row: sugerir_tags_descripcion(
-            row[desc_col], nombre=row.get(nombre_col), n_tags=n_tags
-        ),
-        axis=1,
-    )
+    if usar_cache and cache is None:
+        cache = get_cache_respuestas_llm()
+    descripciones = list(df[desc_col])
+    nombres = list(df[nombre_col]) if nombre_col in df.columns else [None] * len(df)
+    claves = [
+        CacheRespuestasLLM.clave(nombre, descripcion, n_tags)
+        for descripcion, nombre in zip(descripciones, nombres)
+    ]
+    respuestas = [cache.obtener(clave) if usar_cache else None for clave in claves]
+    pendientes = [i for i, respuesta in enumerate(respuestas) if respuesta is None]
+    prompts = [
+        _construir_prompt(descripciones[i], nombres[i], n_tags) for i in pendientes
+    ]
+    sesion = get_sesion_http(max(concurrencia, 1))
+    limitador = LimitadorTasa(max_por_segundo) if max_por_segundo else None
+
+    def solicitar(prompt):
+        try:
+            return _solicitar_completado(
+                prompt, sesion=sesion, reintentos=reintentos, limitador=limitador
+            )
+        except Exception as e:
+            logger.warning("Error al obtener tags sugeridos: %s", e)
+            return None
+
+    def procesar(respuesta):
+        if respuesta is None:
+            return []
+        try:
+            return _procesar_respuesta_tags(respuesta, n_tags)
+        except Exception as e:
+            logger.warning("Error al obtener tags sugeridos: %s", e)
+            return []
+
+    if concurrencia > 1:
+        with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+            nuevas = list(executor.map(solicitar, prompts))
+    else:
+        nuevas = [solicitar(prompt) for prompt in prompts]
+    for i, respuesta in zip(pendientes, nuevas):
+        respuestas[i] = respuesta
+        if usar_cache and respuesta is not None:
+            cache.guardar(claves[i], respuesta)
+    # La lematización (spaCy) se hace en el hilo principal
+    df[nueva_col] = [procesar(respuesta) for respuesta in respuestas]
     return df
@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pandas as pd
 from data_preprocessing import (
     cargar_datos_cursos,
@@ -6,13 +7,23 @@ from data_preprocessing import (
     limpiar_texto,
 )
 from tag_extraction import (
+    get_nlp,
     extraer_tags_spacy,
     extraer_tags_cursos_df,
     guardar_tags_cursos_csv,
     guardar_tags_estudiantes_csv,
     extraer_tags_estudiantes_df,
 )
-from embeddings import actualizar_embeddings_si_necesario
+from embeddings import (
+    actualizar_embeddings_si_necesario,
+    cargar_almacen_embeddings,
+    obtener_embeddings_tags_df,
+    CacheEmbeddingsTags,
+)
+from recommender import (
+    ranking_top_k,
+    recomendar_cursos_todos_los_estudiantes,
+)
 from utils import cargar_df_courses_with_tags, cargar_df_students_with_tags
 
 
@@ -95,6 +106,1850 @@ class TestOptativeRecommendation(unittest.TestCase):
         os.remove(path)
 
 
+class ModeloFalso:
+    """
+    Sustituto determinista de SentenceTransformer que registra cada llamada a encode.
+    """
+
+    def __init__(self, dimension=4):
+        self.dimension = dimension
+        self.llamadas = []
+
+    def encode(self, textos, batch_size=32):
+        self.llamadas.append(list(textos))
+        vectores = []
+        for texto in textos:
+            semilla = sum(ord(c) for c in texto)
+            vectores.append(
+                np.random.default_rng(semilla).standard_normal(self.dimension)
+            )
+        return np.array(vectores, dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+class TestEmbeddingsCache(unittest.TestCase):
+    def test_cada_tag_unico_se_codifica_una_vez(self):
+        modelo = ModeloFalso()
+        cache = CacheEmbeddingsTags(path=None)
+        df = pd.DataFrame(
+            {
+                "EstudianteID": [1, 2, 3],
+                "Tags": ["redes, programacion", "programacion", ""],
+            }
+        )
+        df_emb = obtener_embeddings_tags_df(df, model=modelo, cache=cache)
+        self.assertEqual(modelo.llamadas, [["redes", "programacion"]])
+        esperado = modelo.encode(["redes", "programacion"]).mean(axis=0)
+        np.testing.assert_allclose(df_emb.loc[0, "Tags_Embedding"], esperado)
+        self.assertEqual(df_emb.loc[2, "Tags_Embedding"], [0.0] * modelo.dimension)
+        # Segunda pasada: todo sale de la caché
+        obtener_embeddings_tags_df(df, model=modelo, cache=cache)
+        self.assertEqual(len(modelo.llamadas), 2)
+        self.assertEqual(cache.estadisticas()["hits"], 2)
+        self.assertEqual(cache.estadisticas()["misses"], 2)
+
+
+class TestActualizacionIncremental(unittest.TestCase):
+    def test_solo_se_recodifican_filas_nuevas_o_modificadas(self):
+        import os
+        import tempfile
+
+        path = os.path.join(tempfile.mkdtemp(), "students_tags_embeddings")
+        modelo = ModeloFalso()
+        df = pd.DataFrame({"EstudianteID": [1, 2], "Tags": ["redes, ia", "web"]})
+        actualizar_embeddings_si_necesario(
+            df, path, model=modelo, cache=CacheEmbeddingsTags(path=None)
+        )
+        # Se elimina el 1, el 2 no cambia, el 3 es nuevo
+        df = pd.DataFrame({"EstudianteID": [2, 3], "Tags": ["web", "algoritmos"]})
+        df_emb = actualizar_embeddings_si_necesario(
+            df, path, model=modelo, cache=CacheEmbeddingsTags(path=None)
+        )
+        self.assertEqual(modelo.llamadas[-1], ["algoritmos"])
+        self.assertEqual(df_emb["EstudianteID"].tolist(), [2, 3])
+        guardado = cargar_almacen_embeddings(path)
+        self.assertEqual(guardado.ids.tolist(), [2, 3])
+        np.testing.assert_allclose(guardado.vector(2), modelo.encode(["web"])[0])
+
+    def test_actualizar_solo_las_filas_dadas(self):
+        import os
+        import tempfile
+
+        from embeddings import actualizar_filas_embeddings
+
+        path = os.path.join(tempfile.mkdtemp(), "students_tags_embeddings")
+        modelo = ModeloFalso()
+        self.assertIsNone(
+            actualizar_filas_embeddings(path, "EstudianteID", [1], ["redes"])
+        )
+        df = pd.DataFrame(
+            {"EstudianteID": [5, 2, 9], "Tags": ["redes, ia", "web", "datos"]}
+        )
+        actualizar_embeddings_si_necesario(df, path, model=modelo)
+        # El 2 cambia, el 9 no, el 7 y el 1 son nuevos
+        resumen = actualizar_filas_embeddings(
+            path,
+            "EstudianteID",
+            [2, 9, 7, 1],
+            ["compiladores", "datos", ["ia"], "web"],
+            model=modelo,
+        )
+        self.assertEqual(resumen, {"filas": 5, "codificadas": 3})
+        # Solo se codifican los tags de las filas cambiadas o nuevas
+        self.assertEqual(modelo.llamadas[-1], ["compiladores", "ia", "web"])
+        almacen = cargar_almacen_embeddings(path)
+        self.assertEqual(almacen.ids.tolist(), [5, 2, 9, 7, 1])
+        self.assertEqual(almacen.ids_ordenados.tolist(), [1, 2, 5, 7, 9])
+        self.assertEqual(
+            almacen.filas([1, 2, 5, 7, 9, 3]).tolist(), [4, 1, 0, 3, 2, -1]
+        )
+        # Mismo resultado que comparar la tabla completa
+        referencia = actualizar_embeddings_si_necesario(
+            pd.DataFrame(
+                {
+                    "EstudianteID": [5, 2, 9, 7, 1],
+                    "Tags": ["redes, ia", "compiladores", "datos", "ia", "web"],
+                }
+            ),
+            os.path.join(tempfile.mkdtemp(), "ref"),
+            model=modelo,
+        )
+        np.testing.assert_allclose(
+            almacen.matriz, np.stack(referencia["Tags_Embedding"]), rtol=1e-6
+        )
+        np.testing.assert_array_equal(almacen.hashes, referencia["Tags_Hash"].values)
+        # Sin cambios no se escribe una generación nueva
+        generacion = almacen.meta["generacion"]
+        resumen = actualizar_filas_embeddings(
+            path, "EstudianteID", [2], ["compiladores"], model=modelo
+        )
+        self.assertEqual(resumen, {"filas": 5, "codificadas": 0})
+        self.assertEqual(cargar_almacen_embeddings(path).meta["generacion"], generacion)
+
+
+class TestAlmacenEmbeddings(unittest.TestCase):
+    def test_guardar_y_abrir_sin_copia(self):
+        import os
+        import tempfile
+
+        from embeddings import guardar_almacen_embeddings
+
+        path = os.path.join(tempfile.mkdtemp(), "courses_tags_embeddings")
+        matriz = np.arange(12, dtype=np.float32).reshape(3, 4)
+        guardar_almacen_embeddings(path, "CursoID", [7, 2, 5], matriz)
+        almacen = cargar_almacen_embeddings(path)
+        self.assertIsInstance(almacen.matriz, np.memmap)
+        self.assertEqual(almacen.matriz.dtype, np.float32)
+        self.assertEqual(almacen.filas([5, 7, 99]).tolist(), [2, 0, -1])
+        np.testing.assert_array_equal(almacen.vector(2), matriz[1])
+
+
+class TestMotorRanking(unittest.TestCase):
+    def test_mismo_orden_que_sort_values(self):
+        rng = np.random.default_rng(0)
+        matriz = pd.DataFrame(
+            rng.random((20, 12)),
+            index=pd.Index(range(1, 21), name="EstudianteID"),
+            columns=pd.Index(range(1, 13), name="CursoID"),
+        )
+        recomendaciones = recomendar_cursos_todos_los_estudiantes(matriz, top_n=3)
+        for estudiante_id in matriz.index:
+            esperado = matriz.loc[estudiante_id].sort_values(ascending=False).head(3)
+            self.assertEqual(
+                recomendaciones[estudiante_id],
+                list(zip(esperado.index, esperado.values)),
+            )
+
+    def test_ranking_top_k_por_bloques(self):
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        rng = np.random.default_rng(1)
+        X = rng.standard_normal((10, 8))
+        Y = rng.standard_normal((6, 8))
+        ids_cursos = np.array([10, 20, 30, 40, 50, 60])
+        ids, puntuaciones = ranking_top_k(X, Y, ids_cursos, k=2, tam_bloque=3)
+        similitud = cosine_similarity(X, Y)
+        esperado = ids_cursos[np.argsort(-similitud, axis=1)[:, :2]]
+        np.testing.assert_array_equal(ids, esperado)
+        np.testing.assert_allclose(
+            puntuaciones, -np.sort(-similitud, axis=1)[:, :2], atol=1e-6
+        )
+
+
+class TestIndiceRecomendacion(unittest.TestCase):
+    def test_indice_residente_se_invalida_al_reescribir_embeddings(self):
+        import os
+        import tempfile
+
+        from embeddings import guardar_almacen_embeddings
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        guardar_almacen_embeddings(
+            os.path.join(data_path, "students_tags_embeddings"),
+            "EstudianteID",
+            [1, 2],
+            np.array([[1.0, 0.0], [0.0, 1.0]]),
+        )
+        courses_path = os.path.join(data_path, "courses_tags_embeddings")
+        guardar_almacen_embeddings(
+            courses_path, "CursoID", [10, 20], np.array([[1.0, 0.1], [0.1, 1.0]])
+        )
+        api = ElectiveRecommendationAPI(data_path)
+        ranking = api.recomendar_top_cursos_para_estudiante(1, top_n=1)
+        self.assertEqual(ranking[0][0], 10)
+        indice = api._indice
+        api.recomendar_top_cursos_para_estudiante(2, top_n=1)
+        self.assertIs(api._indice, indice)
+        # Otro proceso reescribe los cursos: el índice se reconstruye
+        guardar_almacen_embeddings(
+            courses_path, "CursoID", [10, 20], np.array([[0.1, 1.0], [1.0, 0.1]])
+        )
+        ranking = api.recomendar_top_cursos_para_estudiante(1, top_n=1)
+        self.assertEqual(ranking[0][0], 20)
+
+
+class TestTagsEnLote(unittest.TestCase):
+    def test_lote_produce_los_mismos_tags_que_por_fila(self):
+        descripciones = [
+            limpiar_texto("Estudio de protocolos, arquitecturas y seguridad en redes."),
+            limpiar_texto("Lógica, conjuntos, grafos y combinatoria."),
+        ]
+        df = pd.DataFrame(
+            {
+                "CursoID": [1, 2],
+                "Descripcion_Limpia": descripciones,
+                "Tags_IA": [["redes neuronales"], []],
+            }
+        )
+        df_tags = extraer_tags_cursos_df(df.copy(), batch_size=1)
+        esperado = [" ".join(extraer_tags_spacy("redes neuronales"))]
+        esperado += [
+            t for t in extraer_tags_spacy(descripciones[0]) if t not in esperado
+        ]
+        self.assertEqual(df_tags.loc[0, "Tags"], esperado[:10])
+        self.assertEqual(df_tags.loc[1, "Tags"], extraer_tags_spacy(descripciones[1]))
+
+    def test_lote_estudiantes(self):
+        df = pd.DataFrame(
+            {
+                "EstudianteID": [1],
+                "Tags_Limpio": ["bases de datos, redes"],
+                "Descripcion_Limpia": ["me interesan los algoritmos geneticos"],
+            }
+        )
+        df_tags = extraer_tags_estudiantes_df(df)
+        nlp = get_nlp()
+        esperado = {
+            " ".join(token.lemma_ for token in nlp("bases de datos")),
+            " ".join(token.lemma_ for token in nlp("redes")),
+        }
+        esperado.update(extraer_tags_spacy("me interesan los algoritmos geneticos")[:5])
+        self.assertEqual(df_tags.loc[0, "Tags"], sorted(esperado))
+
+    def test_hilos_no_usan_spacy_a_la_vez(self):
+        import threading
+        import time
+        from unittest import mock
+
+        import tag_extraction
+        from tag_extraction import CacheLemas, procesar_textos_spacy
+
+        activos, maximo = [0], [0]
+        contador = threading.Lock()
+
+        class NlpFalso:
+            pipe_names = []
+
+            def pipe(self, textos, **kwargs):
+                for _ in textos:
+                    with contador:
+                        activos[0] += 1
+                        maximo[0] = max(maximo[0], activos[0])
+                    time.sleep(0.01)
+                    with contador:
+                        activos[0] -= 1
+                    yield []
+
+        # Como las ramas de cursos y estudiantes del pipeline, cada una con sus textos
+        with mock.patch.object(tag_extraction, "get_nlp", return_value=NlpFalso()):
+            hilos = [
+                threading.Thread(
+                    target=procesar_textos_spacy,
+                    args=([f"{rama} {i}" for i in range(5)],),
+                    kwargs={"cache": CacheLemas(path=None)},
+                )
+                for rama in ("cursos", "estudiantes")
+            ]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join(5)
+        self.assertEqual(maximo[0], 1)
+
+
+class TestCacheLemas(unittest.TestCase):
+    def test_lru_acotada_y_persistente(self):
+        import os
+        import tempfile
+
+        from tag_extraction import CacheLemas, procesar_textos_spacy
+
+        path = os.path.join(tempfile.mkdtemp(), "cache_lemas.pkl")
+        cache = CacheLemas(max_entradas=2, path=path)
+        procesar_textos_spacy(["redes", "redes", "algoritmos"], cache=cache)
+        self.assertEqual(cache.estadisticas()["misses"], 2)
+        resultado = procesar_textos_spacy(["redes", "algoritmos"], cache=cache)
+        self.assertEqual(cache.estadisticas()["hits"], 2)
+        self.assertEqual(resultado["redes"][0], extraer_tags_spacy("redes"))
+        # La clave es el texto exacto: " redes " se lematiza aparte
+        procesar_textos_spacy([" redes "], cache=cache)
+        self.assertEqual(cache.estadisticas()["misses"], 3)
+        procesar_textos_spacy(["grafos"], cache=cache)
+        self.assertEqual(cache.estadisticas()["entradas"], 2)
+        cache.guardar()
+        recargada = CacheLemas(max_entradas=2, path=path)
+        self.assertIsNotNone(recargada.obtener("grafos"))
+        self.assertIsNone(recargada.obtener("redes"))
+
+    def test_configurar_no_acumula_hooks_de_salida(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        import tag_extraction
+
+        carpeta = tempfile.mkdtemp()
+        rutas = [os.path.join(carpeta, f"cache_{i}.pkl") for i in range(3)]
+        original = tag_extraction.get_cache_lemas()
+        try:
+            with mock.patch.object(tag_extraction.atexit, "register") as register:
+                for path in rutas:
+                    cache = tag_extraction.configurar_cache_lemas(path)
+                    cache.agregar(path, (("tag",), "lema"))
+            self.assertFalse(register.called)
+            # Las cachés reemplazadas se guardaron al reemplazarlas
+            self.assertTrue(all(os.path.exists(path) for path in rutas[:2]))
+            self.assertFalse(os.path.exists(rutas[2]))
+            # El hook del módulo guarda la vigente
+            tag_extraction._guardar_cache_lemas_vigente()
+            recargada = tag_extraction.CacheLemas(path=rutas[2])
+            self.assertIsNotNone(recargada.obtener(rutas[2]))
+        finally:
+            tag_extraction.get_cache_lemas._cache = original
+
+
+class ServidorLLMFalso:
+    """
+    Servidor HTTP local que imita la API de OpenRouter. Responde 429 a la primera
+    solicitud de cada curso y luego devuelve como tags el nombre del curso.
+    """
+
+    def __init__(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        servidor = self
+        self.solicitudes = []
+        self._vistos = set()
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                cuerpo = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                prompt = cuerpo["messages"][0]["content"]
+                nombre = prompt.split("Nombre del curso: ")[1].split("\n")[0]
+                with servidor._lock:
+                    servidor.solicitudes.append(nombre)
+                    primera_vez = nombre not in servidor._vistos
+                    servidor._vistos.add(nombre)
+                if primera_vez:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    return
+                respuesta = json.dumps(
+                    {"choices": [{"message": {"content": nombre}}]}
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(respuesta)))
+                self.end_headers()
+                self.wfile.write(respuesta)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/chat"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestSugerenciaTagsConcurrente(unittest.TestCase):
+    def setUp(self):
+        import tag_ia_suggestion
+
+        self.modulo = tag_ia_suggestion
+        self.servidor = ServidorLLMFalso()
+        self.url_original = tag_ia_suggestion.OPENROUTER_API_URL
+        tag_ia_suggestion.OPENROUTER_API_URL = self.servidor.url
+
+    def tearDown(self):
+        self.modulo.OPENROUTER_API_URL = self.url_original
+        self.servidor.cerrar()
+
+    def test_concurrente_con_reintentos_respeta_el_orden(self):
+        nombres = [f"curso{i}" for i in range(8)]
+        df = pd.DataFrame(
+            {
+                "Nombre_Limpio": nombres,
+                "Descripcion_Limpia": ["descripcion"] * len(nombres),
+            }
+        )
+        df_tags = self.modulo.sugerir_tags_df(
+            df, concurrencia=4, max_por_segundo=200, reintentos=2, usar_cache=False
+        )
+        esperado = [self.modulo._procesar_respuesta_tags(nombre) for nombre in nombres]
+        self.assertEqual(df_tags["Tags_IA"].tolist(), esperado)
+        # Cada curso recibió un 429 y un reintento exitoso
+        self.assertEqual(len(self.servidor.solicitudes), 2 * len(nombres))
+
+    def test_cache_de_respuestas_evita_la_red(self):
+        import tempfile
+
+        cache = self.modulo.CacheRespuestasLLM(tempfile.mkdtemp(), max_bytes=10**6)
+        df = pd.DataFrame(
+            {"Nombre_Limpio": ["redes", "grafos"], "Descripcion_Limpia": ["a", "b"]}
+        )
+        primera = self.modulo.sugerir_tags_df(df, reintentos=1, cache=cache)
+        solicitudes = len(self.servidor.solicitudes)
+        segunda = self.modulo.sugerir_tags_df(df, reintentos=1, cache=cache)
+        self.assertEqual(len(self.servidor.solicitudes), solicitudes)
+        self.assertEqual(primera["Tags_IA"].tolist(), segunda["Tags_IA"].tolist())
+        self.assertEqual(cache.estadisticas()["hits"], 2)
+        tags = self.modulo.sugerir_tags_descripcion("a", nombre="redes", cache=cache)
+        self.assertEqual(tags, primera.loc[0, "Tags_IA"])
+        self.assertEqual(len(self.servidor.solicitudes), solicitudes)
+
+    def test_cache_desaloja_por_tamano(self):
+        import tempfile
+
+        cache = self.modulo.CacheRespuestasLLM(tempfile.mkdtemp(), max_bytes=400)
+        for i in range(20):
+            cache.guardar(cache.clave(f"curso{i}", "descripcion"), "x" * 50)
+        self.assertLessEqual(cache.estadisticas()["bytes"], 400)
+        self.assertGreater(cache.estadisticas()["desalojos"], 0)
+        self.assertIsNotNone(cache.obtener(cache.clave("curso19", "descripcion")))
+
+    def test_caches_en_la_carpeta_de_datos(self):
+        import os
+        import tempfile
+
+        import src.embeddings as embeddings
+        import src.tag_ia_suggestion as tag_ia_suggestion
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        api = ElectiveRecommendationAPI(data_path)
+        try:
+            api._dynamic_import("embeddings", embeddings.__file__)
+            api._dynamic_import("tag_ia_suggestion", tag_ia_suggestion.__file__)
+            self.assertEqual(
+                embeddings.get_cache_embeddings_tags().path,
+                os.path.join(data_path, "tags_embeddings_cache.pkl"),
+            )
+            self.assertEqual(
+                tag_ia_suggestion.get_cache_respuestas_llm().directorio,
+                os.path.join(data_path, "cache_llm"),
+            )
+        finally:
+            embeddings.configurar_cache_embeddings_tags()
+            tag_ia_suggestion.configurar_cache_respuestas_llm()
+        self.assertEqual(
+            embeddings.get_cache_embeddings_tags().path, embeddings.TAGS_CACHE_PATH
+        )
+
+
+class TestTiempoDeImportacion(unittest.TestCase):
+    # Límite generoso: importar solo el ranking no debe cargar spaCy, modelos ni scikit-learn
+    MAX_SEGUNDOS_IMPORT = 2.0
+
+    def test_import_recommender_es_rapido(self):
+        import json
+        import os
+        import subprocess
+        import sys
+
+        codigo = (
+            "import json, sys, time\n"
+            "t = time.perf_counter()\n"
+            "import src.recommender\n"
+            "segundos = time.perf_counter() - t\n"
+            "pesados = ['spacy', 'sentence_transformers', 'torch', 'sklearn', 'requests', 'dotenv']\n"
+            "print(json.dumps({'segundos': segundos, 'cargados': [m for m in pesados if m in sys.modules]}))\n"
+        )
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo],
+            cwd=raiz,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        self.assertEqual(resultado["cargados"], [])
+        self.assertLess(resultado["segundos"], self.MAX_SEGUNDOS_IMPORT)
+
+    def test_modulos_pesados_no_cargan_recursos_al_importar(self):
+        import os
+        import subprocess
+        import sys
+
+        codigo = (
+            "import sys\n"
+            "import src.tag_extraction, src.embeddings, src.similarity\n"
+            "assert 'spacy' not in sys.modules\n"
+            "assert 'sentence_transformers' not in sys.modules\n"
+            "assert 'sklearn' not in sys.modules\n"
+        )
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", codigo], cwd=raiz, check=True)
+
+
+class TestIndiceANN(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centros = rng.standard_normal((16, 32))
+        self.cursos = centros[rng.integers(0, 16, 2000)] + 0.3 * rng.standard_normal(
+            (2000, 32)
+        )
+        self.consultas = centros[rng.integers(0, 16, 50)] + 0.3 * rng.standard_normal(
+            (50, 32)
+        )
+        self.ids = np.arange(2000) + 1
+
+    def test_ivf_recall_y_exactitud_con_todas_las_listas(self):
+        from indice_ann import construir_indice_cursos
+
+        exacto = construir_indice_cursos(self.cursos, self.ids, backend="exacto")
+        ivf = construir_indice_cursos(self.cursos, self.ids, backend="ivf")
+        ids_exactos, _ = exacto.buscar(self.consultas, k=5)
+        ids_ivf, _ = ivf.buscar(self.consultas, k=5, esfuerzo=4)
+        recall = np.mean(
+            [len(set(a) & set(b)) / 5 for a, b in zip(ids_ivf, ids_exactos)]
+        )
+        self.assertGreaterEqual(recall, 0.9)
+        ids_ivf, _ = ivf.buscar(self.consultas, k=5, esfuerzo=ivf.n_listas)
+        np.testing.assert_array_equal(ids_ivf, ids_exactos)
+
+    def test_guardar_y_cargar(self):
+        import tempfile
+
+        from indice_ann import (
+            construir_indice_cursos,
+            guardar_indice_cursos,
+            cargar_indice_cursos,
+        )
+
+        ivf = construir_indice_cursos(self.cursos, self.ids, backend="ivf")
+        path = guardar_indice_cursos(ivf, tempfile.mkdtemp())
+        cargado = cargar_indice_cursos(path)
+        np.testing.assert_array_equal(
+            cargado.buscar(self.consultas, k=3)[0], ivf.buscar(self.consultas, k=3)[0]
+        )
+
+    def test_api_con_indice_ann(self):
+        import os
+        import tempfile
+
+        from embeddings import guardar_almacen_embeddings
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        guardar_almacen_embeddings(
+            os.path.join(data_path, "students_tags_embeddings"),
+            "EstudianteID",
+            [1],
+            self.consultas[:1],
+        )
+        guardar_almacen_embeddings(
+            os.path.join(data_path, "courses_tags_embeddings"),
+            "CursoID",
+            self.ids,
+            self.cursos,
+        )
+        exacta = ElectiveRecommendationAPI(data_path)
+        aproximada = ElectiveRecommendationAPI(
+            data_path, indice_ann="ivf", esfuerzo_ann=1000
+        )
+        ranking_exacto = exacta.recomendar_top_cursos_para_estudiante(1, top_n=3)
+        ranking_ann = aproximada.recomendar_top_cursos_para_estudiante(1, top_n=3)
+        self.assertEqual([c for c, _ in ranking_ann], [c for c, _ in ranking_exacto])
+        self.assertTrue(
+            os.path.exists(os.path.join(data_path, "courses_ann_index", "CURRENT"))
+        )
+
+    def test_reconstruir_con_el_indice_anterior_cargado(self):
+        import os
+        import tempfile
+
+        from indice_ann import (
+            construir_indice_cursos,
+            guardar_indice_cursos,
+            cargar_indice_cursos,
+        )
+
+        path = os.path.join(tempfile.mkdtemp(), "courses_ann_index")
+        ivf = construir_indice_cursos(self.cursos, self.ids, backend="ivf")
+        guardar_indice_cursos(ivf, path, meta_extra={"firma_cursos": "a"})
+        anterior = cargar_indice_cursos(path)
+        esperado = anterior.buscar(self.consultas, k=3)[0]
+        # Los cursos cambian: la reconstrucción no toca los archivos del índice cargado
+        otros = construir_indice_cursos(
+            self.cursos[::-1] * 2, self.ids[::-1] + 1000, backend="ivf"
+        )
+        guardar_indice_cursos(otros, path, meta_extra={"firma_cursos": "b"})
+        np.testing.assert_array_equal(anterior.buscar(self.consultas, k=3)[0], esperado)
+        self.assertEqual(anterior.meta["firma_cursos"], "a")
+        nuevo = cargar_indice_cursos(path)
+        self.assertEqual(nuevo.meta["firma_cursos"], "b")
+        self.assertTrue(np.all(nuevo.ids >= 1000))
+        # Una tercera escritura borra la generación más vieja, no la que sigue abierta
+        guardar_indice_cursos(ivf, path, meta_extra={"firma_cursos": "c"})
+        np.testing.assert_array_equal(
+            nuevo.buscar(self.consultas, k=3)[0], otros.buscar(self.consultas, k=3)[0]
+        )
+        generaciones = [n for n in os.listdir(path) if n.startswith("gen-")]
+        self.assertEqual(len(generaciones), 2)
+
+
+class TestAfinidadPorBloques(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.df_est = pd.DataFrame(
+            {
+                "EstudianteID": np.arange(1, 51),
+                "Tags_Embedding": list(rng.standard_normal((50, 8))),
+            }
+        )
+        self.df_cursos = pd.DataFrame(
+            {
+                "CursoID": np.arange(101, 121),
+                "Tags_Embedding": list(rng.standard_normal((20, 8))),
+            }
+        )
+
+    def test_top_k_en_flujo_igual_al_denso(self):
+        from similarity import calcular_matriz_afinidad, top_k_afinidad_por_bloques
+
+        densa = recomendar_cursos_todos_los_estudiantes(
+            calcular_matriz_afinidad(self.df_est, self.df_cursos), top_n=3
+        )
+        vistos = 0
+        for ids_est, ids_top, scores in top_k_afinidad_por_bloques(
+            self.df_est, self.df_cursos, k=3, tam_bloque=7
+        ):
+            self.assertLessEqual(len(ids_est), 7)
+            self.assertEqual(scores.dtype, np.float32)
+            for est_id, cids in zip(ids_est, ids_top):
+                self.assertEqual(list(cids), [c for c, _ in densa[est_id]])
+                vistos += 1
+        self.assertEqual(vistos, 50)
+
+    def test_matriz_en_memmap(self):
+        import os
+        import tempfile
+
+        from similarity import calcular_matriz_afinidad
+
+        path = os.path.join(tempfile.mkdtemp(), "afinidad.npy")
+        densa = calcular_matriz_afinidad(self.df_est, self.df_cursos)
+        en_disco = calcular_matriz_afinidad(
+            self.df_est, self.df_cursos, path_memmap=path, tam_bloque=16
+        )
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(en_disco.values.dtype, np.float32)
+        np.testing.assert_allclose(en_disco.values, densa.values, atol=1e-5)
+        self.assertEqual(list(en_disco.columns), list(densa.columns))
+
+    def test_memmap_extrae_los_embeddings_una_vez(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        import similarity
+
+        path = os.path.join(tempfile.mkdtemp(), "afinidad.npy")
+        with mock.patch.object(
+            similarity, "_ids_y_matriz", wraps=similarity._ids_y_matriz
+        ) as extraer:
+            similarity.calcular_matriz_afinidad(
+                self.df_est, self.df_cursos, path_memmap=path, tam_bloque=16
+            )
+        # Una vez por tabla (antes se apilaban Tags_Embedding tres veces)
+        self.assertEqual(extraer.call_count, 2)
+
+
+class TestArtefactosIteracion(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.ruta = tempfile.mkdtemp()
+        rng = np.random.default_rng(2)
+        self.matriz = pd.DataFrame(
+            rng.random((6, 4)),
+            index=pd.Index([1, 2, 3, 4, 5, 6], name="EstudianteID"),
+            columns=pd.Index([10, 20, 30, 40], name="CursoID"),
+        )
+
+    def test_matrices_identicas_se_guardan_una_vez(self):
+        import os
+
+        from recommender import guardar_matrices_iteracion, cargar_matrices_iteracion
+
+        guardar_matrices_iteracion(self.matriz, self.matriz, 1, ruta_salida=self.ruta)
+        self.assertEqual(os.listdir(self.ruta), ["iteracion_1.npz"])
+        with cargar_matrices_iteracion(1, ruta_salida=self.ruta) as iteracion:
+            self.assertTrue(iteracion.matrices_identicas)
+            pd.testing.assert_frame_equal(iteracion.preferencias, self.matriz)
+            pd.testing.assert_frame_equal(iteracion.similitud, self.matriz)
+
+    def test_matrices_distintas_y_exportar_csv(self):
+        import os
+
+        from recommender import guardar_matrices_iteracion, cargar_matrices_iteracion
+
+        similitud = self.matriz * 2
+        guardar_matrices_iteracion(
+            self.matriz, similitud, 2, ruta_salida=self.ruta, exportar_csv=True
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.ruta, "similitud_iter_2.csv")))
+        with cargar_matrices_iteracion(2, ruta_salida=self.ruta) as iteracion:
+            self.assertFalse(iteracion.matrices_identicas)
+            pd.testing.assert_frame_equal(iteracion.similitud, similitud)
+
+    def test_npz_referencia_el_npy(self):
+        import os
+
+        from recommender import guardar_matrices_iteracion, cargar_matrices_iteracion
+
+        path_npy = os.path.join(self.ruta, "afinidad_iter_3.npy")
+        np.save(path_npy, self.matriz.values)
+        guardar_matrices_iteracion(
+            self.matriz, self.matriz, 3, ruta_salida=self.ruta, path_npy=path_npy
+        )
+        # El .npz solo lleva los IDs y la ruta: no vuelve a guardar la matriz
+        with np.load(os.path.join(self.ruta, "iteracion_3.npz")) as npz:
+            self.assertNotIn("preferencias", npz.files)
+        with cargar_matrices_iteracion(3, ruta_salida=self.ruta) as iteracion:
+            self.assertTrue(iteracion.matrices_identicas)
+            # Abierta como memmap de solo lectura sobre el .npy
+            self.assertFalse(iteracion.preferencias.values.flags.writeable)
+            pd.testing.assert_frame_equal(iteracion.similitud, self.matriz)
+
+
+class TestAlmacenTablas(unittest.TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+
+        self.data_path = tempfile.mkdtemp()
+        with open(
+            os.path.join(self.data_path, "courses.csv"), "w", encoding="utf-8"
+        ) as f:
+            f.write('CursoID,Nombre,Descripcion\n1,Redes,"Protocolos, routers"\n')
+            f.write("3,Bases de Datos,SQL\n")
+
+    def test_sqlite_importa_edita_y_exporta(self):
+        import os
+
+        from almacen_tablas import abrir_tabla
+
+        tabla = abrir_tabla(self.data_path, "courses", backend="sqlite")
+        self.assertEqual(tabla.siguiente_id(), 4)
+        self.assertEqual(
+            tabla.obtener(1),
+            {"CursoID": "1", "Nombre": "Redes", "Descripcion": "Protocolos, routers"},
+        )
+        tabla.agregar([4, "IA", "Redes neuronales"])
+        tabla.editar("3", {"Nombre": "Bases de Datos II"})
+        with self.assertRaises(ValueError):
+            tabla.editar(99, {"Nombre": "X"})
+        with self.assertRaises(ValueError):
+            tabla.obtener("abc")
+        tabla.exportar_csv(os.path.join(self.data_path, "courses.csv"))
+        csv_tabla = abrir_tabla(self.data_path, "courses", backend="csv")
+        self.assertEqual(csv_tabla.todas(), tabla.todas())
+        self.assertEqual(csv_tabla.obtener(3)["Nombre"], "Bases de Datos II")
+
+    def test_api_con_almacen_sqlite(self):
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        api = ElectiveRecommendationAPI(self.data_path, almacen="sqlite")
+        api.recalculate_course_data = lambda curso_id: True
+        curso_id = api.register_course("Compiladores", "Lenguajes y gramáticas")
+        self.assertEqual(curso_id, 4)
+        api.edit_course(curso_id, descripcion="Gramáticas")
+        self.assertEqual(api.get_course(4)["Descripcion"], "Gramáticas")
+        self.assertEqual(len(api.get_all_courses()), 3)
+        with self.assertRaises(ValueError):
+            api.edit_course(1, nombre=" ")
+        df = api._fila_df("courses", 4)
+        self.assertEqual(df["CursoID"].tolist(), [4])
+
+
+class TestRegistroEnLote(unittest.TestCase):
+    def _api(self):
+        import os
+        import tempfile
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        with open(os.path.join(data_path, "students.csv"), "w", encoding="utf-8") as f:
+            f.write("EstudianteID,Nombre,Tags,Descripcion\n")
+        return ElectiveRecommendationAPI(data_path)
+
+    def test_lote_agrega_filas_tags_y_embeddings(self):
+        import os
+        from unittest import mock
+
+        from embeddings import CacheEmbeddingsTags
+
+        registros = [
+            {
+                "nombre": "Ana",
+                "tags": "redes, bases de datos",
+                "descripcion": "Me interesan los algoritmos genéticos.",
+            },
+            ("Luis", "", "Quiero aprender seguridad informática y criptografía."),
+        ]
+        modelo = ModeloFalso()
+        api = self._api()
+        with mock.patch(
+            "src.embeddings.get_sentence_transformer_model", return_value=modelo
+        ), mock.patch(
+            "src.embeddings.get_cache_embeddings_tags",
+            side_effect=lambda: CacheEmbeddingsTags(path=None),
+        ):
+            ids = api.register_students_bulk(registros)
+        self.assertEqual(ids, [1, 2])
+        self.assertEqual(api.get_student(2)["Nombre"], "Luis")
+        # Mismos tags que recalculate_student_data: los de la descripción, limpios y ordenados
+        df_tags = pd.read_csv(os.path.join(api.data_path, "students_with_tags.csv"))
+        for fila, (_, _, descripcion) in zip(
+            df_tags.itertuples(), [tuple(registros[0].values()), registros[1]]
+        ):
+            esperado = sorted(
+                {
+                    limpiar_texto(t)
+                    for t in extraer_tags_spacy(limpiar_texto(descripcion))[:10]
+                }
+            )
+            self.assertEqual(fila.Tags.split(", "), esperado)
+        almacen = cargar_almacen_embeddings(
+            os.path.join(api.data_path, "students_tags_embeddings")
+        )
+        self.assertEqual(list(almacen.ids), [1, 2])
+        # Todos los tags nuevos se codificaron en una sola llamada
+        self.assertEqual(len(modelo.llamadas), 1)
+
+    def test_nombre_vacio_rechaza_todo_el_lote(self):
+        import os
+        from unittest import mock
+
+        from embeddings import generacion_almacen
+
+        api = self._api()
+        with mock.patch(
+            "src.embeddings.get_sentence_transformer_model", return_value=ModeloFalso()
+        ), mock.patch(
+            "src.embeddings.get_cache_embeddings_tags",
+            side_effect=lambda: CacheEmbeddingsTags(path=None),
+        ):
+            api.register_students_bulk([("Eva", "", "Me interesan las redes.")])
+        path_almacen = os.path.join(api.data_path, "students_tags_embeddings")
+        estudiantes = api._tabla("students").todas()
+        generacion = generacion_almacen(path_almacen)
+        with self.assertRaises(ValueError):
+            api.register_students_bulk([("Ana", "", "x"), (" ", "", "y")])
+        # Ni la tabla de estudiantes ni el almacén de embeddings cambiaron
+        self.assertEqual(api._tabla("students").todas(), estudiantes)
+        self.assertEqual(api._tabla("students").siguiente_id(), 2)
+        self.assertEqual(generacion_almacen(path_almacen), generacion)
+        almacen = cargar_almacen_embeddings(path_almacen)
+        self.assertEqual(list(almacen.ids), [1])
+        # Un campo que no es texto también rechaza el lote antes de escribir
+        with self.assertRaises(ValueError):
+            api.register_students_bulk(
+                [("Ana", "", "x"), {"nombre": "Luis", "tags": 123, "descripcion": "y"}]
+            )
+        self.assertEqual(api._tabla("students").todas(), estudiantes)
+        self.assertEqual(api._tabla("students").siguiente_id(), 2)
+        self.assertEqual(generacion_almacen(path_almacen), generacion)
+
+    def test_registro_no_recorre_la_tabla_de_embeddings(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        import src.embeddings
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        hashes_calculados = []
+        for n in (10, 300):
+            data_path = tempfile.mkdtemp()
+            with open(
+                os.path.join(data_path, "students.csv"), "w", encoding="utf-8"
+            ) as f:
+                f.write("EstudianteID,Nombre,Tags,Descripcion\n")
+                for i in range(1, n + 1):
+                    f.write(f"{i},Estudiante {i},,\n")
+            df = pd.DataFrame(
+                {
+                    "EstudianteID": range(1, n + 1),
+                    "Tags": [f"tema {i}" for i in range(n)],
+                }
+            )
+            actualizar_embeddings_si_necesario(
+                df,
+                os.path.join(data_path, "students_tags_embeddings"),
+                model=ModeloFalso(),
+            )
+            api = ElectiveRecommendationAPI(data_path)
+            hash_tags = mock.Mock(wraps=src.embeddings.hash_tags)
+            with mock.patch(
+                "src.embeddings.get_sentence_transformer_model",
+                return_value=ModeloFalso(),
+            ), mock.patch(
+                "src.embeddings.get_cache_embeddings_tags",
+                side_effect=lambda: CacheEmbeddingsTags(path=None),
+            ), mock.patch(
+                "src.embeddings.hash_tags", hash_tags
+            ), mock.patch(
+                "src.embeddings.actualizar_embeddings_si_necesario",
+                side_effect=AssertionError("no debe comparar la tabla completa"),
+            ):
+                api.register_student("Ana", "redes", "Me interesan las redes.")
+                api.register_students_bulk(
+                    [("Luis", "", "Seguridad."), ("Eva", "", "Bases de datos.")]
+                )
+            hashes_calculados.append(hash_tags.call_count)
+            almacen = cargar_almacen_embeddings(
+                os.path.join(data_path, "students_tags_embeddings")
+            )
+            self.assertEqual(almacen.ids[-3:].tolist(), [n + 1, n + 2, n + 3])
+        # Solo se hashean las filas registradas, sin importar el tamaño de la tabla
+        self.assertEqual(hashes_calculados, [3, 3])
+
+
+class TestRecalculoAsincrono(unittest.TestCase):
+    def test_ediciones_repetidas_se_fusionan(self):
+        import os
+        import tempfile
+        import threading
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        with open(os.path.join(data_path, "courses.csv"), "w", encoding="utf-8") as f:
+            f.write("CursoID,Nombre,Descripcion\n1,Redes,Protocolos\n")
+        api = ElectiveRecommendationAPI(data_path, recalculo_asincrono=True)
+        liberar = threading.Event()
+        ejecutados = []
+
+        def recalcular(curso_id):
+            liberar.wait(5)
+            ejecutados.append((curso_id, api.get_course(curso_id)["Descripcion"]))
+
+        api.recalculate_course_data = recalcular
+        curso_id = api.register_course("IA", "v0")
+        # El registro no espera a la recalculación
+        self.assertEqual(api.get_course(curso_id)["Descripcion"], "v0")
+        for version in ("v1", "v2", "v3"):
+            api.edit_course(1, descripcion=version)
+        liberar.set()
+        self.assertTrue(api.wait_for(timeout=5))
+        self.assertEqual(sorted(ejecutados), [(1, "v3"), (2, "v0")])
+        self.assertEqual(api.recalculation_status(1)["estado"], "listo")
+        resumen = api.recalculation_status()
+        self.assertEqual(resumen["fusionados"], 2)
+        self.assertEqual(resumen["pendientes"], 0)
+        api.shutdown()
+
+    def test_error_queda_en_el_estado(self):
+        import tempfile
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        api = ElectiveRecommendationAPI(tempfile.mkdtemp(), recalculo_asincrono=True)
+
+        def falla(estudiante_id):
+            raise RuntimeError("sin modelo")
+
+        api.recalculate_student_data = falla
+        api.register_student("Ana", "redes", "x")
+        self.assertTrue(api.wait_for(1, tipo="student", timeout=5))
+        estado = api.recalculation_status(1, tipo="student")
+        self.assertEqual(estado["estado"], "error")
+        self.assertIn("sin modelo", estado["error"])
+        # Sin tipo, como wait_for, también se ve la cola de estudiantes
+        self.assertEqual(api.recalculation_status(1)["estado"], "error")
+        self.assertEqual(
+            api.recalculation_status(1, tipo="course")["estado"], "desconocido"
+        )
+        api.shutdown()
+
+    def test_indice_espera_la_escritura_de_embeddings(self):
+        import tempfile
+        import threading
+        from unittest import mock
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        api = ElectiveRecommendationAPI(tempfile.mkdtemp())
+        escribiendo = threading.Event()
+        liberar = threading.Event()
+
+        def escribir(*args):
+            escribiendo.set()
+            liberar.wait(5)
+
+        resultado = []
+
+        def leer():
+            try:
+                api._get_indice()
+            except ValueError:
+                resultado.append("sin embeddings")
+
+        with mock.patch("src.embeddings.actualizar_embeddings_si_necesario", escribir):
+            with mock.patch("pandas.read_csv"):
+                hilo = threading.Thread(
+                    target=api._actualizar_embeddings,
+                    args=("x.csv", "students_tags_embeddings"),
+                )
+                hilo.start()
+                escribiendo.wait(5)
+                lector = threading.Thread(target=leer)
+                lector.start()
+                lector.join(0.2)
+                # La construcción del índice no lee los almacenes a medio escribir
+                self.assertTrue(lector.is_alive())
+                liberar.set()
+                hilo.join(5)
+                lector.join(5)
+        self.assertEqual(resultado, ["sin embeddings"])
+        self.assertEqual(api._version_datos, 1)
+
+
+class TestCargaPorId(unittest.TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+
+        self.path = os.path.join(tempfile.mkdtemp(), "courses.csv")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("# Catálogo de prueba\n")
+            f.write("1,Redes,Protocolos\n")
+            f.write('2,Álgebra Lineal,"Matrices, vectores y espacios"\n')
+            f.write("// fin\n")
+
+    def test_fila_igual_que_la_carga_completa(self):
+        from data_preprocessing import (
+            cargar_curso_por_id,
+            cargar_datos_cursos,
+            CacheTextosLimpios,
+        )
+
+        cache = CacheTextosLimpios()
+        fila = cargar_curso_por_id(self.path, 2, cache=cache)
+        completo = cargar_datos_cursos(self.path)
+        pd.testing.assert_frame_equal(
+            fila, completo[completo["CursoID"] == 2].reset_index(drop=True)
+        )
+        cargar_curso_por_id(self.path, 2, cache=cache)
+        self.assertEqual(cache.estadisticas()["hits"], 2)
+        with self.assertRaises(ValueError):
+            cargar_curso_por_id(self.path, 3)
+
+    def test_api_recalcula_estudiante_con_la_fila(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from embeddings import CacheEmbeddingsTags
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        registros = [
+            ("Ana", "redes", "Me interesan los algoritmos genéticos."),
+            ("Luis", "", "Quiero aprender seguridad informática."),
+        ]
+        apis = []
+        with mock.patch(
+            "src.embeddings.get_sentence_transformer_model",
+            return_value=ModeloFalso(),
+        ), mock.patch(
+            "src.embeddings.get_cache_embeddings_tags",
+            side_effect=lambda: CacheEmbeddingsTags(path=None),
+        ), mock.patch(
+            "src.data_preprocessing.cargar_datos_estudiantes",
+            side_effect=AssertionError("no debe cargar la tabla completa"),
+        ):
+            for _ in range(2):
+                data_path = tempfile.mkdtemp()
+                with open(
+                    os.path.join(data_path, "students.csv"), "w", encoding="utf-8"
+                ) as f:
+                    f.write("EstudianteID,Nombre,Tags,Descripcion\n")
+                apis.append(ElectiveRecommendationAPI(data_path))
+            for registro in registros:
+                apis[0].register_student(*registro)
+            apis[1].register_students_bulk(registros)
+        # El registro individual y el registro en lote producen los mismos tags
+        with open(os.path.join(apis[0].data_path, "students_with_tags.csv")) as a, open(
+            os.path.join(apis[1].data_path, "students_with_tags.csv")
+        ) as b:
+            self.assertEqual(a.read(), b.read())
+
+
+class TestNormalizacionTexto(unittest.TestCase):
+    def test_serie_igual_que_por_celda(self):
+        from data_preprocessing import limpiar_texto_serie
+
+        serie = pd.Series(
+            [
+                "¡Hola, Mundo! ÁÉÍÓÚ ñ",
+                None,
+                "  Redes\t y\n\nseguridad  ",
+                "",
+                "IA/ML 100%",
+            ],
+            index=[10, 11, 12, 13, 14],
+        )
+        limpia = limpiar_texto_serie(serie)
+        self.assertEqual(list(limpia.index), [10, 11, 12, 13, 14])
+        self.assertEqual(list(limpia), [limpiar_texto(t) for t in serie])
+        self.assertEqual(limpia[12], "redes y seguridad")
+
+    def test_pliega_otros_diacriticos(self):
+        self.assertEqual(
+            limpiar_texto("Pingüino, Façade à São Paulo"), "pinguino facade a sao paulo"
+        )
+        self.assertEqual(limpiar_texto("Straße"), "strasse")
+
+    def test_descarta_ordinales_y_compatibilidad(self):
+        from data_preprocessing import limpiar_texto_serie
+
+        self.assertEqual(limpiar_texto("1º curso, 2ª edición"), "1 curso 2 edicion")
+        self.assertEqual(limpiar_texto("x² + ½ de H₂O"), "x de ho")
+        self.assertEqual(limpiar_texto("ﬁnal\xa0de\u2009curso"), "nal de curso")
+        serie = pd.Series(["1º curso, 2ª edición", "x² + ½"])
+        self.assertEqual(list(limpiar_texto_serie(serie)), ["1 curso 2 edicion", "x"])
+
+
+class TestLecturaPorLotes(unittest.TestCase):
+    def test_lotes_igual_que_carga_completa(self):
+        import os
+        import tempfile
+
+        from data_preprocessing import iterar_datos_estudiantes
+
+        path = os.path.join(tempfile.mkdtemp(), "students.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# exportación\n")
+            for i in range(1, 8):
+                f.write(f'{i},Est {i},"redes, ia",Descripción número {i}\n')
+                if i == 4:
+                    f.write("// comentario intermedio\n")
+        lotes = list(iterar_datos_estudiantes(path, tam_lote=3))
+        self.assertEqual([len(lote) for lote in lotes], [3, 3, 1])
+        pd.testing.assert_frame_equal(pd.concat(lotes), cargar_datos_estudiantes(path))
+        self.assertEqual(lotes[2]["Tags_List"].iloc[0], ["redes", "ia"])
+
+    def test_embeddings_por_lotes(self):
+        import os
+        import tempfile
+
+        from embeddings import actualizar_embeddings_por_lotes
+
+        path = os.path.join(tempfile.mkdtemp(), "students_tags_embeddings")
+        df = pd.DataFrame(
+            {
+                "EstudianteID": [1, 2, 3, 4, 5],
+                "Tags": ["redes", "ia, datos", "", "redes, ia", "datos"],
+            }
+        )
+        modelo = ModeloFalso()
+        referencia = actualizar_embeddings_si_necesario(
+            df, os.path.join(tempfile.mkdtemp(), "ref"), model=modelo
+        )
+        lotes = [df.iloc[i : i + 2] for i in range(0, 5, 2)]
+        resumen = actualizar_embeddings_por_lotes(lotes, path, model=modelo)
+        self.assertEqual(resumen, {"filas": 5, "codificadas": 5})
+        almacen = cargar_almacen_embeddings(path)
+        self.assertEqual(list(almacen.ids), [1, 2, 3, 4, 5])
+        np.testing.assert_allclose(
+            almacen.matriz, np.stack(referencia["Tags_Embedding"]), rtol=1e-6
+        )
+        # Segunda pasada con un solo cambio: solo se codifica esa fila
+        df.loc[1, "Tags"] = "compiladores"
+        almacen = None
+        resumen = actualizar_embeddings_por_lotes(
+            [df.iloc[:3], df.iloc[3:]], path, model=modelo
+        )
+        self.assertEqual(resumen, {"filas": 5, "codificadas": 1})
+        # Sin generaciones a medio escribir
+        self.assertFalse([n for n in os.listdir(path) if n.endswith(".tmp")])
+
+
+class TestPipeline(unittest.TestCase):
+    def _pipeline(self, carpeta, llamadas, barrera=None):
+        import os
+
+        from pipeline import Etapa, Pipeline
+
+        def ruta(nombre):
+            return os.path.join(carpeta, nombre)
+
+        def copiar(origen, destino):
+            def etapa(config):
+                if barrera is not None:
+                    barrera.wait(timeout=5)
+                llamadas.append(destino)
+                with open(ruta(origen)) as f, open(ruta(destino), "w") as g:
+                    g.write(f.read().upper())
+
+            return etapa
+
+        def unir(config):
+            llamadas.append("c.txt")
+            with open(ruta("c.txt"), "w") as g:
+                for nombre in ("a2.txt", "b2.txt"):
+                    with open(ruta(nombre)) as f:
+                        g.write(f.read())
+
+        etapas = [
+            Etapa("a", copiar("a.txt", "a2.txt"), [ruta("a.txt")], [ruta("a2.txt")]),
+            Etapa("b", copiar("b.txt", "b2.txt"), [ruta("b.txt")], [ruta("b2.txt")]),
+            Etapa("c", unir, [ruta("a2.txt"), ruta("b2.txt")], [ruta("c.txt")]),
+        ]
+        return Pipeline(etapas, ruta("estado.json"))
+
+    def _preparar(self):
+        import os
+        import tempfile
+
+        carpeta = tempfile.mkdtemp()
+        for nombre, texto in (("a.txt", "uno "), ("b.txt", "dos")):
+            with open(os.path.join(carpeta, nombre), "w") as f:
+                f.write(texto)
+        return carpeta
+
+    def test_omite_etapas_sin_cambios(self):
+        import os
+
+        carpeta = self._preparar()
+        llamadas = []
+        pipeline = self._pipeline(carpeta, llamadas)
+        self.assertEqual(pipeline.dependencias["c"], {"a", "b"})
+        pipeline.ejecutar(informar=lambda _: None)
+        self.assertEqual(sorted(llamadas), ["a2.txt", "b2.txt", "c.txt"])
+        with open(os.path.join(carpeta, "c.txt")) as f:
+            self.assertEqual(f.read(), "UNO DOS")
+
+        # Nueva instancia: el estado se lee del archivo y nada se repite
+        llamadas.clear()
+        resultados = self._pipeline(carpeta, llamadas).ejecutar(informar=lambda _: None)
+        self.assertEqual(llamadas, [])
+        self.assertEqual({r["estado"] for r in resultados}, {"omitida"})
+
+        # Cambia una entrada: se repiten su rama y la etapa que depende de ella
+        with open(os.path.join(carpeta, "b.txt"), "w") as f:
+            f.write("tres")
+        self._pipeline(carpeta, llamadas).ejecutar(informar=lambda _: None)
+        self.assertEqual(llamadas, ["b2.txt", "c.txt"])
+
+        # Una salida borrada también obliga a repetir su etapa
+        llamadas.clear()
+        os.remove(os.path.join(carpeta, "a2.txt"))
+        self._pipeline(carpeta, llamadas).ejecutar(
+            etapas=["a"], informar=lambda _: None
+        )
+        self.assertEqual(llamadas, ["a2.txt"])
+
+    def test_salidas_sin_cambios_no_se_vuelven_a_leer(self):
+        import os
+        from unittest import mock
+
+        import pipeline as modulo_pipeline
+
+        carpeta = self._preparar()
+        llamadas = []
+        self._pipeline(carpeta, llamadas).ejecutar(informar=lambda _: None)
+        hash_ruta = mock.Mock(wraps=modulo_pipeline.hash_ruta)
+        with mock.patch.object(modulo_pipeline, "hash_ruta", hash_ruta):
+            resultados = self._pipeline(carpeta, llamadas).ejecutar(
+                informar=lambda _: None
+            )
+        self.assertEqual({r["estado"] for r in resultados}, {"omitida"})
+        # Solo se hashean las entradas de las firmas (a2 y b2 son entradas de c una
+        # vez cada una); las salidas al día no se vuelven a leer
+        rutas = [c.args[0] for c in hash_ruta.call_args_list]
+        self.assertEqual(rutas.count(os.path.join(carpeta, "a2.txt")), 1)
+        self.assertEqual(rutas.count(os.path.join(carpeta, "b2.txt")), 1)
+        self.assertNotIn(os.path.join(carpeta, "c.txt"), rutas)
+
+        # Otra fecha con el mismo contenido: se compara el hash y la etapa se omite
+        llamadas.clear()
+        os.utime(os.path.join(carpeta, "c.txt"), ns=(1, 1))
+        resultados = self._pipeline(carpeta, llamadas).ejecutar(
+            etapas=["c"], informar=lambda _: None
+        )
+        self.assertEqual(llamadas, [])
+        # Contenido distinto: la etapa se repite
+        with open(os.path.join(carpeta, "c.txt"), "w") as f:
+            f.write("otro")
+        self._pipeline(carpeta, llamadas).ejecutar(
+            etapas=["c"], informar=lambda _: None
+        )
+        self.assertEqual(llamadas, ["c.txt"])
+
+    def test_ramas_en_paralelo(self):
+        import threading
+
+        # Las etapas a y b solo pasan la barrera si se ejecutan a la vez
+        barrera = threading.Barrier(2)
+        llamadas = []
+        pipeline = self._pipeline(self._preparar(), llamadas, barrera)
+        pipeline.ejecutar(etapas=["a", "b"], informar=lambda _: None)
+        self.assertEqual(sorted(llamadas), ["a2.txt", "b2.txt"])
+
+    def test_dependencias_del_flujo(self):
+        import os
+
+        from pipeline import Pipeline, configuracion, definir_etapas
+
+        pipeline = Pipeline(definir_etapas(configuracion("datos", "salida")), None)
+        # La matriz densa es opcional: por defecto solo se guarda el top-k
+        self.assertNotIn("afinidad", pipeline.etapas)
+        self.assertEqual(
+            pipeline.dependencias["recomendaciones"],
+            {"embeddings_cursos", "embeddings_estudiantes"},
+        )
+        densa = Pipeline(
+            definir_etapas(configuracion("datos", "salida", afinidad_densa=True)), None
+        )
+        self.assertEqual(
+            densa.dependencias["afinidad"],
+            {"embeddings_cursos", "embeddings_estudiantes"},
+        )
+        self.assertEqual(pipeline.dependencias["embeddings_cursos"], {"tags_cursos"})
+        self.assertEqual(
+            pipeline.con_dependencias(["embeddings_estudiantes"]),
+            ["tags_estudiantes", "embeddings_estudiantes"],
+        )
+        self.assertIn(
+            os.path.join("datos", "predefined_tags.py"),
+            pipeline.etapas["tags_estudiantes"].entradas,
+        )
+
+    def test_firma_incluye_modulos_y_versiones(self):
+        from pipeline import Etapa, Pipeline
+
+        def funcion(config):
+            pass
+
+        pipeline = Pipeline([], None)
+        base = pipeline.firma(Etapa("x", funcion))
+        con_modulo = pipeline.firma(Etapa("x", funcion, modulos=["recommender"]))
+        self.assertNotEqual(base, con_modulo)
+        self.assertEqual(
+            con_modulo, pipeline.firma(Etapa("x", funcion, modulos=["recommender"]))
+        )
+        self.assertNotEqual(
+            pipeline.firma(Etapa("x", funcion, versiones={"spacy": "3.7"})),
+            pipeline.firma(Etapa("x", funcion, versiones={"spacy": "3.8"})),
+        )
+
+
+class TestMetricas(unittest.TestCase):
+    def test_contadores_percentiles_y_formatos(self):
+        import json
+
+        from metricas import Metricas
+
+        metricas = Metricas()
+        metricas.incrementar("io_bytes_total", 100, formato="csv", operacion="lectura")
+        metricas.incrementar("io_bytes_total", 50, formato="csv", operacion="lectura")
+        for valor in range(1, 101):
+            metricas.observar("recomendacion_segundos", valor)
+        self.assertEqual(
+            metricas.contador("io_bytes_total", formato="csv", operacion="lectura"), 150
+        )
+        resumen = metricas.resumen("recomendacion_segundos")
+        self.assertEqual((resumen["n"], resumen["max"]), (100, 100))
+        self.assertAlmostEqual(resumen["p50"], 50.5)
+        texto = metricas.a_prometheus()
+        self.assertIn("# TYPE optativas_io_bytes_total counter", texto)
+        self.assertIn(
+            'optativas_io_bytes_total{formato="csv",operacion="lectura"} 150', texto
+        )
+        self.assertIn('optativas_recomendacion_segundos{quantile="0.99"}', texto)
+        self.assertIn("optativas_recomendacion_segundos_count 100", texto)
+        datos = json.loads(metricas.a_json())
+        self.assertEqual(datos["distribuciones"]["recomendacion_segundos"]["n"], 100)
+
+    def test_perfil_por_etapa(self):
+        from metricas import Metricas
+
+        metricas = Metricas()
+        with metricas.etapa("sin_perfil"):
+            pass
+        self.assertIsNone(metricas.perfil("sin_perfil"))
+        metricas.activar_perfilado()
+        for _ in range(2):
+            with metricas.etapa("suma"):
+                sorted(range(1000), reverse=True)
+        self.assertIn("sorted", metricas.perfil("suma"))
+        self.assertEqual(metricas.resumen("etapa_segundos", etapa="suma")["n"], 2)
+        self.assertEqual(metricas.instantanea()["perfiles"], ["suma"])
+
+    def test_api_expone_metricas(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+        from embeddings import CacheEmbeddingsTags
+
+        data_path = tempfile.mkdtemp()
+        with open(os.path.join(data_path, "students.csv"), "w", encoding="utf-8") as f:
+            f.write("EstudianteID,Nombre,Tags,Descripcion\n")
+        api = ElectiveRecommendationAPI(data_path)
+        metricas = api.metricas
+        previos = (
+            metricas.contador("encode_textos_total"),
+            metricas.contador("spacy_docs_total"),
+        )
+        with mock.patch(
+            "src.embeddings.get_sentence_transformer_model", return_value=ModeloFalso()
+        ), mock.patch(
+            "src.embeddings.get_cache_embeddings_tags",
+            side_effect=lambda: CacheEmbeddingsTags(path=None),
+        ):
+            api.register_students_bulk([("Ana", "redes", "Me interesan las redes.")])
+            filas = [[1, "Redes", "Protocolos y seguridad en redes de datos."]]
+            api._tabla("courses").agregar_muchas(filas)
+            api.recalculate_courses_bulk(filas, usar_ia=False)
+            api.recomendar_top_cursos_para_estudiante(1, top_n=1)
+        self.assertGreater(metricas.contador("encode_textos_total"), previos[0])
+        self.assertGreater(metricas.contador("spacy_docs_total"), previos[1])
+        self.assertGreater(
+            metricas.contador("io_bytes_total", formato="csv", operacion="escritura"), 0
+        )
+        self.assertGreaterEqual(metricas.resumen("recomendacion_segundos")["n"], 1)
+        self.assertIn(
+            "optativas_recomendacion_segundos_count", api.export_metrics("prometheus")
+        )
+        self.assertIn(
+            "recomendacion_segundos", api.metrics_snapshot()["distribuciones"]
+        )
+
+
+class TestVersionTablas(unittest.TestCase):
+    def test_registros_concurrentes_y_version(self):
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+
+        data_path = tempfile.mkdtemp()
+        api = ElectiveRecommendationAPI(data_path)
+        inicial = api.get_table_version("courses")
+        # Sin recalcular: solo interesa la escritura de filas desde varias sesiones
+        with mock.patch.object(api, "_recalcular"):
+            with ThreadPoolExecutor(max_workers=8) as ejecutor:
+                ids = list(
+                    ejecutor.map(
+                        lambda i: api.register_course(f"Curso {i}", "Descripción"),
+                        range(20),
+                    )
+                )
+            self.assertEqual(sorted(ids), list(range(1, 21)))
+            self.assertEqual(len(api.get_all_courses()), 20)
+            registrados = api.get_table_version("courses")
+            self.assertNotEqual(registrados, inicial)
+            api.edit_course(3, nombre="Otro nombre")
+        editados = api.get_table_version("courses")
+        self.assertNotEqual(editados, registrados)
+        self.assertEqual(api.get_table_version("courses"), editados)
+        self.assertEqual(api.get_table_version("students"), (0, None))
+
+        # Otra instancia (otro proceso) que escribe la tabla también cambia la versión
+        otra = ElectiveRecommendationAPI(data_path)
+        with mock.patch.object(otra, "_recalcular"):
+            otra.register_course("Curso externo", "Descripción")
+        self.assertNotEqual(api.get_table_version("courses"), editados)
+
+    def test_version_sqlite_ve_escrituras_externas(self):
+        import os
+        import sqlite3
+        import tempfile
+
+        from almacen_tablas import SQLITE_NOMBRE, abrir_tabla
+
+        data_path = tempfile.mkdtemp()
+        tabla = abrir_tabla(data_path, "courses", backend="sqlite")
+        tabla.agregar([1, "Redes", "Protocolos"])
+        version = tabla.version()
+        tabla.editar(1, {"Nombre": "Redes II"})
+        self.assertNotEqual(tabla.version(), version)
+        version = tabla.version()
+        conexion = sqlite3.connect(os.path.join(data_path, SQLITE_NOMBRE))
+        with conexion:
+            conexion.execute('UPDATE "courses" SET "Descripcion" = \'SQL\'')
+        conexion.close()
+        self.assertNotEqual(tabla.version(), version)
+        tabla.cerrar()
+
+
+class TestServicio(unittest.TestCase):
+    def test_agrupador_une_solicitudes_concurrentes(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from api.servicio import AgrupadorRecomendaciones
+
+        llamadas = []
+
+        def recomendar_lote(ids, top_n):
+            llamadas.append((list(ids), top_n))
+            return [
+                None if i == 99 else [(i * 10 + j, 1.0 - j / 10) for j in range(top_n)]
+                for i in ids
+            ]
+
+        agrupador = AgrupadorRecomendaciones(recomendar_lote, ventana=0.05)
+        try:
+            with ThreadPoolExecutor(max_workers=16) as ejecutor:
+                rankings = list(
+                    ejecutor.map(
+                        lambda i: agrupador.recomendar(i, top_n=1 + i % 3), range(16)
+                    )
+                )
+            n_llamadas = len(llamadas)
+            with self.assertRaises(ValueError):
+                agrupador.recomendar(99)
+        finally:
+            agrupador.detener()
+        for i, ranking in enumerate(rankings):
+            self.assertEqual(
+                [c for c, _ in ranking], [i * 10 + j for j in range(1 + i % 3)]
+            )
+        # Las 16 solicitudes se resolvieron en menos llamadas, cada una con el mayor top_n
+        self.assertLess(n_llamadas, 16)
+        self.assertEqual(sum(len(ids) for ids, _ in llamadas[:n_llamadas]), 16)
+        self.assertTrue(all(top_n <= 3 for _, top_n in llamadas))
+
+    def test_endpoints(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+        from api.servicio import crear_app
+        from embeddings import CacheEmbeddingsTags
+
+        data_path = tempfile.mkdtemp()
+        with open(os.path.join(data_path, "students.csv"), "w", encoding="utf-8") as f:
+            f.write("EstudianteID,Nombre,Tags,Descripcion\n")
+        api = ElectiveRecommendationAPI(data_path)
+        with mock.patch(
+            "src.embeddings.get_sentence_transformer_model", return_value=ModeloFalso()
+        ), mock.patch(
+            "src.embeddings.get_cache_embeddings_tags",
+            side_effect=lambda: CacheEmbeddingsTags(path=None),
+        ):
+            api.register_students_bulk(
+                [
+                    ("Ana", "redes", "Me interesan las redes."),
+                    ("Luis", "datos", "Quiero aprender bases de datos."),
+                ]
+            )
+            filas = [
+                [1, "Redes", "Protocolos y seguridad en redes de datos."],
+                [2, "Bases de datos", "Modelado relacional y consultas SQL."],
+            ]
+            api._tabla("courses").agregar_muchas(filas)
+            api.recalculate_courses_bulk(filas, usar_ia=False)
+            api.warm_up(modelos=False)
+            app = crear_app(api, ventana_ms=1)
+            cliente = app.test_client()
+
+            respuesta = cliente.get("/students/1/recommendations?top_n=2")
+            self.assertEqual(respuesta.status_code, 200)
+            esperado = api.recomendar_top_cursos_para_estudiante(1, top_n=2)
+            self.assertEqual(
+                [r["curso_id"] for r in respuesta.get_json()["recomendaciones"]],
+                [int(c) for c, _ in esperado],
+            )
+            lote = cliente.post(
+                "/recommendations", json={"estudiante_ids": [2, 1], "top_n": 1}
+            ).get_json()["recomendaciones"]
+            self.assertEqual([len(r["recomendaciones"]) for r in lote], [1, 1])
+            respuesta = cliente.post(
+                "/recommendations", json={"estudiante_ids": [2, 999], "top_n": 1}
+            )
+            self.assertEqual(respuesta.status_code, 404)
+            self.assertEqual(respuesta.get_json()["no_encontrados"], [999])
+            self.assertEqual(
+                cliente.get("/students/999/recommendations").status_code, 404
+            )
+            self.assertEqual(
+                cliente.get("/students/1/recommendations?top_n=0").status_code, 400
+            )
+
+            self.assertEqual(
+                cliente.post("/students", json={"nombre": " "}).status_code, 400
+            )
+            # Campos que no son texto o un cuerpo que no es un objeto: 400 en JSON
+            for ruta, cuerpo in (
+                ("/students", {"nombre": 5}),
+                ("/students", {"nombre": "Eva", "tags": ["redes"]}),
+                ("/courses", {"nombre": "SQL", "descripcion": {"a": 1}}),
+                ("/students", ["Eva"]),
+            ):
+                respuesta = cliente.post(ruta, json=cuerpo)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn("error", respuesta.get_json())
+            respuesta = cliente.patch("/courses/2", json={"nombre": 7})
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertEqual(api.get_course(2)["Nombre"], "Bases de datos")
+            respuesta = cliente.post(
+                "/students",
+                json={"nombre": "Eva", "tags": "redes", "descripcion": "Redes."},
+            )
+            self.assertEqual(respuesta.get_json(), {"estudiante_id": 3})
+            self.assertEqual(
+                cliente.patch("/courses/2", json={"nombre": "SQL"}).get_json()[
+                    "Nombre"
+                ],
+                "SQL",
+            )
+            self.assertEqual(cliente.patch("/courses/9", json={}).status_code, 404)
+        self.assertIn(
+            "optativas_servicio_solicitud_segundos",
+            cliente.get("/metrics").get_data(True),
+        )
+        app.extensions["recomendaciones"]["agrupador"].detener()
+
+    def test_sin_indice_responde_503(self):
+        import tempfile
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+        from api.servicio import crear_app
+
+        api = ElectiveRecommendationAPI(tempfile.mkdtemp())
+        for agrupar in (True, False):
+            app = crear_app(api, ventana_ms=1, agrupar=agrupar)
+            cliente = app.test_client()
+            self.assertEqual(
+                cliente.get("/students/1/recommendations").status_code, 503
+            )
+            respuesta = cliente.post("/recommendations", json={"estudiante_ids": [1]})
+            self.assertEqual(respuesta.status_code, 503)
+            if agrupar:
+                app.extensions["recomendaciones"]["agrupador"].detener()
+
+
+class TestCompresion(unittest.TestCase):
+    def setUp(self):
+        # Embeddings con 16 direcciones latentes en 64 dimensiones más algo de ruido
+        rng = np.random.default_rng(0)
+        base = rng.standard_normal((16, 64)).astype(np.float32)
+        self.estudiantes = rng.standard_normal((400, 16)).astype(np.float32) @ base
+        self.estudiantes += 0.01 * rng.standard_normal((400, 64)).astype(np.float32)
+        self.cursos = rng.standard_normal((50, 16)).astype(np.float32) @ base
+        self.ids_cursos = np.arange(100, 150)
+
+    def test_modos_aproximan_el_ranking_completo(self):
+        from compresion import (
+            MotorRankingComprimido,
+            comprimir_estudiantes,
+            overlap_at_k,
+        )
+        from recommender import MotorRanking, normalizar_filas
+
+        referencia, _ = MotorRanking(self.cursos, self.ids_cursos).top_k(
+            self.estudiantes, k=5
+        )
+        esperado = {
+            "float16": (np.float16, 64, 0.99),
+            "int8": (np.int8, 64, 0.95),
+            "pca": (np.float32, 16, 0.95),
+        }
+        for modo, (dtype, dimension, minimo) in esperado.items():
+            parametros = {"dimension": 16} if modo == "pca" else {}
+            compresion, codigos = comprimir_estudiantes(
+                self.estudiantes, modo, **parametros
+            )
+            self.assertEqual((codigos.dtype, codigos.shape[1]), (dtype, dimension))
+            np.testing.assert_allclose(
+                compresion.descomprimir(codigos),
+                normalizar_filas(self.estudiantes),
+                atol=0.05,
+            )
+            motor = MotorRankingComprimido(self.cursos, self.ids_cursos, compresion)
+            ids, puntuaciones = motor.top_k(codigos, k=5, tam_bloque=64)
+            self.assertTrue(np.all(np.diff(puntuaciones, axis=1) <= 0))
+            self.assertGreaterEqual(overlap_at_k(referencia, ids), minimo, modo)
+
+    def test_overlap_at_k(self):
+        from compresion import crear_compresion, overlap_at_k
+
+        referencia = np.array([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(overlap_at_k(referencia, referencia[:, ::-1]), 1.0)
+        self.assertAlmostEqual(overlap_at_k(referencia, [[1, 9, 9], [6, 5, 9]]), 0.5)
+        self.assertEqual(overlap_at_k(referencia, [[2, 1, 9], [4, 9, 9]], k=1), 0.5)
+        with self.assertRaises(ValueError):
+            crear_compresion("int4")
+
+    def test_indice_api_con_compresion(self):
+        import compresion
+        import recommender
+        from api.elective_recommendation import _IndiceRecomendacion
+        from embeddings import AlmacenEmbeddings
+
+        almacen_estudiantes = AlmacenEmbeddings(
+            "EstudianteID", np.arange(1, 401), self.estudiantes
+        )
+        almacen_cursos = AlmacenEmbeddings("CursoID", self.ids_cursos, self.cursos)
+        completo = _IndiceRecomendacion(
+            almacen_estudiantes, almacen_cursos, recommender, firma=None
+        )
+        comprimido = _IndiceRecomendacion(
+            almacen_estudiantes,
+            almacen_cursos,
+            recommender,
+            firma=None,
+            compresion=compresion.crear_compresion("float16"),
+            motor_comprimido=compresion.MotorRankingComprimido,
+        )
+        self.assertEqual(comprimido.estudiantes.dtype, np.float16)
+        ranking = comprimido.top_k(7, top_n=3)
+        self.assertEqual(
+            [c for c, _ in ranking], [c for c, _ in completo.top_k(7, top_n=3)]
+        )
+        lote = comprimido.top_k_lote([7, 999], top_n=3)
+        self.assertEqual([c for c, _ in lote[0]], [c for c, _ in ranking])
+        self.assertIsNone(lote[1])
+
+    def test_api_reutiliza_la_compresion_ajustada(self):
+        import os
+        import tempfile
+        from unittest import mock
+
+        from api.elective_recommendation import ElectiveRecommendationAPI
+        from embeddings import guardar_almacen_embeddings
+        from src.compresion import CompresionPCA
+
+        data_path = tempfile.mkdtemp()
+        path_estudiantes = os.path.join(data_path, "students_tags_embeddings")
+        guardar_almacen_embeddings(
+            os.path.join(data_path, "courses_tags_embeddings"),
+            "CursoID",
+            self.ids_cursos,
+            self.cursos,
+        )
+
+        def estudiantes(n):
+            guardar_almacen_embeddings(
+                path_estudiantes,
+                "EstudianteID",
+                np.arange(1, n + 1),
+                np.resize(self.estudiantes, (n, self.estudiantes.shape[1])),
+            )
+
+        api = ElectiveRecommendationAPI(data_path, compresion="pca", dimension_pca=8)
+        with mock.patch.object(
+            CompresionPCA, "ajustar", autospec=True, side_effect=CompresionPCA.ajustar
+        ) as ajustar:
+            estudiantes(400)
+            api.warm_up(modelos=False)
+            # Pocas altas: el índice se reconstruye sin volver a ajustar la PCA
+            estudiantes(420)
+            self.assertEqual(len(api.recomendar_top_cursos_para_estudiante(420)), 3)
+            self.assertEqual(ajustar.call_count, 1)
+            # Muchas más filas, o un pedido explícito, sí reajustan
+            estudiantes(600)
+            api.recomendar_top_cursos_para_estudiante(600)
+            self.assertEqual(ajustar.call_count, 2)
+            self.assertEqual(api.refit_compression()["dimension"], 8)
+            self.assertEqual(ajustar.call_count, 3)
+
+
+class TestGeneracionesAlmacen(unittest.TestCase):
+    def test_lector_no_mezcla_generaciones(self):
+        import os
+        import tempfile
+
+        from embeddings import (
+            cargar_almacen_embeddings,
+            generacion_almacen,
+            guardar_almacen_embeddings,
+        )
+
+        path = os.path.join(tempfile.mkdtemp(), "emb")
+        guardar_almacen_embeddings(path, "CursoID", [1, 2], np.ones((2, 3)))
+        anterior = cargar_almacen_embeddings(path)
+        generacion = generacion_almacen(path)
+        # Una escritura con otra cantidad de filas no afecta al almacén ya abierto
+        guardar_almacen_embeddings(path, "CursoID", [1, 2, 3], np.zeros((3, 3)))
+        self.assertEqual(anterior.matriz.shape, (2, 3))
+        self.assertEqual(float(anterior.matriz.sum()), 6.0)
+        nuevo = cargar_almacen_embeddings(path)
+        self.assertEqual(list(nuevo.ids), [1, 2, 3])
+        self.assertNotEqual(nuevo.meta["generacion"], generacion)
+        self.assertEqual(nuevo.meta["generacion"], generacion_almacen(path))
+        # Se conserva como mucho una generación anterior a la vigente
+        guardar_almacen_embeddings(path, "CursoID", [4], np.ones((1, 3)))
+        generaciones = [n for n in os.listdir(path) if n.startswith("gen-")]
+        self.assertEqual(len(generaciones), 2)
+        self.assertEqual(list(cargar_almacen_embeddings(path).ids), [4])
+
+    def test_formato_sin_generaciones(self):
+        import json
+        import os
+        import tempfile
+
+        from embeddings import cargar_almacen_embeddings, guardar_almacen_embeddings
+
+        path = tempfile.mkdtemp()
+        ids = np.array([5, 6], dtype=np.int64)
+        np.save(os.path.join(path, "embeddings.npy"), np.eye(2, dtype=np.float32))
+        np.save(os.path.join(path, "ids.npy"), ids)
+        np.save(os.path.join(path, "hashes.npy"), np.zeros(2, dtype=np.uint64))
+        np.save(os.path.join(path, "ids_ordenados.npy"), ids)
+        np.save(os.path.join(path, "filas_ordenadas.npy"), np.arange(2))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"id_col": "CursoID", "filas": 2, "dimension": 2}, f)
+        self.assertEqual(list(cargar_almacen_embeddings(path).ids), [5, 6])
+        # La primera escritura pasa al formato con generaciones y limpia el anterior
+        guardar_almacen_embeddings(path, "CursoID", [7], np.ones((1, 2)))
+        self.assertFalse(os.path.exists(os.path.join(path, "meta.json")))
+        self.assertEqual(list(cargar_almacen_embeddings(path).ids), [7])
+
+
 if __name__ == "__main__":
     # suite = unittest.TestLoader().loadTestsFromTestCase(TestOptativeRecommendation)
     # runner = unittest.TextTestRunner(verbosity=2)
@@ -126,7 +1981,7 @@ if __name__ == "__main__":
     # df_estudiantes = df_estudiantes.rename(columns={"Tags_Final": "Tags"})
 
     df_estudiantes = actualizar_embeddings_si_necesario(
-        df_estudiantes, path="data/students_tags_embeddings.pkl"
+        df_estudiantes, path="data/students_tags_embeddings"
     )
     print(df_estudiantes.loc[0, "Tags_Embedding"])
     # -------------------------------------------------